@@ -1,14 +1,33 @@
 # appstore-api/main.py
-from fastapi import FastAPI, Query, Response
+from fastapi import FastAPI, Query, Response, Header, HTTPException
+from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List, Dict, Any
 from pathlib import Path
-import os, sqlite3, json, io, csv, glob
+import os, sys, sqlite3, json, io, csv, glob, base64
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from datetime import datetime, timezone
 
+# споделените DB помощници живеят при скрейпъра (scraper/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scraper"))
+from dimensions import ensure_dimensions, refresh_chart_ranks, refresh_catalog, catalog, context_ids, recent_days, app_ranks, day_number, day_date, seen_before_sql
+from search_index import ensure_search_index, sync_search_index, search_apps
+from history_events import ensure_history_events, refresh_history_events
+from rollups import ensure_rollups, refresh_rollups, range_stats
+from app_metadata import ensure_app_metadata, refresh_app_metadata, META_COLS
+from trends import ensure_trends, refresh_trends, TREND_WINDOWS, TREND_METRICS
+from developers import ensure_developers, refresh_developers, find_developer
+from icon_cache import IconCache
+from response_cache import ResponseCache
+from shared_cache import SharedResponseStore
+from file_lock import file_lock
+from migrations import migrate
+from hot_replica import HotReplica, HotConnection, HOT_REPLICA
+from overlap import ensure_overlap, refresh_overlap, genres, day_sets, app_ids, jaccard_matrix, OVERLAP_DEPTH
+from json_codec import dumps_bytes, loads
+
 # ------------------------- 1) Download DB from Google Drive -------------------------
 def ensure_database_from_drive(force_if_newer: bool = False) -> Dict[str, Any]:
     """
@@ -81,85 +100,66 @@ def ensure_database_from_drive(force_if_newer: bool = False) -> Dict[str, Any]:
 def ensure_tables_exist(db_path: str):
     print("🧩 Checking database structure...")
     con = sqlite3.connect(db_path)
-    cur = con.cursor()
-    tables = {
-        "apps": """
-            CREATE TABLE IF NOT EXISTS apps (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                app_id TEXT,
-                name TEXT,
-                developer TEXT,
-                price TEXT,
-                url TEXT
-            );
-        """,
-        "charts": """
-            CREATE TABLE IF NOT EXISTS charts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                snapshot_date TEXT,
-                country TEXT,
-                chart_type TEXT,
-                category TEXT,
-                subcategory TEXT,
-                rank INTEGER,
-                app_id TEXT,
-                app_name TEXT,
-                developer TEXT
-            );
-        """,
-        "snapshots": """
-            CREATE TABLE IF NOT EXISTS snapshots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                snapshot_date TEXT,
-                country TEXT,
-                category TEXT,
-                subcategory TEXT,
-                data TEXT
-            );
-        """,
-        "compare_results": """
-            CREATE TABLE IF NOT EXISTS compare_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                snapshot_date TEXT,
-                country TEXT,
-                app_id TEXT,
-                app_name TEXT,
-                developer TEXT,
-                category TEXT,
-                subcategory TEXT,
-                rank_now INTEGER,
-                rank_prev INTEGER,
-                rank_change INTEGER,
-                status TEXT
-            );
-        """
-    }
-    for name, ddl in tables.items():
-        cur.execute(ddl)
-    con.commit()
-
-    # make sure columns exist even on older DBs
-    for tbl, col in [
-        ("charts", "developer"),
-        ("snapshots", "category"),
-        ("snapshots", "subcategory"),
-        ("snapshots", "data"),
-    ]:
-        cur.execute(f"PRAGMA table_info({tbl});")
-        cols = [c[1] for c in cur.fetchall()]
-        if col not in cols:
-            print(f"⚙️ Adding missing column '{col}' to {tbl}...")
-            cur.execute(f"ALTER TABLE {tbl} ADD COLUMN {col} TEXT;")
-            con.commit()
-
-
+    # charts и старите apps / snapshots / compare_results — версионирани миграции (scraper/migrations.py),
+    # общи със скрейперите и init_db скриптовете
+    migrate(con)
+
+    # компактни ключове (dim_context + chart_ranks) за /apps/{app_id}/history, /search и датите
+    ensure_dimensions(con)
+    ensure_search_index(con)
+    ensure_history_events(con)
+    ensure_rollups(con)
+    ensure_app_metadata(con)
+    ensure_trends(con)
+    ensure_developers(con)
+    ensure_overlap(con)
 
     con.close()
     print("✅ Database structure verified.")
 
 
 # ------------------------- 3) Populate derived tables (first run only) ---------------------
-def populate_derived_tables(db_path: str):
+def _populate_apps(conn):
+    conn.execute("""
+        INSERT INTO apps (app_id, name, developer)
+        SELECT DISTINCT app_id, app_name, COALESCE(developer_name, '')
+        FROM charts
+        WHERE app_id IS NOT NULL;
+    """)
+
+
+def _populate_snapshots(conn):
+    # one per date+country+category+subcategory
+    conn.execute("""
+        INSERT INTO snapshots (snapshot_date, country, category, subcategory, data)
+        SELECT DISTINCT snapshot_date, country, category, subcategory, ''
+        FROM charts;
+    """)
+
+
+# (таблица, описание, функция): строи се, ако таблицата е празна — в този ред (chart_ranks преди каталога
+# и history_events, които четат dim_context_days). Нова производна таблица = нов ред тук.
+DERIVED_BUILDS = [
+    ("apps", "apps table", _populate_apps),
+    ("snapshots", "snapshots table", _populate_snapshots),
+    # ctx_id / номер на ден / INTEGER app_id; маха и стария idx_charts_app_history
+    ("chart_ranks", "compact chart ranks", refresh_chart_ranks),
+    # каталог за /meta (бази, на които chart_ranks е строен преди него)
+    ("dim_catalog", "dimension catalog", refresh_catalog),
+    # FTS индекс за /search (после скрейперите го поддържат инкрементално)
+    ("app_search", "search index", sync_search_index),
+    ("history_events", "history events", refresh_history_events),  # /history
+    ("chart_rollup_periods", "chart rollups", refresh_rollups),  # /stats/apps
+    # SCD история на цена/рейтинг/URL-и за /metadata/changes и charts_wide
+    ("app_metadata_history", "app metadata history", refresh_app_metadata),
+    ("app_trends", "app trends", refresh_trends),  # /trends
+    ("developer_days", "developer aggregates", refresh_developers),  # /developers
+    ("chart_bitsets", "chart overlap bitsets", refresh_overlap),  # /overlap
+]
+
+
+def populate_derived_tables(db_path: str) -> List[str]:
+    """Строи празните производни таблици; връща имената на тези, чийто build е паднал."""
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
@@ -168,58 +168,94 @@ def populate_derived_tables(db_path: str):
     if cur.fetchone()[0] == 0:
         print("⚠️ Charts table empty — nothing to populate.")
         conn.close()
-        return
+        return []
 
-    # apps
-    cur.execute("SELECT COUNT(*) FROM apps")
-    if cur.fetchone()[0] == 0:
-        print("🧩 Populating apps table...")
-        try:
-            cur.execute("""
-                INSERT INTO apps (app_id, name, developer)
-                SELECT DISTINCT app_id, app_name, COALESCE(developer, '')
-                FROM charts
-                WHERE app_id IS NOT NULL;
-            """)
-            conn.commit()
-        except Exception as e:
-            print(f"⚠️ Skipping apps population: {e}")
-
-    # snapshots (one per date+country+category+subcategory)
-    cur.execute("SELECT COUNT(*) FROM snapshots")
-    if cur.fetchone()[0] == 0:
-        print("🧩 Populating snapshots table...")
+    failed = []
+    for table, label, build in DERIVED_BUILDS:
+        if cur.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+            continue
+        print(f"🧩 Building {label}...")
         try:
-            cur.execute("""
-                INSERT INTO snapshots (snapshot_date, country, category, subcategory, data)
-                SELECT DISTINCT snapshot_date, country, category, subcategory, ''
-                FROM charts;
-            """)
+            build(conn)
             conn.commit()
         except Exception as e:
-            print(f"⚠️ Skipping snapshots population: {e}")
+            conn.rollback()
+            print(f"❌ {label} build failed: {e}")
+            failed.append(table)
 
     conn.close()
-    print("✅ Derived tables populated.")
+    if failed:
+        print(f"⚠️ Derived tables incomplete: {', '.join(failed)}")
+    else:
+        print("✅ Derived tables populated.")
+    return failed
 
 
 # ------------------------- 4) Bootstrap DB & app -------------------------------------------
-ensure_database_from_drive()  # on cold start only
-
+# При няколко worker-а (uvicorn --workers / WEB_CONCURRENCY) всеки импортира този файл: сваляне, схема и
+# производни таблици вървят под файлов lock, а worker-ите след първия виждат маркера със stamp-а на
+# базата и пропускат проверките. Маркерът се обезсилва от всеки запис в базата (нов stamp).
 APP_DIR = Path(__file__).resolve().parent
-DB_PATH = APP_DIR / "data" / "app_data.db"
-if not DB_PATH.exists():
-    DB_PATH = APP_DIR / "data" / "app_data.db"
-if not DB_PATH.exists():
-    matches = glob.glob("**/app_data.db", recursive=True)
-    if matches:
-        DB_PATH = Path(matches[0]).resolve()
-print(f"📘 Using DB: {DB_PATH}")
+BOOTSTRAP_LOCK = APP_DIR / "data" / ".bootstrap.lock"
+
 
-ensure_tables_exist(str(DB_PATH))
-populate_derived_tables(str(DB_PATH))
+def _resolve_db_path() -> Path:
+    path = Path(os.getenv("DB_PATH") or APP_DIR / "data" / "app_data.db")
+    if not path.exists():
+        path = APP_DIR / "data" / "app_data.db"
+    if not path.exists():
+        matches = glob.glob("**/app_data.db", recursive=True)
+        if matches:
+            path = Path(matches[0]).resolve()
+    return path
 
-app = FastAPI(title="AppStore Charts API", version="1.4")
+
+def _db_stamp() -> tuple:
+    """
+    (mtime, size) на базата и WAL-а — сменя се при всеки запис и при ново сваляне от Drive. Празният
+    WAL е като липсващ: всяка четяща връзка го създава и последната го трие, без да пише нищо.
+    """
+    out = []
+    for p in (str(DB_PATH), str(DB_PATH) + "-wal"):
+        try:
+            st = os.stat(p)
+            out.append((st.st_mtime_ns, st.st_size) if st.st_size else None)
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+with file_lock(str(BOOTSTRAP_LOCK)) as waited:
+    ensure_database_from_drive()  # on cold start only
+    DB_PATH = _resolve_db_path()
+    print(f"📘 Using DB: {DB_PATH} (pid {os.getpid()}, waited {waited:.1f}s for bootstrap lock)")
+    marker = Path(str(DB_PATH) + ".bootstrap")
+    if marker.exists() and marker.read_text() == repr(_db_stamp()):
+        print("✅ Bootstrap already done by another worker.")
+    else:
+        ensure_tables_exist(str(DB_PATH))
+        if populate_derived_tables(str(DB_PATH)):  # без маркер следващият worker / рестарт опитва пак
+            print("⚠️ Bootstrap marker not written — derived tables will be rebuilt on the next start.")
+        else:
+            marker.write_text(repr(_db_stamp()))
+
+# последните дни от charts / history_events в паметта (във фонова нишка; дотогава всичко е от диска)
+HOT = HotReplica(str(DB_PATH), _db_stamp) if HOT_REPLICA else None
+if HOT:
+    HOT.refresh()
+
+class FastJSONResponse(Response):
+    """
+    JSON отговор, сериализиран с json_codec (orjson, ако е наличен). Маршрутите връщат
+    FastJSONResponse(...) директно, така че FastAPI не минава през jsonable_encoder + stdlib json.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+app = FastAPI(title="AppStore Charts API", version="1.4", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -239,6 +275,28 @@ def connect():
     return con
 
 
+def connect_hot():
+    """Репликата в паметта, ако е вдигната, иначе диска. Преди четене на charts / history_events -> _covering."""
+    con = HOT.connect() if HOT else None
+    if con is None:
+        return connect()
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def _covering(con, oldest: Optional[str]):
+    """con, ако репликата има всички дати от oldest нататък; иначе (con се затваря) връзка към диска."""
+    if isinstance(con, HotConnection):
+        if HOT.covers(oldest):
+            HOT.stats["hot"] += 1
+            return con
+        con.close()
+        con = connect()
+    if HOT:
+        HOT.stats["disk"] += 1
+    return con
+
+
 # ------------------------- helpers ----------------------------------------------------------
 def _where(filters: Dict[str, Optional[str]]) -> (str, List[Any]):
     parts, params = ["chart_type='top_free'"], []
@@ -251,49 +309,121 @@ def _where(filters: Dict[str, Optional[str]]) -> (str, List[Any]):
 
 
 def _latest_snapshot_for_country(cur, country: str) -> Optional[str]:
+    days = recent_days(cur.connection, context_ids(cur.connection, {"country": country}), 1)
+    return days[0] if days else None
+
+
+def _recent_dates(cur, filters: Dict[str, Optional[str]], n: int, before: Optional[str] = None) -> List[str]:
+    """Последните n дати (низходящо) за филтрите — по ix_chart_ranks_day вместо DISTINCT по charts."""
+    return recent_days(cur.connection, context_ids(cur.connection, filters), n, before)
+
+
+# ----- keyset (cursor) pagination -----
+MAX_PAGE_SIZE = 1000
+
+
+def _encode_cursor(key: List[Any]) -> str:
+    return base64.urlsafe_b64encode(dumps_bytes(key)).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """Ключът от cursor-а — списък от size скалара; всичко друго е 400 (не тиха първа страница)."""
+    if not cursor:
+        return None
+    try:
+        key = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        key = None
+    if not (isinstance(key, list) and len(key) == size
+            and all(k is None or isinstance(k, (str, int, float)) for k in key)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def _keyset_page(cur, sql: str, params: List[Any], key_cols: tuple, cursor: Optional[str], limit: int):
+    """
+    Обвива sql като подзаявка, сортира по key_cols (уникален ключ) и връща една страница
+    след cursor-а. Връща (rows, next_cursor) — next_cursor е None на последната страница.
+    """
+    cols = ", ".join(key_cols)
+    after = _decode_cursor(cursor, len(key_cols))
+    where = f"WHERE ({cols}) > ({', '.join(['?'] * len(key_cols))})" if after else ""
     cur.execute(
-        "SELECT MAX(snapshot_date) FROM charts WHERE country=? AND chart_type='top_free'", (country,)
+        f"SELECT * FROM ({sql}) {where} ORDER BY {cols} LIMIT ?",
+        (*params, *(after or []), limit + 1),
     )
-    return cur.fetchone()[0]
+    rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor([rows[-1][c] for c in key_cols])
+    return rows, next_cursor
 
 
 # ------------------------- 5) META (filters) -----------------------------------------------
+# каталогът (dim_catalog) се чете веднъж и се пази в паметта, докато файлът на базата не се смени
+_META_CACHE: Dict[str, Any] = {"stamp": None, "rows": None}
+
+
+def _meta_catalog() -> List[Dict[str, Any]]:
+    stamp = _db_stamp()
+    if _META_CACHE["stamp"] != stamp:
+        con = connect()
+        try:
+            _META_CACHE["rows"] = catalog(con)
+        finally:
+            con.close()
+        _META_CACHE["stamp"] = stamp
+    return _META_CACHE["rows"]
+
+
+def _meta_payload(category: Optional[str] = None) -> Dict[str, Any]:
+    rows = _meta_catalog()
+    by_category: Dict[str, set] = {}
+    latest_by_country: Dict[str, str] = {}
+    for r in rows:
+        if r["category"] is not None:
+            subs = by_category.setdefault(r["category"], set())
+            if r["subcategory"] is not None:
+                subs.add(r["subcategory"])
+        if r["country"] is not None and r["chart_type"] == "top_free":
+            if r["last_date"] > latest_by_country.get(r["country"], ""):
+                latest_by_country[r["country"]] = r["last_date"]
+
+    if category and category != "all":
+        subcategories = sorted(by_category.get(category, ()))
+    else:
+        subcategories = sorted(set().union(*by_category.values()))
+    return {
+        "countries": sorted({r["country"] for r in rows if r["country"] is not None}),
+        "categories": sorted(by_category),
+        "subcategories": subcategories,
+        "subcategories_by_category": {cat: sorted(subs) for cat, subs in sorted(by_category.items())},
+        "latest_by_country": dict(sorted(latest_by_country.items())),
+        "first_date": min((r["first_date"] for r in rows), default=None),
+        "last_date": max((r["last_date"] for r in rows), default=None),
+    }
+
+
 @app.get("/meta")
 def get_meta(category: Optional[str] = None):
-    con = connect()
-    cur = con.cursor()
-    data = {}
     try:
-        cur.execute("SELECT DISTINCT country FROM charts WHERE country IS NOT NULL ORDER BY country")
-        data["countries"] = [r[0] for r in cur.fetchall()]
-
-        cur.execute("SELECT DISTINCT category FROM charts WHERE category IS NOT NULL ORDER BY category")
-        data["categories"] = [r[0] for r in cur.fetchall()]
-
-        if category and category != "all":
-            cur.execute(
-                "SELECT DISTINCT subcategory FROM charts WHERE category=? AND subcategory IS NOT NULL ORDER BY subcategory",
-                (category,),
-            )
-        else:
-            cur.execute("SELECT DISTINCT subcategory FROM charts WHERE subcategory IS NOT NULL ORDER BY subcategory")
-        data["subcategories"] = [r[0] for r in cur.fetchall()]
+        data = _meta_payload(category)
     except Exception as e:
         print(f"⚠️ Error in /meta: {e}")
         data = {"countries": [], "categories": [], "subcategories": []}
-    finally:
-        con.close()
-    return data
+    return FastJSONResponse(data)
 
 
 # ------------------------- 6) Charts (latest top 50) ---------------------------------------
 @app.get("/charts")
 def charts(country: str = "US", limit: int = 50):
-    con = connect(); cur = con.cursor()
+    con = connect_hot(); cur = con.cursor()
     latest = _latest_snapshot_for_country(cur, country)
     if not latest:
         con.close()
         return {"rows": [], "snapshot_date": None}
+    con = _covering(con, latest); cur = con.cursor()
     cur.execute("""
         SELECT app_id, app_name, developer_name, category, subcategory, rank
         FROM charts
@@ -302,134 +432,105 @@ def charts(country: str = "US", limit: int = 50):
     """, (country, latest, limit))
     rows = [dict(zip([c[0] for c in cur.description], r)) for r in cur.fetchall()]
     con.close()
-    return {"snapshot_date": latest, "rows": rows}
+    return FastJSONResponse({"snapshot_date": latest, "rows": rows})
 
 
 # ------------------------- 7) Weekly compare (last 7 d) ------------------------------------
-@app.get("/compare/weekly-full")
-def compare_weekly_full(
-    country: str = "US",
-    lookback_days: int = 7,
-    category: Optional[str] = Query(None),
-    subcategory: Optional[str] = Query(None),
-):
-    con = connect(); cur = con.cursor()
-
+def _compare_sql(cur, country: str, category: Optional[str], subcategory: Optional[str], lookback_days: int):
+    """
+    Сравнението (текущ снапшот срещу средния ранг от предишните N дати) като една SQL заявка.
+    Връща (latest, prev_dates, sql, params); редовете имат колони k_null/k_rank/app_id за стабилно сортиране.
+    """
     latest = _latest_snapshot_for_country(cur, country)
     if not latest:
-        con.close()
-        return {"message": "No snapshots found", "results": [], "latest_snapshot": None}
+        return None, [], None, []
 
     # previous dates strictly before latest
-    cur.execute("""
-        SELECT DISTINCT snapshot_date FROM charts
-        WHERE country=? AND chart_type='top_free' AND snapshot_date < ?
-        ORDER BY snapshot_date DESC LIMIT ?
-    """, (country, latest, lookback_days))
-    prev_dates = [r[0] for r in cur.fetchall()]
+    prev_dates = _recent_dates(cur, {"country": country}, lookback_days, before=latest)
     if not prev_dates:
-        con.close()
-        return {"message": "Not enough previous snapshots", "results": [], "latest_snapshot": latest}
-
-    # all apps that have ever appeared before the latest snapshot
-    cur.execute("""
-        SELECT DISTINCT app_id FROM charts
-        WHERE country=? AND chart_type='top_free' AND snapshot_date < ?
-    """, (country, latest))
-    all_before_ids = {r[0] for r in cur.fetchall() if r[0]}
-
+        return latest, [], None, []
 
-    # WHERE for optional filters
     where_base, params_base = _where({"country": country, "category": category, "subcategory": subcategory})
-
-    # current snapshot
-    cur.execute(f"""
-        SELECT app_id, app_name, developer_name, category, subcategory, rank
-        FROM charts
-        WHERE {where_base} AND snapshot_date=?
-    """, (*params_base, latest))
-    current_rows = cur.fetchall()
-    current_data = {r["app_id"]: r for r in current_rows}
-
-    # collect previous ranks
-    prev_data: Dict[str, Dict[str, Any]] = {}
-    for d in prev_dates:
-        cur.execute(f"""
-            SELECT app_id, app_name, developer_name, category, subcategory, rank
+    placeholders_prev = ",".join(["?"] * len(prev_dates))
+    seen = seen_before_sql("CAST(cur_prev.app_id AS INTEGER)",
+                           "SELECT ctx_id FROM dim_context WHERE chart_type='top_free' AND country=?")
+
+    sql = f"""
+        WITH cur AS (
+            -- по един ред на приложение (най-добрият му ранг в текущия снапшот)
+            SELECT app_id, app_name, developer_name, category, subcategory, MIN(rank) AS rank
             FROM charts
             WHERE {where_base} AND snapshot_date=?
-        """, (*params_base, d))
-        for row in cur.fetchall():
-            app_id = row["app_id"]
-            if app_id not in prev_data:
-                prev_data[app_id] = {
-                    "ranks": [],
-                    "app_name": row["app_name"],
-                    "developer_name": row["developer_name"],
-                    "category": row["category"],
-                    "subcategory": row["subcategory"],
-                }
-            prev_data[app_id]["ranks"].append(row["rank"])
-
-    results: List[Dict[str, Any]] = []
-
-    # still in top
-    for app_id, row in current_data.items():
-        rank_now = row["rank"]
-        app_name = row["app_name"]
-        dev = row["developer_name"]
-        cat = row["category"]
-        subcat = row["subcategory"]
-
-        if app_id not in prev_data:
-            # unified logic with Weekly View
-            if app_id not in all_before_ids:
-                status = "NEW"          # 🆕 never appeared before
-            else:
-                status = "RE-ENTRY"     # 🔁 appeared before but not in last 7 snapshots
-            rank_prev, rank_change = None, None
+            GROUP BY app_id
+        ),
+        prev AS (
+            -- среден ранг за предишните дати; имената са от последния ред (bare columns при MAX())
+            SELECT app_id, MAX(snapshot_date) AS last_seen, app_name, developer_name, category, subcategory,
+                   SUM(rank) / COUNT(*) AS rank_prev
+            FROM charts
+            WHERE {where_base} AND snapshot_date IN ({placeholders_prev})
+            GROUP BY app_id
+        ),
+        cur_prev AS (
+            SELECT c.app_id, c.app_name, c.developer_name, c.category, c.subcategory, c.rank AS current_rank,
+                   (SELECT p.rank_prev FROM prev p WHERE p.app_id=c.app_id) AS previous_rank
+            FROM cur c
+        ),
+        results AS (
+            SELECT app_id, app_name, developer_name, category, subcategory,
+                   current_rank, previous_rank, previous_rank - current_rank AS delta,
+                   CASE
+                       WHEN previous_rank IS NULL THEN
+                           -- появявало ли се е някога преди latest (PK на chart_ranks: app_id, day)
+                           CASE WHEN {seen} THEN 'RE-ENTRY' ELSE 'NEW' END
+                       WHEN previous_rank > current_rank THEN 'MOVER UP'
+                       WHEN previous_rank < current_rank THEN 'MOVER DOWN'
+                       ELSE 'IN TOP'
+                   END AS status
+            FROM cur_prev
+            UNION ALL
+            SELECT p.app_id, p.app_name, p.developer_name, p.category, p.subcategory,
+                   NULL, p.rank_prev, NULL, 'DROPPED'
+            FROM prev p
+            WHERE p.app_id NOT IN (SELECT app_id FROM cur)
+        )
+        SELECT *, current_rank IS NULL AS k_null, COALESCE(current_rank, previous_rank) AS k_rank
+        FROM results
+    """
+    params = [*params_base, latest, *params_base, *prev_dates, *[day_number(latest), country] * 2]
+    return latest, prev_dates, sql, params
 
-        else:
-            ranks = prev_data[app_id]["ranks"]
-            rank_prev = int(sum(ranks) / len(ranks))
-            rank_change = rank_prev - rank_now
-            if rank_change > 0:
-                status = "MOVER UP"
-            elif rank_change < 0:
-                status = "MOVER DOWN"
-            else:
-                status = "IN TOP"
-
-        results.append({
-            "app_id": app_id,
-            "app_name": app_name,
-            "developer": dev,
-            "category": cat,
-            "subcategory": subcat,
-            "current_rank": rank_now,
-            "previous_rank": rank_prev,
-            "delta": rank_change,
-            "status": status,
-            "country": country,
-        })
 
-    # dropped
-    for app_id, pdata in prev_data.items():
-        if app_id not in current_data:
-            ranks = pdata["ranks"]
-            rank_prev = int(sum(ranks) / len(ranks))
-            results.append({
-                "app_id": app_id,
-                "app_name": pdata["app_name"],
-                "developer_name": pdata["developer_name"],
-                "category": pdata["category"],
-                "subcategory": pdata["subcategory"],
-                "current_rank": None,
-                "previous_rank": rank_prev,
-                "delta": None,
-                "status": "DROPPED",
-                "country": country,
-            })
+def _compare_row(r, country: str) -> Dict[str, Any]:
+    return {
+        "app_id": r["app_id"],
+        "app_name": r["app_name"],
+        "developer": r["developer_name"],
+        "developer_name": r["developer_name"],
+        "category": r["category"],
+        "subcategory": r["subcategory"],
+        "current_rank": r["current_rank"],
+        "previous_rank": r["previous_rank"],
+        "delta": r["delta"],
+        "status": r["status"],
+        "country": country,
+    }
+
+
+def _compare_full(country: str, lookback_days: int, category: Optional[str], subcategory: Optional[str]) -> Dict[str, Any]:
+    con = connect_hot(); cur = con.cursor()
+
+    latest, prev_dates, sql, params = _compare_sql(cur, country, category, subcategory, lookback_days)
+    if not latest:
+        con.close()
+        return {"message": "No snapshots found", "results": [], "latest_snapshot": None}
+    if not prev_dates:
+        con.close()
+        return {"message": "Not enough previous snapshots", "results": [], "latest_snapshot": latest}
+
+    con = _covering(con, min(prev_dates)); cur = con.cursor()
+    cur.execute(f"SELECT * FROM ({sql}) ORDER BY k_null, k_rank, app_id", params)
+    results = [_compare_row(r, country) for r in cur.fetchall()]
 
     con.close()
     return {
@@ -440,31 +541,56 @@ def compare_weekly_full(
     }
 
 
+@app.get("/compare/weekly-full")
+def compare_weekly_full(
+    country: str = "US",
+    lookback_days: int = 7,
+    category: Optional[str] = Query(None),
+    subcategory: Optional[str] = Query(None),
+):
+    return FastJSONResponse(_compare_full(country, lookback_days, category, subcategory))
+
+
 # ----- Aliases used by frontend + CSV export ------------------------------------------------
 @app.get("/compare")
 def compare_alias(
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
     country: str = "US",
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
     format: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
-    data = compare_weekly_full(country=country, category=category, subcategory=subcategory, lookback_days=7)
-    # limit only for JSON
-    if (format or "").lower() != "csv":
-        data["results"] = sorted(data["results"], key=lambda r: (r["current_rank"] is None, r["current_rank"] or 999))[:limit]
-        return data
-
-    # CSV export
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["country", "category", "subcategory", "app", "developer", "current_rank", "previous_rank", "delta", "status", "app_id"])
-    for r in data["results"]:
-        writer.writerow([
-            r["country"], r["category"], r["subcategory"], r["app_name"], r.get("developer_name") or "",
-            r["current_rank"], r["previous_rank"], r["delta"], r["status"], r["app_id"]
-        ])
-    return Response(content=output.getvalue(), media_type="text/csv")
+    # CSV export — целият резултат
+    if (format or "").lower() == "csv":
+        data = _compare_full(country, 7, category, subcategory)
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["country", "category", "subcategory", "app", "developer", "current_rank", "previous_rank", "delta", "status", "app_id"])
+        for r in data["results"]:
+            writer.writerow([
+                r["country"], r["category"], r["subcategory"], r["app_name"], r.get("developer_name") or "",
+                r["current_rank"], r["previous_rank"], r["delta"], r["status"], r["app_id"]
+            ])
+        return Response(content=output.getvalue(), media_type="text/csv")
+
+    # JSON — keyset пагинация, лимитът е в самата заявка
+    con = connect_hot(); cur = con.cursor()
+    latest, prev_dates, sql, params = _compare_sql(cur, country, category, subcategory, 7)
+    if not latest or not prev_dates:
+        con.close()
+        return {"message": "Not enough previous snapshots" if latest else "No snapshots found",
+                "results": [], "latest_snapshot": latest, "next_cursor": None}
+    con = _covering(con, min(prev_dates)); cur = con.cursor()
+
+    rows, next_cursor = _keyset_page(cur, sql, params, ("k_null", "k_rank", "app_id"), cursor, limit)
+    con.close()
+    return FastJSONResponse({
+        "latest_snapshot": latest,
+        "previous_snapshots": prev_dates,
+        "results": [_compare_row(r, country) for r in rows],
+        "next_cursor": next_cursor,
+    })
 
 
 @app.get("/reports/weekly")
@@ -474,7 +600,7 @@ def weekly_report(
     subcategory: Optional[str] = None,
     format: Optional[str] = None,
 ):
-    data = compare_weekly_full(country=country, category=category, subcategory=subcategory, lookback_days=7)
+    data = _compare_full(country, 7, category, subcategory)
 
     new_apps = [
         {"rank": r["current_rank"], "app_id": r["app_id"], "app_name": r["app_name"], "developer_name": r.get("developer_name") or ""}
@@ -495,16 +621,21 @@ def weekly_report(
             writer.writerow(["DROPPED", a["rank"], a["app_name"], a["developer_name"], a["app_id"]])
         return Response(content=output.getvalue(), media_type="text/csv")
 
-    return {"latest_snapshot": data["latest_snapshot"], "new": new_apps, "dropped": dropped_apps}
+    return FastJSONResponse({"latest_snapshot": data["latest_snapshot"], "new": new_apps, "dropped": dropped_apps})
 
 
 # ------------------------- 8) Admin: refresh DB (manual) -----------------------------------
 @app.get("/admin/refresh")
 def admin_refresh():
-    info = ensure_database_from_drive(force_if_newer=True)
-    # always (re)check structure afterwards
-    ensure_tables_exist(str(DB_PATH))
-    populate_derived_tables(str(DB_PATH))
+    # същият lock като bootstrap-а — друг worker може да стартира или да опреснява в момента
+    with file_lock(str(BOOTSTRAP_LOCK)):
+        info = ensure_database_from_drive(force_if_newer=True)
+        # always (re)check structure afterwards
+        ensure_tables_exist(str(DB_PATH))
+        populate_derived_tables(str(DB_PATH))
+        Path(str(DB_PATH) + ".bootstrap").write_text(repr(_db_stamp()))
+    if HOT:
+        HOT.refresh()
 
     # return latest snapshot per any country with most recent
     con = connect(); cur = con.cursor()
@@ -516,6 +647,34 @@ def admin_refresh():
 
 
 # ------------------------- 9) History View (Re-Entry Tracker) ----------------------------
+HISTORY_KEY = ("date", "s_ord", "rank", "app_id", "country", "category", "k_sub")
+
+
+def _history_row(r) -> Dict[str, Any]:
+    row = {
+        "date": r["date"],
+        "status": r["status"],
+        "app_id": r["app_id"],
+        "app_name": r["app_name"],
+        "rank": r["rank"],
+    }
+    if r["status"] == "NEW":
+        row.update({
+            "replaced_app_id": r["replaced_app_id"],
+            "replaced_app_name": r["replaced_app_name"],
+            "replaced_prev_rank": r["replaced_prev_rank"],
+            "replaced_current_rank": r["replaced_current_rank"],
+            "replaced_status": r["replaced_status"],
+        })
+    elif r["status"] == "DROPPED":
+        row.update({
+            "replaced_by_app_id": r["replaced_by_app_id"],
+            "replaced_by_app_name": r["replaced_by_app_name"],
+            "replaced_by_rank": r["replaced_by_rank"],
+        })
+    return row
+
+
 @app.get("/history")
 def history_view(
     country: Optional[str] = Query(None, description="Country code (e.g. US, FR)"),
@@ -525,125 +684,47 @@ def history_view(
     date: Optional[str] = Query(None, description="Filter by specific snapshot_date (YYYY-MM-DD)"),
     status: Optional[str] = Query(None, description="Filter by status: NEW, DROPPED, RE-ENTRY"),
     export: Optional[str] = Query(None, description="Set to csv for CSV export"),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
-    con = connect(); cur = con.cursor()
+    con = connect_hot(); cur = con.cursor()
 
     # базов WHERE по измерения (без дата)
     where_base, params_base = _where({"country": country, "category": category, "subcategory": subcategory})
 
     # последните N дати за наличните филтри
-    cur.execute(f"""
-        SELECT DISTINCT snapshot_date FROM charts
-        WHERE {where_base}
-        ORDER BY snapshot_date DESC LIMIT ?
-    """, (*params_base, lookback_days))
-    dates_desc = [r[0] for r in cur.fetchall()]
+    dates_desc = _recent_dates(cur, {"country": country, "category": category, "subcategory": subcategory}, lookback_days)
     if len(dates_desc) < 2:
         con.close()
         return {"message": "Not enough data for history.", "results": [], "available_dates": dates_desc}
 
     dates = sorted(dates_desc)  # ascending (хронология)
-    results = []
-
-    for i in range(1, len(dates)):
-        prev_day, curr_day = dates[i - 1], dates[i]
-
-        # вчера
-        cur.execute(f"""
-            SELECT app_id, app_name, rank
-            FROM charts
-            WHERE {where_base} AND snapshot_date=?
-        """, (*params_base, prev_day))
-        prev_list = cur.fetchall()
-        prev_by_id   = {r["app_id"]: dict(r) for r in prev_list}
-        prev_by_rank = {r["rank"]: dict(r) for r in prev_list}
-        prev_ids     = set(prev_by_id.keys())
-
-        # днес
-        cur.execute(f"""
-            SELECT app_id, app_name, rank
-            FROM charts
-            WHERE {where_base} AND snapshot_date=?
-        """, (*params_base, curr_day))
-        curr_list = cur.fetchall()
-        curr_by_id   = {r["app_id"]: dict(r) for r in curr_list}
-        curr_by_rank = {r["rank"]: dict(r) for r in curr_list}
-        curr_ids     = set(curr_by_id.keys())
-
-        # --- NEW: кого е изместил (същия ранг от вчера) ---
-        for app_id in (curr_ids - prev_ids):
-            rank_now = curr_by_id[app_id]["rank"]
-            replaced = prev_by_rank.get(rank_now)
-            replaced_id   = replaced["app_id"]  if replaced else None
-            replaced_name = replaced["app_name"] if replaced else None
-            replaced_now_rank = None
-            replaced_status   = None
-            if replaced_id:
-                if replaced_id in curr_by_id:
-                    replaced_now_rank = curr_by_id[replaced_id]["rank"]
-                    replaced_status   = "STILL_IN_TOP"
-                else:
-                    replaced_status   = "DROPPED"
-
-            results.append({
-                "date": curr_day,
-                "status": "NEW",
-                "app_id": app_id,
-                "app_name": curr_by_id[app_id]["app_name"],
-                "rank": rank_now,
-                "replaced_app_id": replaced_id,
-                "replaced_app_name": replaced_name,
-                "replaced_prev_rank": rank_now if replaced_id else None,
-                "replaced_current_rank": replaced_now_rank,
-                "replaced_status": replaced_status,
-            })
-
-        # --- DROPPED: кой го е заменил днес на същия ранг ---
-        for app_id in (prev_ids - curr_ids):
-            rank_prev = prev_by_id[app_id]["rank"]
-            replacer  = curr_by_rank.get(rank_prev)
-            replacer_id   = replacer["app_id"]  if replacer else None
-            replacer_name = replacer["app_name"] if replacer else None
-
-            results.append({
-                "date": curr_day,
-                "status": "DROPPED",
-                "app_id": app_id,
-                "app_name": prev_by_id[app_id]["app_name"],
-                "rank": rank_prev,
-                "replaced_by_app_id": replacer_id,
-                "replaced_by_app_name": replacer_name,
-                "replaced_by_rank": rank_prev if replacer_id else None,
-            })
-
-        # --- RE-ENTRY: бил е преди два дни, липсвал вчера, днес отново е вътре ---
-        if i > 1:
-            prev_prev_day = dates[i - 2]
-            cur.execute(f"""
-                SELECT app_id FROM charts
-                WHERE {where_base} AND snapshot_date=?
-            """, (*params_base, prev_prev_day))
-            prev_prev_ids = {r[0] for r in cur.fetchall()}
-            for app_id in (curr_ids & prev_prev_ids) - prev_ids:
-                results.append({
-                    "date": curr_day,
-                    "status": "RE-ENTRY",
-                    "app_id": app_id,
-                    "app_name": curr_by_id[app_id]["app_name"],
-                    "rank": curr_by_id[app_id]["rank"],
-                })
-
-    con.close()
+    con = _covering(con, dates[0]); cur = con.cursor()
+
+    # събитията са предварително изчислени (history_events); RE-ENTRY изисква и завчерашния ден в прозореца
+    placeholders = ",".join(["?"] * (len(dates) - 1))
+    sql = f"""
+        SELECT snapshot_date AS date, status, s_ord, rank, app_id, app_name, country, category,
+               COALESCE(subcategory, '') AS k_sub,
+               replaced_app_id, replaced_app_name, replaced_prev_rank, replaced_current_rank, replaced_status,
+               replaced_by_app_id, replaced_by_app_name, replaced_by_rank
+        FROM history_events
+        WHERE {where_base} AND snapshot_date IN ({placeholders})
+          AND NOT (status = 'RE-ENTRY' AND snapshot_date = ?)
+    """
+    params = [*params_base, *dates[1:], dates[1]]
 
-    # филтри върху резултата
+    # филтри върху резултата (в самата заявка)
     if date:
-        results = [r for r in results if r["date"] == date]
+        sql += " AND snapshot_date = ?"; params.append(date)
     if status:
-        status_u = status.upper()
-        results = [r for r in results if r["status"] == status_u]  # MOVED изобщо не се генерира вече
+        sql += " AND status = ?"; params.append(status.upper())  # MOVED изобщо не се генерира вече
 
     # CSV експорт (динамичен — по активните филтри)
     if export and export.lower() == "csv":
+        cur.execute(f"SELECT * FROM ({sql}) ORDER BY {', '.join(HISTORY_KEY)}", params)
+        results = [_history_row(r) for r in cur.fetchall()]
+        con.close()
         output = io.StringIO()
         w = csv.writer(output)
         w.writerow([
@@ -660,17 +741,78 @@ def history_view(
             ])
         return Response(content=output.getvalue(), media_type="text/csv")
 
-    return {
+    rows, next_cursor = _keyset_page(cur, sql, params, HISTORY_KEY, cursor, limit)
+    con.close()
+    results = [_history_row(r) for r in rows]
+
+    return FastJSONResponse({
         "country": country,
         "category": category,
         "subcategory": subcategory,
         "available_dates": dates,
         "filters": {"date": date, "status": status},
         "total_events": len(results),
-        "results": results
-    }
+        "results": results,
+        "next_cursor": next_cursor,
+    })
 
 # ------------------------- Weekly Insights (NEW / RE-ENTRY / DROPPED) -----------------------
+def _weekly_sql(where_base: str, params_base: List[Any], week_dates: List[str], prev_dates: List[str]):
+    """
+    NEW / RE-ENTRY / DROPPED за седмицата като една SQL заявка (по един ред на приложение,
+    данните са от последния му ред в съответната седмица). Ключ за сортиране: k_null, k_rank, app_id.
+    """
+    placeholders_week = ",".join(["?"] * len(week_dates))
+    placeholders_prev = ",".join(["?"] * len(prev_dates)) or "NULL"
+    cols = "app_id, bundle_id, app_name, developer_name, category, subcategory, rank, app_store_url, app_url, icon_url"
+    seen = seen_before_sql("CAST(w.app_id AS INTEGER)", f"SELECT ctx_id FROM dim_context WHERE {where_base}")
+    sql = f"""
+        WITH week AS (
+            -- по един ред на приложение — последният му ред в седмицата (bare columns при MAX())
+            SELECT {cols}, MAX(snapshot_date) AS last_seen
+            FROM charts WHERE {where_base} AND snapshot_date IN ({placeholders_week}) AND app_id IS NOT NULL
+            GROUP BY app_id
+        ),
+        prev AS (
+            SELECT {cols}, MAX(snapshot_date) AS last_seen
+            FROM charts WHERE {where_base} AND snapshot_date IN ({placeholders_prev}) AND app_id IS NOT NULL
+            GROUP BY app_id
+        ),
+        rows AS (
+            -- всички преди тази седмица (PK на chart_ranks: app_id, day)
+            SELECT CASE WHEN {seen} THEN 'RE-ENTRY' ELSE 'NEW' END AS status,
+                   w.rank, w.app_id, w.app_name, w.developer_name, w.bundle_id, w.category, w.subcategory,
+                   w.app_store_url, w.app_url, w.icon_url
+            FROM week w
+            WHERE w.app_id NOT IN (SELECT app_id FROM prev)
+            UNION ALL
+            SELECT 'DROPPED', NULL, p.app_id, p.app_name, p.developer_name, p.bundle_id, p.category, p.subcategory,
+                   p.app_store_url, p.app_url, p.icon_url
+            FROM prev p
+            WHERE p.app_id NOT IN (SELECT app_id FROM week)
+        )
+        SELECT *, rank IS NULL AS k_null, COALESCE(rank, 999) AS k_rank FROM rows
+    """
+    params = [*params_base, *week_dates, *params_base, *prev_dates, *[day_number(week_dates[0]), *params_base] * 2]
+    return sql, params
+
+
+def _weekly_row(r) -> Dict[str, Any]:
+    return {
+        "status": r["status"],
+        "rank": r["rank"],
+        "app_id": r["app_id"],
+        "app_name": r["app_name"],
+        "developer_name": r["developer_name"],
+        "bundle_id": r["bundle_id"],
+        "category": r["category"],
+        "subcategory": r["subcategory"],
+        "app_store_url": r["app_store_url"],
+        "app_url": r["app_url"],
+        "icon_url": r["icon_url"],
+    }
+
+
 @app.get("/weekly/insights")
 def weekly_insights(
     country: str = "US",
@@ -679,149 +821,868 @@ def weekly_insights(
     lookback_days: int = 7,
     status: Optional[str] = Query(None),
     format: Optional[str] = Query(None),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
     """
     NEW      = app никога не е присъствал в базата ПРЕДИ ТАЗИ седмица.
     RE-ENTRY = app е присъствал някога преди, НЕ е бил в миналата седмица, но е в текущата.
     DROPPED  = app е бил миналата седмица, но го няма в текущата.
     """
-    con = connect(); cur = con.cursor()
+    con = connect_hot(); cur = con.cursor()
     where_base, params_base = _where({"country": country, "category": category, "subcategory": subcategory})
 
+    filters = {"country": country, "category": category, "subcategory": subcategory}
+
     # текуща седмица
-    cur.execute(f"""
-        SELECT DISTINCT snapshot_date FROM charts
-        WHERE {where_base}
-        ORDER BY snapshot_date DESC LIMIT ?
-    """, (*params_base, lookback_days))
-    week_desc = [r[0] for r in cur.fetchall()]
+    week_desc = _recent_dates(cur, filters, lookback_days)
     if not week_desc:
         con.close()
-        return {"rows": [], "counts": {}, "week_start": None, "week_end": None}
+        return {"rows": [], "counts": {}, "week_start": None, "week_end": None, "next_cursor": None}
 
     week_dates = sorted(week_desc)
     week_start, week_end = week_dates[0], week_dates[-1]
 
     # минала седмица
-    cur.execute(f"""
-        SELECT DISTINCT snapshot_date FROM charts
-        WHERE {where_base} AND snapshot_date < ?
-        ORDER BY snapshot_date DESC LIMIT ?
-    """, (*params_base, week_start, lookback_days))
-    prev_dates = sorted([r[0] for r in cur.fetchall()])
+    prev_dates = sorted(_recent_dates(cur, filters, lookback_days, before=week_start))
+    con = _covering(con, (prev_dates or week_dates)[0]); cur = con.cursor()
 
-    # текущи приложения
-    placeholders_week = ",".join(["?"] * len(week_dates))
-    cur.execute(f"""
-        SELECT 
-        app_id,
-        bundle_id,
-        app_name,
-        developer_name,
-        category,
-        subcategory,
-        rank,
-        app_store_url,
-        app_url,
-        icon_url,
-    FROM charts
-    WHERE {where_base} AND snapshot_date IN ({placeholders_week})
-    """, (*params_base, *week_dates))
-    week_apps = {r["app_id"]: dict(r) for r in cur.fetchall()}
-    week_ids = set(week_apps.keys())
-
-    # миналата седмица
-    prev_ids = set()
-    if prev_dates:
-        placeholders_prev = ",".join(["?"] * len(prev_dates))
-        cur.execute(f"""
-            SELECT DISTINCT app_id FROM charts
-            WHERE {where_base} AND snapshot_date IN ({placeholders_prev})
-        """, (*params_base, *prev_dates))
-        prev_ids = {r[0] for r in cur.fetchall() if r[0]}
-
-    # всички преди тази седмица (за NEW)
-    cur.execute(f"""
-        SELECT DISTINCT app_id FROM charts
-        WHERE {where_base} AND snapshot_date < ?
-    """, (*params_base, week_start))
-    all_before_ids = {r[0] for r in cur.fetchall() if r[0]}
+    sql, params = _weekly_sql(where_base, params_base, week_dates, prev_dates)
 
-    rows = []
     counts = {"NEW": 0, "RE-ENTRY": 0, "DROPPED": 0}
-
-    # NEW & RE-ENTRY
-    for app_id, info in week_apps.items():
-        info = dict(info)  # ✅ безопасно копие на данните за приложението
-        if app_id not in all_before_ids:
-            st = "NEW"
-        elif app_id in all_before_ids and app_id not in prev_ids:
-            st = "RE-ENTRY"
-        else:
-            continue
-        counts[st] += 1
-        rows.append({
-            "status": st,
-            "rank": info.get("rank"),
-            "app_id": app_id,
-            "app_name": info.get("app_name", ""),
-            "developer_name": info.get("developer_name", ""),
-            "bundle_id": info.get("bundle_id", ""),
-            "category": info.get("category", ""),
-            "subcategory": info.get("subcategory", ""),
-            "app_store_url": info.get("app_store_url", ""),
-            "app_url": info.get("app_url", ""),
-            "icon_url": info.get("icon_url", ""),
-        })
-
-    # DROPPED
-    dropped_ids = prev_ids - week_ids
-    if dropped_ids:
-        placeholders_drop = ",".join(["?"] * len(dropped_ids))
-        cur.execute(f"""
-            SELECT app_id, app_name, developer_name, category, subcategory,
-                   app_store_url, app_url, icon_url
-            FROM charts WHERE app_id IN ({placeholders_drop})
-            GROUP BY app_id
-        """, (*dropped_ids,))
-        for r in cur.fetchall():
-            rd = dict(r)  # ✅ безопасно копие на реда
-            rows.append({
-                "status": "DROPPED",
-                "rank": None,
-                "app_id": rd.get("app_id", ""),
-                "app_name": rd.get("app_name", ""),
-                "developer_name": rd.get("developer_name", ""),
-                "bundle_id": rd.get("bundle_id", ""),
-                "category": rd.get("category", ""),
-                "subcategory": rd.get("subcategory", ""),
-                "app_store_url": rd.get("app_store_url", ""),
-                "app_url": rd.get("app_url", ""),
-                "icon_url": rd.get("icon_url", ""),
-            })
-        counts["DROPPED"] = len(dropped_ids)
-
-    con.close()
-    counts["ALL"] = len(rows)
+    cur.execute(f"SELECT status, COUNT(*) FROM ({sql}) GROUP BY status", params)
+    for st, n in cur.fetchall():
+        counts[st] = n
+    counts["ALL"] = sum(counts.values())
 
     # филтър по статус
     if status:
-        rows = [r for r in rows if r["status"] == status.upper()]
+        sql = f"SELECT * FROM ({sql}) WHERE status = ?"
+        params = [*params, status.upper()]
 
     if (format or "").lower() == "csv":
+        cur.execute(f"SELECT * FROM ({sql}) ORDER BY k_null, k_rank, app_id", params)
+        rows = [_weekly_row(r) for r in cur.fetchall()]
+        con.close()
         out = io.StringIO(); w = csv.writer(out)
         w.writerow(["status","rank","app_id","app_name","developer_name","bundle_id","category","subcategory"])
         for r in rows:
             w.writerow([r["status"], r["rank"], r["app_id"], r["app_name"], r["developer_name"], r["bundle_id"], r["category"], r["subcategory"]])
         return Response(content=out.getvalue(), media_type="text/csv")
 
-    return {
+    page, next_cursor = _keyset_page(cur, sql, params, ("k_null", "k_rank", "app_id"), cursor, limit)
+    con.close()
+
+    return FastJSONResponse({
         "week_start": week_start,
         "week_end": week_end,
         "counts": counts,
-        "rows": sorted(rows, key=lambda x: (x["rank"] is None, x["rank"] or 999)),
+        "rows": [_weekly_row(r) for r in page],
+        "next_cursor": next_cursor,
+    })
+
+
+
+# ------------------------- 10) App history (rank trajectory) -------------------------------
+@app.get("/apps/{app_id}/history")
+def app_history(
+    app_id: str,
+    days: int = Query(30, ge=1, description="How many days back from the latest snapshot"),
+    chart_type: str = "top_free",
+):
+    """
+    Rank time series for one app in every country/category/subcategory, in one response.
+    Served from chart_ranks (integer keys, app-major primary key).
+    """
+    con = connect(); cur = con.cursor()
+
+    cur.execute("SELECT MAX(snapshot_date) FROM charts")
+    latest = cur.fetchone()[0]
+    if not latest:
+        con.close()
+        return {"app_id": app_id, "series": [], "from": None, "to": None}
+
+    cur.execute("SELECT date(?, ?)", (latest, f"-{days - 1} day"))
+    since = cur.fetchone()[0]
+
+    series: Dict[tuple, Dict[str, Any]] = {}
+    for p in app_ranks(con, app_id, since, latest, chart_type):
+        d, country, cat, subcat, rank = p["snapshot_date"], p["country"], p["category"], p["subcategory"], p["rank"]
+        key = (country, cat, subcat)
+        s = series.get(key)
+        if s is None:
+            s = series[key] = {"country": country, "category": cat, "subcategory": subcat, "points": []}
+        s["points"].append({"date": d, "rank": rank})
+
+    app_name = developer_name = None
+    if series:
+        # последният ред на приложението: ключът от chart_ranks, после точно търсене по PK на charts
+        cur.execute("""
+            SELECT c.app_name, c.developer_name
+            FROM (SELECT day, ctx_id, rank FROM chart_ranks WHERE app_id=? ORDER BY day DESC LIMIT 1) r
+            JOIN dim_context x ON x.ctx_id = r.ctx_id
+            JOIN charts c
+              ON c.snapshot_date = date(r.day * 86400, 'unixepoch') AND c.country = x.country
+             AND c.category = x.category AND c.subcategory IS x.subcategory
+             AND c.chart_type = x.chart_type AND c.rank = r.rank
+            LIMIT 1
+        """, (int(app_id),))
+        r = cur.fetchone()
+        if r:
+            app_name, developer_name = r["app_name"], r["developer_name"]
+    con.close()
+
+    out = []
+    for s in series.values():
+        pts = s["points"]
+        pts.sort(key=lambda p: p["date"])
+        s["best_rank"] = min(p["rank"] for p in pts)
+        s["latest_rank"] = pts[-1]["rank"] if pts[-1]["date"] == latest else None
+        s["days_in_chart"] = len(pts)
+        out.append(s)
+    out.sort(key=lambda s: (s["latest_rank"] is None, s["best_rank"], s["country"], s["category"] or "", s["subcategory"] or ""))
+
+    return FastJSONResponse({
+        "app_id": app_id,
+        "app_name": app_name,
+        "developer_name": developer_name,
+        "chart_type": chart_type,
+        "from": since,
+        "to": latest,
+        "total_series": len(out),
+        "series": out,
+    })
+
+# ------------------------- 11) Search (FTS5) -----------------------------------------------
+@app.get("/search")
+def search(
+    q: str = Query(..., min_length=1, description="Prefix search over app name, developer and bundle id"),
+    limit: int = Query(20, ge=1, le=100),
+    chart_type: str = "top_free",
+):
+    con = connect(); cur = con.cursor()
+    hits = search_apps(con, q, limit)
+    if not hits:
+        con.close()
+        return {"query": q, "total_results": 0, "results": []}
+
+    # последни позиции в класациите за всяко намерено приложение (PK на chart_ranks: app_id, day)
+    ids = [int(h["app_id"]) for h in hits]
+    values = ",".join(["(?)"] * len(ids))
+    cur.execute(f"""
+        WITH latest(app_id, d) AS (
+            SELECT column1, (SELECT MAX(day) FROM chart_ranks WHERE app_id=column1)
+            FROM (VALUES {values})
+        )
+        SELECT r.app_id, r.day, x.country, x.category, x.subcategory, r.rank
+        FROM latest
+        JOIN chart_ranks r ON r.app_id=latest.app_id AND r.day=latest.d
+        JOIN dim_context x ON x.ctx_id=r.ctx_id
+        WHERE x.chart_type=?
+        ORDER BY r.rank
+    """, (*ids, chart_type))
+    positions: Dict[str, List[Dict[str, Any]]] = {}
+    for r in cur.fetchall():
+        positions.setdefault(str(r["app_id"]), []).append({
+            "snapshot_date": day_date(r["day"]),
+            "country": r["country"],
+            "category": r["category"],
+            "subcategory": r["subcategory"],
+            "rank": r["rank"],
+        })
+    con.close()
+
+    for h in hits:
+        h["latest_positions"] = positions.get(h["app_id"], [])
+    return FastJSONResponse({"query": q, "total_results": len(hits), "results": hits})
+
+
+# ------------------------- 12) Long-range app stats (rollups) ------------------------------
+STATS_SORTS = {
+    "best_rank": lambda r: (r["best_rank"], r["avg_rank"]),
+    "avg_rank": lambda r: (r["avg_rank"], r["best_rank"]),
+    "days_in_chart": lambda r: (-r["days_in_chart"], r["avg_rank"]),
+    "entries": lambda r: (-r["entries"], r["best_rank"]),
+    "exits": lambda r: (-r["exits"], r["best_rank"]),
+}
+
+
+@app.get("/stats/apps")
+def stats_apps(
+    country: str = "US",
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    days: int = Query(90, ge=1, le=3660, description="Window size when date_from is not given"),
+    sort: str = Query("best_rank", description="best_rank | avg_rank | days_in_chart | entries | exits"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Per-app stats over an arbitrary date range (days in chart, avg/best/worst rank, entries, exits).
+    Whole months/weeks are read from chart_rollups, only the ragged edges from the daily rows.
+    """
+    con = connect(); cur = con.cursor()
+    hi = date_to or _latest_snapshot_for_country(cur, country)
+    if not hi:
+        con.close()
+        return {"from": None, "to": None, "total_results": 0, "results": []}
+    if date_from:
+        lo = date_from
+    else:
+        cur.execute("SELECT date(?, ?)", (hi, f"-{days - 1} day"))
+        lo = cur.fetchone()[0]
+
+    where_base, params_base = _where({"country": country, "category": category, "subcategory": subcategory})
+    accs, plan = range_stats(con, lo, hi, "AND " + where_base, tuple(params_base))
+
+    rows = []
+    for (c, chart_type, cat, subcat, app_id), (n, rank_sum, best, worst, first, last, entries, exits) in accs.items():
+        rows.append({
+            "app_id": app_id, "country": c, "category": cat, "subcategory": subcat,
+            "days_in_chart": n, "avg_rank": round(rank_sum / n, 2), "best_rank": best, "worst_rank": worst,
+            "first_day": first, "last_day": last, "entries": entries, "exits": exits,
+        })
+    rows.sort(key=STATS_SORTS.get(sort, STATS_SORTS["best_rank"]))
+    total = len(rows)
+    rows = rows[:limit]
+
+    # имена от FTS таблицата (rowid = числовото app_id)
+    ids = [int(r["app_id"]) for r in rows if r["app_id"].isdigit()]
+    names: Dict[str, tuple] = {}
+    if ids:
+        cur.execute(
+            f"SELECT rowid, app_name, developer_name FROM app_search WHERE rowid IN ({','.join(['?'] * len(ids))})",
+            ids,
+        )
+        names = {str(r[0]): (r[1], r[2]) for r in cur.fetchall()}
+    con.close()
+    for r in rows:
+        r["app_name"], r["developer_name"] = names.get(r["app_id"], (None, None))
+
+    return FastJSONResponse({
+        "country": country,
+        "from": lo,
+        "to": hi,
+        "plan": {"months": plan["month"], "weeks": plan["week"], "daily_days": plan["days"]},
+        "total_results": total,
+        "results": rows,
+    })
+
+
+# ------------------------- 13) Metadata changes (SCD history) -------------------------------
+@app.get("/metadata/changes")
+def metadata_changes(
+    country: str = "US",
+    field: str = Query("rating", description=" | ".join(META_COLS)),
+    days: int = Query(7, ge=1, le=3660),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Apps whose lookup field (rating, price, ...) changed in the last `days`, newest first, old -> new value."""
+    if field not in META_COLS:
+        return {"message": f"Unknown field '{field}'", "fields": list(META_COLS), "results": []}
+    con = connect(); cur = con.cursor()
+    latest = _latest_snapshot_for_country(cur, country)
+    if not latest:
+        con.close()
+        return {"country": country, "field": field, "total_results": 0, "results": []}
+    cur.execute("SELECT date(?, ?)", (latest, f"-{days - 1} day"))
+    since = cur.fetchone()[0]
+
+    # версиите от ix_app_metadata_changes; предишната версия е тази, която е затворена в същия ден
+    cur.execute(f"""
+        SELECT h.app_id, h.valid_from, p.{field} AS old_value, h.{field} AS new_value
+        FROM app_metadata_history h
+        JOIN app_metadata_history p
+          ON p.app_id = h.app_id AND p.country = h.country AND p.valid_to = h.valid_from
+        WHERE h.country = ? AND h.valid_from >= ? AND h.{field} IS NOT p.{field}
+        ORDER BY h.valid_from DESC, h.app_id
+        LIMIT ?
+    """, (country, since, limit))
+    rows = [dict(r) for r in cur.fetchall()]
+
+    ids = [int(r["app_id"]) for r in rows if r["app_id"].isdigit()]
+    names: Dict[str, str] = {}
+    if ids:
+        cur.execute(f"SELECT rowid, app_name FROM app_search WHERE rowid IN ({','.join(['?'] * len(ids))})", ids)
+        names = {str(r[0]): r[1] for r in cur.fetchall()}
+    con.close()
+    for r in rows:
+        r["app_name"] = names.get(r["app_id"])
+        r["date"] = r.pop("valid_from")
+
+    return FastJSONResponse({
+        "country": country, "field": field, "from": since, "to": latest,
+        "total_results": len(rows), "results": rows,
+    })
+
+
+@app.get("/apps/{app_id}/metadata")
+def app_metadata_versions(app_id: str, country: Optional[str] = None):
+    """All metadata versions of one app (per country), with [valid_from, valid_to) ranges."""
+    con = connect(); cur = con.cursor()
+    where, params = ("AND country=?", [country]) if country else ("", [])
+    cur.execute(f"""
+        SELECT country, valid_from, valid_to, {', '.join(META_COLS)}
+        FROM app_metadata_history WHERE app_id=? {where}
+        ORDER BY country, valid_from
+    """, [app_id, *params])
+    versions = [dict(r) for r in cur.fetchall()]
+    con.close()
+    return FastJSONResponse({"app_id": app_id, "total_versions": len(versions), "versions": versions})
+
+
+# ------------------------- 14) Dashboard (compare + weekly + meta in one pass) -------------
+def _first_seen(con, app_ids, ctx_ids: List[int]) -> Dict[int, int]:
+    """
+    Първият ден на всяко приложение в контекстите (PK на chart_ranks: app_id, day — спира на първия ред;
+    за архивираните месеци — archived_spans).
+    """
+    if not ctx_ids:
+        return {}
+    marks = ",".join(str(int(c)) for c in ctx_ids)
+    sql = f"""
+        SELECT MIN(day) FROM (
+            SELECT * FROM (SELECT day FROM chart_ranks WHERE app_id=?1 AND ctx_id IN ({marks}) ORDER BY day LIMIT 1)
+            UNION ALL
+            SELECT first_day FROM archived_spans WHERE app_id=?1 AND ctx_id IN ({marks})
+        )
+    """
+    out = {}
+    for a in app_ids:
+        day = con.execute(sql, (a,)).fetchone()[0]
+        if day is not None:
+            out[a] = day
+    return out
+
+
+def _chart_rows(con, keys: List[tuple]) -> Dict[tuple, sqlite3.Row]:
+    """Пълните charts редове за ключове (day, ctx_id, rank) — по PK, само за редовете на страницата."""
+    if not keys:
+        return {}
+    cur = con.execute(f"""
+        WITH k(day, ctx_id, rank) AS (VALUES {','.join(['(?, ?, ?)'] * len(keys))})
+        SELECT k.day, k.ctx_id, k.rank, c.app_id, c.app_name, c.developer_name, c.bundle_id,
+               c.category, c.subcategory, c.app_store_url, c.app_url, c.icon_url
+        FROM k
+        JOIN dim_context x ON x.ctx_id = k.ctx_id
+        JOIN charts c
+          ON c.snapshot_date = date(k.day * 86400, 'unixepoch') AND c.country = x.country
+         AND c.category = x.category AND c.subcategory IS x.subcategory
+         AND c.chart_type = x.chart_type AND c.rank = k.rank
+    """, [v for key in keys for v in key])
+    return {(r["day"], r["ctx_id"], r["rank"]): r for r in cur.fetchall()}
+
+
+def _page(rows: List[Dict[str, Any]], key, limit: int):
+    """Първата страница + next_cursor във формата на _keyset_page (продължава се през /compare или /weekly/insights)."""
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], _encode_cursor(list(key(rows[limit - 1])))
+
+
+@app.get("/dashboard")
+def dashboard(
+    country: str = "US",
+    category: Optional[str] = Query(None),
+    subcategory: Optional[str] = Query(None),
+    lookback_days: int = 7,
+    status: Optional[str] = Query(None, description="weekly status filter: NEW / RE-ENTRY / DROPPED"),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    /compare + /weekly/insights + /meta за едно сменяне на филтър. Датите и ранговете са от едно четене
+    на chart_ranks, „виждано ли е преди“ — по веднъж на приложение, charts се чете само за върнатите
+    редове. Резултатите (и next_cursor-ите) са същите като на отделните маршрути.
+    """
+    con = connect_hot()
+    filters = {"country": country, "category": category, "subcategory": subcategory}
+
+    # дати: compare е по държавата, weekly — по филтрите (текуща + минала седмица наведнъж)
+    country_ctx, filter_ctx = context_ids(con, {"country": country}), context_ids(con, filters)
+    country_days = [day_number(d) for d in recent_days(con, country_ctx, lookback_days + 1)]
+    filter_days = [day_number(d) for d in recent_days(con, filter_ctx, 2 * lookback_days)]
+    latest, prev_days = (country_days[0], country_days[1:]) if country_days else (None, [])
+    week_days, week_prev = sorted(filter_days[:lookback_days]), sorted(filter_days[lookback_days:])
+
+    # редовете на деня се подреждат като в PK на charts — при равенство печели редът, който SQL вариантът среща пръв
+    ctx_order = {}
+    if filter_ctx:
+        cur = con.execute(f"""
+            SELECT ctx_id FROM dim_context WHERE ctx_id IN ({','.join(map(str, filter_ctx))})
+            ORDER BY country, category, subcategory
+        """)
+        ctx_order = {r[0]: i for i, r in enumerate(cur.fetchall())}
+
+    # едно четене на chart_ranks за всички дати
+    days = sorted({*([latest] if latest else []), *prev_days, *week_days, *week_prev})
+    con = _covering(con, day_date(days[0]) if days else None)
+    by_day: Dict[int, List[tuple]] = {}
+    if days and filter_ctx:
+        cur = con.execute(f"""
+            SELECT day, app_id, ctx_id, rank FROM chart_ranks
+            WHERE day IN ({','.join(['?'] * len(days))}) AND ctx_id IN ({','.join(map(str, filter_ctx))})
+        """, days)
+        for d, a, c, rk in cur.fetchall():
+            by_day.setdefault(d, []).append((a, c, rk))
+        for rows in by_day.values():
+            rows.sort(key=lambda t: (ctx_order[t[1]], t[2]))
+
+    def last_rows(ds: List[int]) -> Dict[int, tuple]:
+        """app_id -> (day, ctx_id, rank) на последния му ред в датите (първият по реда на charts в деня)."""
+        out: Dict[int, tuple] = {}
+        for d in reversed(ds):
+            for a, c, rk in by_day.get(d, []):
+                if a not in out:
+                    out[a] = (d, c, rk)
+        return out
+
+    # compare: най-добрият ранг в latest срещу средния ранг в предишните дати
+    if latest is None:
+        compare = {"message": "No snapshots found", "results": [], "latest_snapshot": None, "next_cursor": None}
+    elif not prev_days:
+        compare = {"message": "Not enough previous snapshots", "results": [], "latest_snapshot": day_date(latest),
+                   "next_cursor": None}
+    else:
+        now: Dict[int, tuple] = {}
+        for a, c, rk in by_day.get(latest, []):
+            o = now.get(a)
+            if o is None or rk < o[2]:
+                now[a] = (latest, c, rk)
+        totals: Dict[int, List[int]] = {}
+        for d in prev_days:
+            for a, c, rk in by_day.get(d, []):
+                t = totals.setdefault(a, [0, 0])
+                t[0] += rk; t[1] += 1
+        last_prev = last_rows(prev_days)
+        seen = _first_seen(con, [a for a in now if a not in totals], country_ctx)
+
+        results = []  # (k_null, k_rank, app_id като текст, статус, ключ на реда, текущ ранг, предишен ранг)
+        for a, key in now.items():
+            rk = key[2]
+            previous = totals[a][0] // totals[a][1] if a in totals else None
+            if previous is None:
+                st = "RE-ENTRY" if seen.get(a, latest) < latest else "NEW"
+            elif previous > rk:
+                st = "MOVER UP"
+            elif previous < rk:
+                st = "MOVER DOWN"
+            else:
+                st = "IN TOP"
+            results.append((0, rk, str(a), st, key, rk, previous))
+        for a, (s, n) in totals.items():
+            if a not in now:
+                results.append((1, s // n, str(a), "DROPPED", last_prev[a], None, s // n))
+        results.sort(key=lambda x: x[:3])
+        page, next_cursor = _page(results, lambda x: x[:3], limit)
+        detail = _chart_rows(con, [x[4] for x in page])
+        out = []
+        for _, _, app_id, st, key, rk, previous in page:
+            r = detail[key]
+            out.append(_compare_row({
+                "app_id": app_id, "app_name": r["app_name"], "developer_name": r["developer_name"],
+                "category": r["category"], "subcategory": r["subcategory"], "current_rank": rk,
+                "previous_rank": previous, "delta": previous - rk if rk is not None and previous is not None else None,
+                "status": st,
+            }, country))
+        compare = {
+            "latest_snapshot": day_date(latest),
+            "previous_snapshots": [day_date(d) for d in prev_days],
+            "total_results": len(results),
+            "results": out,
+            "next_cursor": next_cursor,
+        }
+
+    # weekly: последният ред на приложение в текущата и в миналата седмица
+    if not week_days:
+        weekly = {"rows": [], "counts": {}, "week_start": None, "week_end": None, "next_cursor": None}
+    else:
+        week, last_week = last_rows(week_days), last_rows(week_prev)
+        start = week_days[0]
+        seen = _first_seen(con, [a for a in week if a not in last_week], filter_ctx)
+        rows = [(0, key[2], str(a), "RE-ENTRY" if seen.get(a, start) < start else "NEW", key)
+                for a, key in week.items() if a not in last_week]
+        rows += [(1, 999, str(a), "DROPPED", key) for a, key in last_week.items() if a not in week]
+        counts = {"NEW": 0, "RE-ENTRY": 0, "DROPPED": 0}
+        for x in rows:
+            counts[x[3]] += 1
+        counts["ALL"] = sum(counts.values())
+        if status:
+            rows = [x for x in rows if x[3] == status.upper()]
+        rows.sort(key=lambda x: x[:3])
+        page, next_cursor = _page(rows, lambda x: x[:3], limit)
+        detail = _chart_rows(con, [x[4] for x in page])
+        weekly = {
+            "week_start": day_date(week_days[0]),
+            "week_end": day_date(week_days[-1]),
+            "counts": counts,
+            "rows": [_weekly_row({**dict(detail[key]), "status": st, "rank": None if k_null else key[2]})
+                     for k_null, _, _, st, key in page],
+            "next_cursor": next_cursor,
+        }
+    con.close()
+
+    try:
+        meta = _meta_payload(category)
+    except Exception as e:
+        print(f"⚠️ Error in /dashboard meta: {e}")
+        meta = {"countries": [], "categories": [], "subcategories": []}
+    return FastJSONResponse({"country": country, "category": category, "subcategory": subcategory,
+                             "meta": meta, "compare": compare, "weekly": weekly})
+
+
+
+# ------------------------- 15) Trends (momentum / breakout) -------------------------------
+@app.get("/trends")
+def trends(
+    country: str = "US",
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    window: int = Query(TREND_WINDOWS[0], description="Window in snapshots (see TREND_WINDOWS)"),
+    sort: str = Query("breakout", description="breakout | velocity (ranks/snapshot) | acceleration "
+                                               "(ranks/snapshot²) | volatility"),
+    order: str = Query("desc", description="desc | asc"),
+    min_days: int = Query(1, ge=1, description="Minimum snapshots in chart within the window"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Top-K приложения по метрика на тренда (app_trends, към последния снапшот на всеки контекст).
+    country=all -> всички държави.
+    """
+    if window not in TREND_WINDOWS:
+        return {"message": f"Unknown window {window}; available: {list(TREND_WINDOWS)}", "results": []}
+    metric = sort if sort in TREND_METRICS else "breakout"
+    direction = "ASC" if order.lower() == "asc" else "DESC"
+
+    con = connect(); cur = con.cursor()
+    ctx = context_ids(con, {"country": country, "category": category, "subcategory": subcategory})
+    if not ctx:
+        con.close()
+        return {"window": window, "sort": metric, "results": []}
+    # ORDER BY ... LIMIT -> SQLite пази само K реда в сортера
+    cur.execute(f"""
+        SELECT t.app_id, t.day, t.rank, t.days_in_chart, t.velocity, t.acceleration, t.volatility, t.breakout,
+               x.country, x.category, x.subcategory, s.app_name, s.developer_name
+        FROM app_trends t
+        JOIN dim_context x ON x.ctx_id = t.ctx_id
+        LEFT JOIN app_search s ON s.rowid = t.app_id
+        WHERE t.win = ? AND t.ctx_id IN ({','.join(map(str, ctx))}) AND t.days_in_chart >= ?
+          AND t.{metric} IS NOT NULL
+        ORDER BY t.{metric} {direction}, t.rank, t.app_id
+        LIMIT ?
+    """, (window, min_days, limit))
+    results = []
+    for r in cur.fetchall():
+        row = dict(r)
+        row["app_id"] = str(row["app_id"])
+        row["snapshot_date"] = day_date(row.pop("day"))
+        results.append(row)
+    con.close()
+    return FastJSONResponse({"window": window, "sort": metric, "order": direction.lower(),
+                             "total_results": len(results), "results": results})
+
+
+# ------------------------- 16) Developers (aggregates by normalized developer) ------------
+DEVELOPER_SORTS = {
+    "slots": lambda r: (-r["slots"], r["best_rank"]),
+    "apps": lambda r: (-r["apps"], r["best_rank"]),
+    "best_rank": lambda r: (r["best_rank"], -r["slots"]),
+    "avg_rank": lambda r: (r["avg_rank"], -r["slots"]),
+}
+
+
+def _latest_day(cur, ctx_ids: Optional[List[int]] = None) -> Optional[int]:
+    """Последният ден в каталога — в рамките на ctx_ids, ако са дадени (контекст с по-стар последен скрейп)."""
+    if ctx_ids is None:
+        cur.execute("SELECT MAX(last_day) FROM dim_catalog")
+    elif not ctx_ids:
+        return None
+    else:
+        cur.execute(f"SELECT MAX(last_day) FROM dim_catalog WHERE ctx_id IN ({','.join(map(str, ctx_ids))})")
+    return cur.fetchone()[0]
+
+
+@app.get("/developers")
+def developers(
+    country: str = "US",
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    date: Optional[str] = Query(None, description="YYYY-MM-DD (default: latest snapshot)"),
+    sort: str = Query("slots", description="slots | apps | best_rank | avg_rank"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Класация на разработчиците за един ден: места в класациите по държава, най-добър ранг, брой приложения."""
+    con = connect(); cur = con.cursor()
+    ctx = context_ids(con, {"country": country, "category": category, "subcategory": subcategory})
+    day = day_number(date) if date else _latest_day(cur, ctx)
+    if day is None or not ctx:
+        con.close()
+        return {"date": date, "total_results": 0, "results": []}
+
+    in_ctx = ','.join(map(str, ctx))
+    cur.execute(f"""
+        SELECT d.dev_id, v.name, v.dev_key, x.country,
+               SUM(d.slots) AS slots, MIN(d.best_rank) AS best_rank, SUM(d.rank_sum) AS rank_sum
+        FROM developer_days d
+        JOIN dim_context x ON x.ctx_id = d.ctx_id
+        JOIN dim_developer v ON v.dev_id = d.dev_id
+        WHERE d.day = ? AND d.ctx_id IN ({in_ctx})
+        GROUP BY d.dev_id, x.country
+    """, (day,))
+    devs: Dict[int, Dict[str, Any]] = {}
+    for r in cur.fetchall():
+        v = devs.get(r["dev_id"])
+        if v is None:
+            v = devs[r["dev_id"]] = {"developer": r["name"], "key": r["dev_key"], "slots": 0, "best_rank": r["best_rank"],
+                                     "rank_sum": 0, "apps": None, "countries": {}}
+        v["slots"] += r["slots"]
+        v["rank_sum"] += r["rank_sum"]
+        v["best_rank"] = min(v["best_rank"], r["best_rank"])
+        v["countries"][r["country"]] = r["slots"]
+    for v in devs.values():
+        v["avg_rank"] = round(v.pop("rank_sum") / v["slots"], 2)
+
+    def count_apps(dev_ids):
+        # различните приложения — само за нужните разработчици (списъците са JSON в developer_days)
+        app_ids: Dict[int, set] = {}
+        cur.execute(f"""
+            SELECT dev_id, apps FROM developer_days
+            WHERE day = ? AND ctx_id IN ({in_ctx}) AND dev_id IN ({','.join(map(str, dev_ids))})
+        """, (day,))
+        for dev_id, apps in cur.fetchall():
+            app_ids.setdefault(dev_id, set()).update(a for a, _ in loads(apps))
+        for dev_id, ids in app_ids.items():
+            devs[dev_id]["apps"] = len(ids)
+
+    key = DEVELOPER_SORTS.get(sort, DEVELOPER_SORTS["slots"])
+    if sort == "apps":
+        count_apps(list(devs))
+    order = sorted(devs, key=lambda i: key(devs[i]))[:limit]
+    if sort != "apps" and order:
+        count_apps(order)
+    con.close()
+    rows = [devs[i] for i in order]
+    return FastJSONResponse({"date": day_date(day), "total_results": len(devs), "results": rows})
+
+
+@app.get("/developers/{name}")
+def developer_detail(
+    name: str,
+    country: Optional[str] = None,
+    days: int = Query(30, ge=1, le=3660, description="How many days back from the latest snapshot"),
+):
+    """
+    Един разработчик (име или ключ в свободна форма): места и най-добър ранг по държава и ден за прозореца,
+    плюс приложенията му в класациите на последния ден, в който присъства.
+    """
+    con = connect(); cur = con.cursor()
+    dev = find_developer(con, name)
+    in_country = ([r[0] for r in con.execute("SELECT ctx_id FROM dim_context WHERE country=?", (country,))]
+                  if country and country != "all" else None)
+    latest = _latest_day(cur, in_country)
+    if not dev or latest is None:
+        con.close()
+        return {"message": f"Developer '{name}' not found", "developer": None, "timeline": [], "apps": []}
+    dev_id = dev["dev_id"]
+    country_filter, params = ("AND x.country = ?", [country]) if country and country != "all" else ("", [])
+
+    # прозорецът е диапазон по PK (dev_id, day) — не зависи от дължината на историята
+    cur.execute(f"""
+        SELECT d.day, x.country, SUM(d.slots) AS slots, MIN(d.best_rank) AS best_rank
+        FROM developer_days d JOIN dim_context x ON x.ctx_id = d.ctx_id
+        WHERE d.dev_id = ? AND d.day BETWEEN ? AND ? {country_filter}
+        GROUP BY d.day, x.country
+        ORDER BY d.day, x.country
+    """, [dev_id, latest - days + 1, latest, *params])
+    timeline = [{"date": day_date(r["day"]), "country": r["country"], "slots": r["slots"], "best_rank": r["best_rank"]}
+                for r in cur.fetchall()]
+
+    last = timeline[-1]["date"] if timeline else None
+    apps = []
+    if last:
+        cur.execute(f"""
+            SELECT x.country, x.category, x.subcategory, d.apps
+            FROM developer_days d JOIN dim_context x ON x.ctx_id = d.ctx_id
+            WHERE d.dev_id = ? AND d.day = ? AND x.chart_type = 'top_free' {country_filter}
+            ORDER BY x.country, x.category, x.subcategory
+        """, [dev_id, day_number(last), *params])
+        for r in cur.fetchall():
+            for app_id, rank in loads(r["apps"]):
+                apps.append({"app_id": app_id, "country": r["country"], "category": r["category"],
+                             "subcategory": r["subcategory"], "rank": rank})
+        ids = sorted({int(a["app_id"]) for a in apps if str(a["app_id"]).isdigit()})
+        names: Dict[str, str] = {}
+        if ids:
+            cur.execute(f"SELECT rowid, app_name FROM app_search WHERE rowid IN ({','.join(['?'] * len(ids))})", ids)
+            names = {str(r[0]): r[1] for r in cur.fetchall()}
+        for a in apps:
+            a["app_name"] = names.get(str(a["app_id"]))
+    con.close()
+
+    return FastJSONResponse({
+        "developer": dev["name"],
+        "key": dev["dev_key"],
+        "country": country,
+        "from": day_date(latest - days + 1),
+        "to": day_date(latest),
+        "last_seen": last,
+        "timeline": timeline,
+        "apps": apps,
+    })
+
+
+# ------------------------- 17) Overlap (top 50 bitsets across countries) ------------------
+@app.get("/overlap")
+def overlap(
+    countries: Optional[str] = Query(None, description="Comma-separated, e.g. US,GB,DE (default: all)"),
+    chart_type: str = "top_free",
+    category: Optional[str] = None,
+    subcategory: Optional[str] = None,
+    date: Optional[str] = Query(None, description="YYYY-MM-DD, end of the window (default: latest snapshot)"),
+    days: int = Query(1, ge=1, le=3660),
+):
+    """
+    Припокриване на топ 50 между държавите за жанровете по филтъра: среден Jaccard за всяка двойка
+    държави в прозореца от `days` дни, и за последния ден — приложенията във всички държави и само в една.
+    """
+    con = connect(); cur = con.cursor()
+    if countries:
+        wanted = [c.strip().upper() for c in countries.split(",") if c.strip()]
+    else:
+        wanted = [r["country"] for r in _meta_catalog() if r["country"]]
+    wanted = sorted(set(wanted))
+    hi = day_number(date) if date else _latest_day(cur)
+    gs = genres(con, chart_type, category, subcategory)
+    if hi is None or not gs or len(wanted) < 2:
+        con.close()
+        return {"message": "Need at least two countries and a matching chart", "countries": wanted, "genres": []}
+    lo = hi - days + 1
+
+    sums, counts = jaccard_matrix(con, [g["genre_id"] for g in gs], wanted, lo, hi)
+    matrix = {
+        a: {b: (round(float(sums[i, j] / counts[i, j]), 4) if counts[i, j] else None) for j, b in enumerate(wanted)}
+        for i, a in enumerate(wanted)
     }
 
+    per_genre, ids = [], set()
+    for g in gs:
+        sets = day_sets(con, g["genre_id"], wanted, hi)
+        if len(sets) < 2:
+            continue
+        in_all = -1
+        for s in sets.values():
+            in_all &= s
+        wanted_sets = {"in_all": in_all}
+        for c, s in sets.items():
+            others = 0
+            for o, t in sets.items():
+                if o != c:
+                    others |= t
+            wanted_sets[c] = s & ~others
+        found = app_ids(con, g["genre_id"], wanted_sets)
+        item = {"category": g["category"], "subcategory": g["subcategory"], "countries": sorted(sets),
+                "in_all": found.pop("in_all"), "only": found}
+        ids.update(item["in_all"])
+        for v in found.values():
+            ids.update(v)
+        per_genre.append(item)
+
+    names: Dict[int, str] = {}
+    id_list = sorted(ids)
+    for i in range(0, len(id_list), 900):
+        part = id_list[i:i + 900]
+        cur.execute(f"SELECT rowid, app_name FROM app_search WHERE rowid IN ({','.join(['?'] * len(part))})", part)
+        names.update((r[0], r[1]) for r in cur.fetchall())
+    con.close()
+
+    return FastJSONResponse({
+        "from": day_date(lo),
+        "to": day_date(hi),
+        "depth": OVERLAP_DEPTH,
+        "countries": wanted,
+        "matrix": matrix,
+        "genres": per_genre,
+        "app_names": {str(k): v for k, v in names.items()},
+    })
+
+
+# ------------------------- 18) Icons (local artwork cache) --------------------------------
+ICONS = IconCache()
+# съдържанието на /icons/{app_id} се сменя рядко; ETag-ът е sha256 на файла
+ICON_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.get("/icons/stats")
+def icon_stats():
+    """Hit rate и размер на кеша с иконите (броячите са от стартирането на процеса)."""
+    return ICONS.summary()
+
+
+@app.get("/icons/{app_id}")
+def icon(app_id: str, if_none_match: Optional[str] = Header(None)):
+    """Иконата на приложението от локалния кеш; при неуспешно теглене — пренасочване към източника."""
+    con = connect()
+    row = con.execute(
+        "SELECT icon_url FROM app_metadata_history WHERE app_id=? AND valid_to IS NULL AND icon_url IS NOT NULL "
+        "LIMIT 1", (app_id,)).fetchone()
+    con.close()
+    if not row:
+        return FastJSONResponse({"message": f"No icon for app {app_id}"}, status_code=404)
+    hit = ICONS.ensure(row["icon_url"])
+    if not hit:
+        return RedirectResponse(row["icon_url"], status_code=307)
+    path, sha, content_type = hit
+    headers = {"Cache-Control": ICON_CACHE_CONTROL, "ETag": f'"{sha}"'}
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    with open(path, "rb") as f:
+        data = f.read()
+    ICONS.stats["bytes_served"] += len(data)
+    return Response(content=data, media_type=content_type, headers=headers)
+
+
+# ------------------------- 19) Response cache + compression (br / gzip) ---------------------
+# общото ниво на диска е включено по подразбиране (и с един worker пази кеша между рестартите)
+RESPONSES = ResponseCache(shared=SharedResponseStore() if os.getenv("RESPONSE_CACHE_SHARED", "1") != "0" else None)
+# иконите имат собствен кеш (и вече са компресирани), admin маршрутите пишат в базата
+NO_CACHE_PREFIXES = ("/icons", "/admin", "/cache", "/hot")
+
+
+@app.get("/cache/stats")
+def response_cache_stats():
+    """Hit rate, байтове към клиента срещу некомпресирани и CPU за компресия (от стартирането)."""
+    return RESPONSES.summary()
+
+
+@app.middleware("http")
+async def compress_responses(request, call_next):
+    path = request.url.path
+    if request.method != "GET" or path.startswith(NO_CACHE_PREFIXES):
+        return await call_next(request)
+    key = f"{path}?{'&'.join(f'{k}={v}' for k, v in sorted(request.query_params.multi_items()))}"
+    stamp = _db_stamp()
+    entry = RESPONSES.get(key, stamp)
+    state = "HIT"
+    if entry is None:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-encoding")}
+        entry = RESPONSES.put(key, stamp, body, headers)
+        state = "MISS"
+    encoding, data = RESPONSES.encoded(entry, request.headers.get("accept-encoding"))
+    headers = {**entry.headers, "Vary": "Accept-Encoding", "X-Cache": state}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=data, headers=headers)
+
+
+# ------------------------- 20) Hot replica (recent days in memory) -------------------------
+@app.get("/hot/stats")
+def hot_stats():
+    """Прозорец и размер на репликата в паметта и колко заявки са минали през нея / през диска."""
+    return HOT.summary() if HOT else {"enabled": False}
 
 
 @app.middleware("http")
@@ -834,4 +1695,3 @@ async def add_cors_headers(request, call_next):
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "*"
     return response
-
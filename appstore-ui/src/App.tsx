@@ -1,7 +1,36 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useMemo, useRef, useState } from "react";
 
 /** API base */
 const API = (import.meta as any)?.env?.VITE_API_URL || "https://appstore-api.onrender.com";
+/** Статичният снапшот (scraper/publish_static.py); без него всичко идва от API-то */
+const STATIC = (import.meta as any)?.env?.VITE_STATIC_URL || "";
+
+let staticManifest: Promise<any> | null = null;
+/** Refresh / Reload: манифестът се тегли наново (може да има нов снапшот) */
+function resetStatic() {
+  staticManifest = null;
+}
+/** apiLatest — последният снапшот според API-то; по-стар статичен снапшот не се ползва */
+async function loadStatic(country: string, category: string, subcategory: string, apiLatest = "") {
+  if (!STATIC) return null;
+  staticManifest ??= fetch(`${STATIC}/manifest.json`, { cache: "no-cache" }).then((r) => (r.ok ? r.json() : null));
+  const m = await staticManifest;
+  if (!m || (apiLatest && m.snapshot < apiLatest)) return null;
+  const view = m?.views?.[`${country}|${category}|${subcategory}`];
+  const metaPath = m?.meta?.[category];
+  if (!view || !metaPath) return null;
+  const get = (p: string) =>
+    fetch(`${STATIC}/${m.base}/${p}`).then((r) => {
+      if (!r.ok) throw new Error(`${r.status} ${p}`);
+      return r.json();
+    });
+  const [meta, compare, weekly] = await Promise.all([
+    get(metaPath),
+    get(`${view}/compare.json`),
+    get(`${view}/weekly.json`),
+  ]);
+  return { meta, compare, weekly, snapshot: m.snapshot as string };
+}
 
 /* ========================= UI Helpers / Style ========================= */
 const PAGE_BG = "#f5f6fa";
@@ -134,6 +163,17 @@ export default function App() {
   const [pageCompare, setPageCompare] = useState(1);
   const [pageWeekly, setPageWeekly] = useState(1);
 
+  // последният снапшот от живото API (latestSnapshot може да е от статичния снапшот) и показаният статичен;
+  // по-нов ден в API-то след като е показан статичният -> таблото се зарежда наново (reloadKey)
+  const apiLatest = useRef("");
+  const staticShown = useRef("");
+  const [reloadKey, setReloadKey] = useState(0);
+  function noteApiLatest(d?: string | null) {
+    if (!d || d <= apiLatest.current) return;
+    apiLatest.current = d;
+    if (staticShown.current && staticShown.current < d) setReloadKey((k) => k + 1);
+  }
+
   /* ----------------------------- Loaders ----------------------------- */
   async function loadMeta(selCat?: string) {
     const res = await fetch(`${API}/meta${selCat && selCat !== "all" ? `?category=${encodeURIComponent(selCat)}` : ""}`);
@@ -142,44 +182,53 @@ export default function App() {
     setCategories(m.categories ?? []);
     setSubcategories(m.subcategories ?? []);
     if (m.latest_snapshot) setLatestSnapshot(m.latest_snapshot);
+    noteApiLatest(m.last_date ?? m.latest_snapshot);
   }
   useEffect(() => {
     loadMeta().catch(() => {});
   }, []);
   useEffect(() => {
-    loadMeta(category).catch(() => {});
     setSubcategory("all");
   }, [category]);
 
-  async function loadCompare() {
+  // compare + weekly + meta за текущите филтри с една заявка
+  async function loadDashboard() {
+    const s = await loadStatic(country, category, subcategory, apiLatest.current).catch(() => null);
+    if (s) {
+      const rows = weeklyStatus ? (s.weekly.rows ?? []).filter((r: any) => r.status === weeklyStatus) : s.weekly.rows;
+      setSubcategories(s.meta?.subcategories ?? []);
+      setCompareRows(s.compare?.results ?? []);
+      if (s.compare?.latest_snapshot) setLatestSnapshot(s.compare.latest_snapshot);
+      setWeekly({ ...s.weekly, rows } as WeeklyPayload);
+      setPageCompare(1);
+      setPageWeekly(1);
+      staticShown.current = s.snapshot;
+      return;
+    }
+    staticShown.current = "";
+    // резервен вариант — живото API
     const qs = new URLSearchParams();
     qs.set("limit", "500");
     qs.set("country", country);
     if (category !== "all") qs.set("category", category);
     if (subcategory !== "all") qs.set("subcategory", subcategory);
-    const r = await fetch(`${API}/compare?${qs.toString()}`);
+    if (weeklyStatus) qs.set("status", weeklyStatus); // използва се само в Weekly
+    const r = await fetch(`${API}/dashboard?${qs.toString()}`);
     const j = await r.json();
-    setCompareRows(j.results ?? []);
-    if (j.latest_snapshot) setLatestSnapshot(j.latest_snapshot);
+    setSubcategories(j.meta?.subcategories ?? []);
+    setCompareRows(j.compare?.results ?? []);
+    if (j.compare?.latest_snapshot) {
+      setLatestSnapshot(j.compare.latest_snapshot);
+      noteApiLatest(j.compare.latest_snapshot);
+    }
+    setWeekly(j.weekly as WeeklyPayload);
     setPageCompare(1);
-  }
-
-  async function loadWeekly() {
-    const qs = new URLSearchParams();
-    qs.set("country", country);
-    if (category !== "all") qs.set("category", category);
-    if (subcategory !== "all") qs.set("subcategory", subcategory);
-    if (weeklyStatus) qs.set("status", weeklyStatus); // използва се само в Weekly
-    const r = await fetch(`${API}/weekly/insights?${qs.toString()}`);
-    const j = (await r.json()) as WeeklyPayload;
-    setWeekly(j);
     setPageWeekly(1);
   }
 
   useEffect(() => {
-    if (tab === "compare") loadCompare();
-    else loadWeekly();
-  }, [tab, country, category, subcategory, weeklyStatus]);
+    loadDashboard().catch(() => {});
+  }, [country, category, subcategory, weeklyStatus, reloadKey]);
 
   /* ----------------------------- Actions ----------------------------- */
   function exportCompareCSV() {
@@ -256,8 +305,9 @@ export default function App() {
       const r = await fetch(`${API}/admin/refresh`);
       const j = await r.json();
       if (j.latest_snapshot) setLatestSnapshot(j.latest_snapshot);
-      if (tab === "compare") loadCompare();
-      else loadWeekly();
+      noteApiLatest(j.latest_snapshot);
+      resetStatic();
+      loadDashboard();
     } catch {}
   }
   function resetFilters() {
@@ -393,7 +443,13 @@ export default function App() {
             <button style={btnLite} onClick={resetFilters}>
               Reset
             </button>
-            <button style={btnLite} onClick={() => (tab === "compare" ? loadCompare() : loadWeekly())}>
+            <button
+              style={btnLite}
+              onClick={() => {
+                resetStatic();
+                loadDashboard();
+              }}
+            >
               Reload
             </button>
             <button style={{ ...btnLite, display: "inline-flex", alignItems: "center", gap: 6 }} onClick={refreshDB}>
@@ -651,7 +707,12 @@ export default function App() {
 <td style={{ padding: 10 }}>
   {r.icon_url ? (
     <img
-      src={r.icon_url}
+      src={`${API}/icons/${r.app_id}`}
+      onError={(e) => {
+        // локалният кеш не отговаря — директно от CDN-а
+        const img = e.currentTarget;
+        if (img.src !== r.icon_url) img.src = r.icon_url!;
+      }}
       alt="App Icon"
       style={{
         width: 32,
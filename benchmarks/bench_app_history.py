@@ -0,0 +1,35 @@
+# benchmarks/bench_app_history.py
+# /apps/{app_id}/history върху многогодишна синтетична база, срещу full scan без app-major индекса.
+import os, sqlite3, random, argparse, tempfile
+from common import load_api, timeit, report
+import synth
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--db", help="reuse an existing DB instead of generating one")
+    a = p.parse_args()
+
+    db = a.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    if not a.db:
+        print(f"generating {a.days} days -> {db}")
+        synth.build(db, days=a.days)
+
+    api = load_api(db)
+    con = sqlite3.connect(db)
+    ids = [r[0] for r in con.execute(
+        "SELECT app_id FROM charts WHERE snapshot_date=(SELECT MAX(snapshot_date) FROM charts) LIMIT 200")]
+    rnd = random.Random(7)
+
+    res = {}
+    for days in (7, 30, 90, 365):
+        res[f"/apps/{{id}}/history days={days}"] = timeit(lambda: api.app_history(rnd.choice(ids), days=days))
+
+    # същата заявка без индекса (както беше преди)
+    res["same query, NOT INDEXED (days=30)"] = timeit(lambda: con.execute("""
+        SELECT snapshot_date, country, category, subcategory, rank FROM charts NOT INDEXED
+        WHERE app_id=? AND snapshot_date >= date((SELECT MAX(snapshot_date) FROM charts), '-29 day')
+          AND chart_type='top_free'
+    """, (rnd.choice(ids),)).fetchall(), repeat=3)
+    con.close()
+    report(f"app history ({db})", res)
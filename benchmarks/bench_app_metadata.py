@@ -0,0 +1,90 @@
+# benchmarks/bench_app_metadata.py
+# app_metadata_history: колко места пести изтъняването на charts (lookup полетата само при промяна),
+# дали charts_wide връща точно същите стойности и колко струва „кой е сменил рейтинга си тази седмица“.
+import os, sqlite3, argparse, tempfile, hashlib
+from datetime import date, timedelta
+from common import load_api, timeit, report
+from app_metadata import refresh_app_metadata, compact_chart_metadata, META_COLS
+import synth
+
+
+def fingerprint(con, table: str) -> str:
+    h = hashlib.sha1()
+    for r in con.execute(f"""
+        SELECT snapshot_date, country, category, subcategory, rank, {', '.join(META_COLS)}
+        FROM {table} ORDER BY snapshot_date, country, category, subcategory, rank
+    """):
+        h.update(repr(r).encode())
+    return h.hexdigest()
+
+
+def db_size(con, tmp: str, name: str) -> int:
+    path = os.path.join(tmp, name)
+    con.execute("VACUUM INTO ?", (path,))
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=120)
+    p.add_argument("--countries", type=int, default=2)
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db = os.path.join(tmp, "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    con = sqlite3.connect(db)
+
+    # реалистични промени: ratings_count расте седмично за 1/3 от приложенията,
+    # рейтингът се мести за 1/50 на всеки ~20 дни, цената — за 1/200 веднъж
+    first = con.execute("SELECT MIN(snapshot_date) FROM charts").fetchone()[0]
+    con.execute("""
+        UPDATE charts SET
+          ratings_count = ratings_count + CASE WHEN CAST(app_id AS INTEGER) % 3 = 0
+                          THEN 17 * CAST((julianday(snapshot_date) - julianday(?)) / 7 AS INTEGER) ELSE 0 END,
+          rating = rating + CASE WHEN CAST(app_id AS INTEGER) % 50 = 0
+                   THEN 0.1 * (CAST((julianday(snapshot_date) - julianday(?)) / 20 AS INTEGER) % 3) ELSE 0 END,
+          price = CASE WHEN CAST(app_id AS INTEGER) % 200 = 0 AND snapshot_date >= date(?, '+30 day') THEN 0.99 ELSE price END
+    """, (first, first, first))
+    con.commit()
+    rows = con.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    before_fp = fingerprint(con, "charts")
+    size_wide = db_size(con, tmp, "wide.db")
+
+    res = {}
+    res["history build (full)"] = timeit(lambda: refresh_app_metadata(con), repeat=1)
+    versions = con.execute("SELECT COUNT(*) FROM app_metadata_history").fetchone()[0]
+    latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+    res["history build (one day)"] = timeit(lambda: refresh_app_metadata(con, latest), repeat=3)
+
+    nxt = (date.fromisoformat(latest) + timedelta(days=1)).isoformat()
+    thinned = compact_chart_metadata(con, nxt)
+    con.commit()
+    size_thin = db_size(con, tmp, "thin.db")
+    print(f"[CHECK] charts_wide == original wide charts: {fingerprint(con, 'charts_wide') == before_fp}")
+
+    res["chart rows / metadata versions"] = f"{rows} / {versions} ({versions / rows:.1%})"
+    res["rows thinned"] = thinned
+    res["DB size wide -> thin+history"] = f"{size_wide / 1e6:.1f} MB -> {size_thin / 1e6:.1f} MB"
+    res["growth per day"] = f"{size_wide / a.days / 1e3:.0f} KB -> {size_thin / a.days / 1e3:.0f} KB"
+
+    # „рейтингът се е сменил през последните 7 дни“: история срещу LAG по дневните редове
+    res["rating changed 7d (history)"] = timeit(lambda: con.execute("""
+        SELECT h.app_id, h.valid_from, p.rating, h.rating FROM app_metadata_history h
+        JOIN app_metadata_history p ON p.app_id=h.app_id AND p.country=h.country AND p.valid_to=h.valid_from
+        WHERE h.country='US' AND h.valid_from >= date(?, '-6 day') AND h.rating IS NOT p.rating
+    """, (latest,)).fetchall())
+    res["rating changed 7d (daily rows, LAG)"] = timeit(lambda: con.execute("""
+        SELECT app_id, d, prev, rating FROM (
+            SELECT app_id, d, rating, LAG(rating) OVER (PARTITION BY app_id ORDER BY d) AS prev FROM (
+                SELECT app_id, snapshot_date AS d, MAX(rating) AS rating FROM charts_wide
+                WHERE country='US' AND snapshot_date >= date(?, '-7 day') GROUP BY app_id, snapshot_date
+            )
+        ) WHERE d >= date(?, '-6 day') AND prev IS NOT NULL AND prev IS NOT rating
+    """, (latest, latest)).fetchall(), repeat=3)
+    con.close()
+
+    api = load_api(db)
+    res["/metadata/changes field=rating"] = timeit(lambda: api.metadata_changes(country="US", field="rating", days=7))
+    report("app metadata history", res)
@@ -0,0 +1,70 @@
+# benchmarks/bench_chart_html.py
+# HTML fallback парсър: lxml pull parser срещу BeautifulSoup върху корпус от страници с класации.
+#   python benchmarks/bench_chart_html.py                       # синтетични страници
+#   python benchmarks/bench_chart_html.py --fixtures some/dir    # записани страници (*.html),
+#       напр. от скрейп с CHART_HTML_DUMP_DIR=some/dir
+import os, time, glob, random, argparse
+from common import timeit, report
+from chart_html import parse_chart_html, parse_chart_html_bs4, prefetch
+import synth
+
+
+def fake_page(seed: int, items: int = 100) -> str:
+    """Страница с формата на apps.apple.com/…/charts: шапка, inline JSON, `items` lockup-а, футър."""
+    rnd = random.Random(seed)
+    ids = [str(1_000_000_000 + rnd.randint(1, 10**8)) for _ in range(items)]
+    head = "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Top Free</title>" + "".join(
+        f"<link rel='stylesheet' href='/assets/{i}.css'>" for i in range(20)
+    ) + "<script>window.__DATA__ = " + '{"k": "' + "x" * 120_000 + '"}' + "</script></head><body>"
+    nav = "<nav><ul>" + "".join(f"<li><a href='/genre/{i}'>Genre {i}</a></li>" for i in range(60)) + "</ul></nav>"
+    lockups = "".join(
+        f"<li class='l-column'><div class='we-lockup targeted-link'><picture><source srcset='/i/{a}.webp 1x'>"
+        f"<img src='/i/{a}.png' alt=''></picture><div class='we-lockup__content'>"
+        f"<div class='we-lockup__rank'>{i}</div>"
+        f"<a class='we-lockup__title' href='https://apps.apple.com/us/app/x/id{a}?l=en'>"
+        f"<div class='we-truncate'> {synth.app_name(a)} &amp; <!-- x --> Co</div></a>"
+        f"<div class='we-lockup__subtitle'> {synth.developer_name(a)} </div>"
+        f"<div class='we-lockup__text'>Free · In-App Purchases</div></div></div></li>"
+        for i, a in enumerate(ids, 1)
+    )
+    footer = "<footer>" + "<p>Copyright © Apple Inc. All rights reserved.</p>" * 200 + "</footer>"
+    return head + nav + "<section><ol>" + lockups + "</ol></section>" + footer + "</body></html>"
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--fixtures", help="directory with recorded *.html chart pages")
+    p.add_argument("--pages", type=int, default=30)
+    a = p.parse_args()
+
+    if a.fixtures:
+        pages = [open(f, encoding="utf-8").read() for f in sorted(glob.glob(os.path.join(a.fixtures, "*.html")))]
+    else:
+        pages = [fake_page(i) for i in range(a.pages)]
+
+    mismatches = sum(parse_chart_html(h) != parse_chart_html_bs4(h) for h in pages)
+    print(f"[CHECK] {len(pages)} pages, {mismatches} mismatches")
+
+    res = {
+        "BeautifulSoup (whole corpus)": timeit(lambda: [parse_chart_html_bs4(h) for h in pages], repeat=3),
+        "lxml pull parser (whole corpus)": timeit(lambda: [parse_chart_html(h) for h in pages], repeat=5),
+    }
+
+    # припокриване с мрежата: 50 ms "изтегляне" + парсване на класацията, после 50 ms lookup/запис
+    def fetch_and_parse(h):
+        time.sleep(0.05)
+        return parse_chart_html(h)
+
+    def sequential(jobs):
+        for j in jobs:
+            fetch_and_parse(*j)
+            time.sleep(0.05)
+
+    def pipelined(jobs):
+        for _ in prefetch(fetch_and_parse, jobs):
+            time.sleep(0.05)
+
+    jobs = [(h,) for h in pages[:20]]
+    res["sequential scrape loop (20 pages)"] = timeit(lambda: sequential(jobs), repeat=2)
+    res["prefetch scrape loop (20 pages)"] = timeit(lambda: pipelined(jobs), repeat=2)
+    report(f"chart HTML parsing, {len(pages)} pages", res)
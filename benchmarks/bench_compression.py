@@ -0,0 +1,120 @@
+# benchmarks/bench_compression.py
+# Компресия на отговорите през middleware-а на API-то (compress_responses) за всеки маршрут:
+# байтове по мрежата без компресия / gzip / br, CPU за рендер и за компресия при първата заявка
+# и цената на повторната (от кеша, вече компресирана). Проверява, че разкомпресираното тяло е същото.
+import os, gzip, time, asyncio, argparse, tempfile, statistics
+from common import load_api, report
+import response_cache
+import synth
+
+
+class _URL:
+    def __init__(self, path):
+        self.path = path
+
+
+class _Query:
+    def __init__(self, params):
+        self.params = params
+
+    def multi_items(self):
+        return [(k, str(v)) for k, v in self.params.items() if v is not None]
+
+
+class FakeRequest:
+    def __init__(self, path, params, accept):
+        self.method, self.url, self.query_params = "GET", _URL(path), _Query(params)
+        self.headers = {"accept-encoding": accept} if accept else {}
+
+
+def call_next_for(api, route, params):
+    """call_next като в Starlette: отговорът на маршрута с тяло като async итератор."""
+    async def call_next(request):
+        resp = route(**params)
+        if not hasattr(resp, "body"):
+            resp = api.FastJSONResponse(resp)
+        body = resp.body
+
+        async def it():
+            yield body
+        resp.body_iterator = it()
+        resp.headers = {"content-type": resp.media_type or "application/json", **resp.headers}
+        return resp
+    return call_next
+
+
+def request(api, path, route, params, accept):
+    t0 = time.perf_counter()
+    resp = asyncio.run(api.compress_responses(FakeRequest(path, params, accept), call_next_for(api, route, params)))
+    return resp, (time.perf_counter() - t0) * 1000
+
+
+def endpoint(api, path, route, params, repeat=10) -> dict:
+    out = {}
+    api.RESPONSES = response_cache.ResponseCache()
+    t0 = time.perf_counter()
+    plain = route(**params)
+    render = (time.perf_counter() - t0) * 1000
+    raw = plain.body if hasattr(plain, "body") else api.FastJSONResponse(plain).body
+    out["raw KB"] = round(len(raw) / 1024, 1)
+    out["render ms"] = round(render, 1)
+    for accept, enc in (("gzip", "gzip"), ("br, gzip", "br")):
+        if enc not in response_cache.ENCODINGS:
+            continue
+        api.RESPONSES = response_cache.ResponseCache()
+        first, ms = request(api, path, route, params, accept)
+        body = first.body
+        if first.headers.get("Content-Encoding") == "gzip":
+            same = gzip.decompress(body) == raw
+        elif first.headers.get("Content-Encoding") == "br":
+            same = response_cache.brotli.decompress(body) == raw
+        else:
+            same = body == raw
+        hits = [request(api, path, route, params, accept)[1] for _ in range(repeat)]
+        s = api.RESPONSES.summary()
+        out[f"{enc} KB"] = round(len(body) / 1024, 1)
+        out[f"{enc} compress ms"] = s["compress_ms"]
+        out[f"{enc} first ms"] = round(ms, 1)
+        out[f"{enc} cached ms"] = round(statistics.median(hits), 3)
+        if not same:
+            print(f"[CHECK] {path} {enc}: decompressed body differs")
+    return out
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    api = load_api(db)
+    f = {"country": "US", "category": None, "subcategory": None}
+    cases = {
+        "/meta": (api.get_meta, {"category": None}),
+        "/compare": (api.compare_alias, {**f, "limit": 500, "format": None, "cursor": None}),
+        "/compare?format=csv": (api.compare_alias, {**f, "limit": 500, "format": "csv", "cursor": None}),
+        "/weekly/insights": (api.weekly_insights, {**f, "lookback_days": 7, "status": None, "format": None,
+                                                   "limit": 500, "cursor": None}),
+        "/history": (api.history_view, {**f, "lookback_days": 7, "date": None, "status": None, "export": None,
+                                        "limit": 500, "cursor": None}),
+        "/dashboard": (api.dashboard, {**f, "lookback_days": 7, "status": None, "limit": 500}),
+        "/trends": (api.trends, {**f, "window": api.TREND_WINDOWS[0], "sort": "breakout", "order": "desc",
+                                 "min_days": 1, "limit": 200}),
+        "/developers": (api.developers, {**f, "date": None, "sort": "slots", "limit": 200}),
+        "/overlap": (api.overlap, {"countries": None, "chart_type": "top_free", "category": None,
+                                   "subcategory": None, "date": None, "days": 7}),
+        "/search": (api.search, {"q": "app", "limit": 20, "chart_type": "top_free"}),
+    }
+    res = {"encodings": response_cache.ENCODINGS, "threshold bytes": response_cache.COMPRESS_MIN_BYTES}
+    for path, (route, params) in cases.items():
+        res[path] = endpoint(api, path, route, params)
+
+    small, _ = request(api, "/search", api.search, {"q": "zzzz", "limit": 20, "chart_type": "top_free"}, "gzip")
+    print(f"[CHECK] below threshold sent as is: {'Content-Encoding' not in small.headers}")
+    none, _ = request(api, "/compare", *cases["/compare"], None)
+    print(f"[CHECK] no Accept-Encoding -> identity: {'Content-Encoding' not in none.headers}")
+    report(f"response compression, {a.days} days x {a.countries} countries", res)
+    os.remove(db)
@@ -0,0 +1,59 @@
+# benchmarks/bench_dashboard.py
+# Едно сменяне на филтър в UI-то: /meta + /compare + /weekly/insights (три заявки, всяка наново
+# изчислява датите и „виждано ли е преди“) срещу един /dashboard. Проверява, че /dashboard връща
+# същите редове, броячи и next_cursor-и като отделните маршрути.
+import os, argparse, tempfile
+from common import load_api, payload, timeit, report
+import synth
+
+INTERACTIONS = [
+    {"country": "US"},
+    {"country": "US", "category": "Games"},
+    {"country": "US", "category": "Games", "subcategory": "Puzzle"},
+    {"country": "GB", "category": "Books"},
+]
+
+
+def separate(api, f: dict, limit: int = 500):
+    meta = payload(api.get_meta(category=f.get("category")))
+    compare = payload(api.compare_alias(limit=limit, country=f["country"], category=f.get("category"),
+                                        subcategory=f.get("subcategory"), format=None, cursor=None))
+    weekly = payload(api.weekly_insights(country=f["country"], category=f.get("category"),
+                                         subcategory=f.get("subcategory"), lookback_days=7, status=None,
+                                         format=None, limit=limit, cursor=None))
+    return meta, compare, weekly
+
+
+def combined(api, f: dict, limit: int = 500):
+    d = payload(api.dashboard(country=f["country"], category=f.get("category"), subcategory=f.get("subcategory"),
+                              lookback_days=7, status=None, limit=limit))
+    return d["meta"], d["compare"], d["weekly"]
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--countries", type=int, default=2)
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    api = load_api(db)
+
+    res = {}
+    for f in INTERACTIONS:
+        label = "/".join(f.values())
+        for limit in (500, 50):
+            want, got = separate(api, f, limit), combined(api, f, limit)
+            same = (want[0] == got[0]
+                    and all(want[1].get(k) == got[1].get(k) for k in
+                            ("latest_snapshot", "previous_snapshots", "results", "next_cursor"))
+                    and all(want[2].get(k) == got[2].get(k) for k in
+                            ("week_start", "week_end", "counts", "rows", "next_cursor")))
+            print(f"[CHECK] {label} limit={limit}: same as separate calls: {same} "
+                  f"({len(got[1]['results'])} compare rows, {len(got[2]['rows'])} weekly rows)")
+        res[f"{label}: /meta + /compare + /weekly"] = timeit(lambda: separate(api, f), repeat=5)
+        res[f"{label}: /dashboard"] = timeit(lambda: combined(api, f), repeat=5)
+    report(f"dashboard per UI interaction, {a.days} days x {a.countries} countries", res)
+    os.remove(db)
@@ -0,0 +1,74 @@
+# benchmarks/bench_developers.py
+# Изгледи по разработчик: GROUP BY developer_name по целия charts срещу агрегатите developer_days,
+# при къса и дълга история — /developers и /developers/{name} не трябва да зависят от броя дни.
+# Проверява, че местата в агрегатите съвпадат с броя редове в charts, и мери обновяването за един ден.
+import os, sqlite3, argparse, tempfile
+from common import load_api, payload, timeit, report
+from dimensions import refresh_chart_ranks
+from developers import refresh_developers, developer_key
+import synth
+
+
+def legacy_leaderboard(con, country: str, date: str) -> list:
+    return con.execute("""
+        SELECT developer_name, COUNT(*) AS slots, MIN(rank) AS best_rank, COUNT(DISTINCT app_id) AS apps
+        FROM charts WHERE country=? AND snapshot_date=?
+        GROUP BY developer_name ORDER BY slots DESC LIMIT 50
+    """, (country, date)).fetchall()
+
+
+def legacy_timeline(con, name: str, country: str) -> list:
+    # без агрегати: целият charts за разработчика (developer_name не е индексиран)
+    return con.execute("""
+        SELECT snapshot_date, COUNT(*), MIN(rank) FROM charts
+        WHERE developer_name=? AND country=? GROUP BY snapshot_date ORDER BY snapshot_date DESC LIMIT 30
+    """, (name, country)).fetchall()
+
+
+def slots_match(con) -> bool:
+    want = {}
+    for name, n in con.execute("SELECT developer_name, COUNT(*) FROM charts GROUP BY developer_name"):
+        key = developer_key(name)
+        want[key] = want.get(key, 0) + n
+    got = dict(con.execute("""
+        SELECT v.dev_key, SUM(d.slots) FROM developer_days d JOIN dim_developer v ON v.dev_id = d.dev_id
+        GROUP BY v.dev_key
+    """).fetchall())
+    return got == want
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, nargs="+", default=[365, 1095])
+    p.add_argument("--countries", type=int, default=2)
+    a = p.parse_args()
+
+    res = {}
+    for days in a.days:
+        db = os.path.join(tempfile.mkdtemp(), "bench.db")
+        print(f"generating {days} days x {a.countries} countries -> {db}")
+        synth.build(db, days=days, countries=synth.COUNTRIES[:a.countries])
+        con = sqlite3.connect(db)
+        refresh_chart_ranks(con)
+        latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+
+        res[f"{days}d: legacy leaderboard (GROUP BY developer_name)"] = timeit(
+            lambda: legacy_leaderboard(con, "US", latest), repeat=5)
+        res[f"{days}d: legacy 30-day timeline (scan charts)"] = timeit(
+            lambda: legacy_timeline(con, "Supercell", "US"), repeat=3)
+        res[f"{days}d: refresh_developers full build"] = timeit(lambda: refresh_developers(con), repeat=1)
+        res[f"{days}d: refresh_developers (one day)"] = timeit(lambda: refresh_developers(con, latest), repeat=3)
+        print(f"[CHECK] {days}d: slots == charts rows per developer key: {slots_match(con)}")
+        res[f"{days}d: developer_days rows"] = con.execute("SELECT COUNT(*) FROM developer_days").fetchone()[0]
+        con.close()
+
+        api = load_api(db)
+        res[f"{days}d: /developers US top 50"] = timeit(
+            lambda: api.developers(country="US", category=None, subcategory=None, date=None, sort="slots", limit=50))
+        res[f"{days}d: /developers/supercell US 30 days"] = timeit(
+            lambda: api.developer_detail("supercell", country="US", days=30))
+        d = payload(api.developer_detail("Adobe, Inc", country=None, days=30))
+        print(f"[CHECK] {days}d: 'Adobe, Inc' -> {d['developer']!r}, {len(d['timeline'])} timeline rows, "
+              f"{len(d['apps'])} apps")
+        os.remove(db)
+    report(f"developer aggregates, {a.countries} countries", res)
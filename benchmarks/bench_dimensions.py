@@ -0,0 +1,102 @@
+# benchmarks/bench_dimensions.py
+# Текстови ключове (idx_charts_app_history + DISTINCT/MAX по charts) срещу компактните
+# dim_context / chart_ranks върху многогодишна синтетична база: размер на индексите и на базата,
+# латентност на заявките, които API-то премести, и проверка, че резултатите са същите.
+import os, sqlite3, random, argparse, tempfile
+from common import load_api, timeit, report
+from dimensions import refresh_chart_ranks, context_ids, recent_days, app_ranks, day_number
+import synth
+
+LEGACY_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_charts_app_history
+    ON charts (app_id, snapshot_date, chart_type, country, category, subcategory, rank)
+"""
+
+
+def sizes(con) -> dict:
+    """Байтове по таблица/индекс (dbstat) + общо."""
+    out = dict(con.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    out["(file)"] = con.execute("PRAGMA page_count").fetchone()[0] * con.execute("PRAGMA page_size").fetchone()[0]
+    return out
+
+
+def mb(n) -> str:
+    return f"{(n or 0) / 1e6:.1f} MB"
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=1095)
+    p.add_argument("--countries", type=int, default=2)
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    con = sqlite3.connect(db)
+    con.execute(LEGACY_INDEX)
+    con.execute("VACUUM")
+
+    latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+    since = con.execute("SELECT date(?, '-364 day')", (latest,)).fetchone()[0]
+    rnd = random.Random(3)
+    ids = [r[0] for r in con.execute("SELECT DISTINCT app_id FROM charts WHERE snapshot_date=?", (latest,))]
+    sample = rnd.sample(ids, 50)
+
+    legacy = {
+        "app history 365d": lambda app_id: sorted(con.execute("""
+            SELECT snapshot_date, country, category, subcategory, rank FROM charts INDEXED BY idx_charts_app_history
+            WHERE app_id=? AND snapshot_date BETWEEN ? AND ? AND chart_type='top_free'
+        """, (app_id, since, latest)).fetchall()),
+        "latest date (US)": lambda _: con.execute(
+            "SELECT MAX(snapshot_date) FROM charts WHERE country='US' AND chart_type='top_free'").fetchone()[0],
+        "last 30 dates (US/Games/Puzzle)": lambda _: [r[0] for r in con.execute("""
+            SELECT DISTINCT snapshot_date FROM charts
+            WHERE chart_type='top_free' AND country='US' AND category='Games' AND subcategory='Puzzle'
+            ORDER BY snapshot_date DESC LIMIT 30
+        """)],
+        "seen before (RE-ENTRY check)": lambda app_id: con.execute("""
+            SELECT 1 FROM charts b WHERE b.app_id=? AND b.snapshot_date < ? AND b.chart_type='top_free' AND b.country='US'
+        """, (app_id, latest)).fetchone() is not None,
+    }
+    before_sizes = sizes(con)
+    res, results_before = {}, {}
+    for name, fn in legacy.items():
+        results_before[name] = [fn(x) for x in sample]
+        res[f"{name}: text keys"] = timeit(lambda: fn(rnd.choice(sample)), repeat=30)
+
+    res["chart_ranks build (full)"] = timeit(lambda: refresh_chart_ranks(con), repeat=1)
+    con.execute("VACUUM")
+    after_sizes = sizes(con)
+
+    us = context_ids(con, {"country": "US"})
+    puzzle = context_ids(con, {"country": "US", "category": "Games", "subcategory": "Puzzle"})
+    compact = {
+        "app history 365d": lambda app_id: sorted(
+            tuple(r.values()) for r in app_ranks(con, app_id, since, latest)),
+        "latest date (US)": lambda _: recent_days(con, context_ids(con, {"country": "US"}), 1)[0],
+        "last 30 dates (US/Games/Puzzle)": lambda _: recent_days(con, puzzle, 30),
+        "seen before (RE-ENTRY check)": lambda app_id: con.execute(f"""
+            SELECT 1 FROM chart_ranks b WHERE b.app_id=? AND b.day < ?
+              AND b.ctx_id IN ({','.join(map(str, us))})
+        """, (int(app_id), day_number(latest))).fetchone() is not None,
+    }
+    mismatches = 0
+    for name, fn in compact.items():
+        mismatches += [fn(x) for x in sample] != results_before[name]
+        res[f"{name}: compact keys"] = timeit(lambda: fn(rnd.choice(sample)), repeat=30)
+    print(f"[CHECK] {mismatches} mismatching queries")
+    con.close()
+
+    res["charts (table + PK)"] = f"{mb(before_sizes.get('charts', 0) + before_sizes.get('sqlite_autoindex_charts_1', 0))}"
+    res["idx_charts_app_history (before)"] = mb(before_sizes.get("idx_charts_app_history"))
+    res["chart_ranks + ix_chart_ranks_day (after)"] = (
+        f"{mb(after_sizes.get('chart_ranks'))} + {mb(after_sizes.get('ix_chart_ranks_day'))}")
+    res["DB size"] = f"{mb(before_sizes['(file)'])} -> {mb(after_sizes['(file)'])}"
+
+    api = load_api(db)
+    res["/apps/{id}/history days=365"] = timeit(lambda: api.app_history(rnd.choice(sample), days=365))
+    res["/compare/weekly-full US"] = timeit(lambda: api.compare_weekly_full(country="US"), repeat=5)
+    res["/weekly/insights US"] = timeit(lambda: api.weekly_insights(country="US"), repeat=5)
+    res["/search q='clash'"] = timeit(lambda: api.search(q="clash", limit=20))
+    report(f"dictionary-encoded keys, {a.days} days x {a.countries} countries", res)
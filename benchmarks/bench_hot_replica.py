@@ -0,0 +1,81 @@
+# benchmarks/bench_hot_replica.py
+# Маршрутите, които четат последните дни от charts / history_events: само от диска срещу репликата в
+# паметта (hot_replica), при няколко бюджета за памет. Мери времето за строене и размера на репликата,
+# проверява, че отговорите са същите, и че заявка извън прозореца отива на диска.
+import os, argparse, tempfile
+os.environ["HOT_REPLICA"] = "0"  # API-то без собствена реплика; бенчмаркът ги строи сам
+from common import load_api, payload, timeit, report
+from hot_replica import HotReplica
+import synth
+
+
+def routes(api, country: str) -> dict:
+    f = {"country": country, "category": None, "subcategory": None}
+    return {
+        "/charts": lambda: api.charts(country=country, limit=50),
+        "/compare": lambda: api.compare_alias(limit=500, format=None, cursor=None, **f),
+        "/compare?format=csv": lambda: api.compare_alias(limit=500, format="csv", cursor=None, **f),
+        "/weekly/insights": lambda: api.weekly_insights(lookback_days=7, status=None, format=None, limit=500,
+                                                        cursor=None, **f),
+        "/history": lambda: api.history_view(lookback_days=7, date=None, status=None, export=None, limit=500,
+                                             cursor=None, **f),
+        "/dashboard": lambda: api.dashboard(lookback_days=7, status=None, limit=500, **f),
+    }
+
+
+def evict(db: str):
+    """Изхвърля файла на базата от page cache на ОС — „студен“ диск (напр. след друг I/O или мрежов диск)."""
+    for path in (db, db + "-wal"):
+        if os.path.exists(path):
+            fd = os.open(path, os.O_RDONLY)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            os.close(fd)
+
+
+def measure(res: dict, label: str, fns: dict, db: str):
+    for name, fn in fns.items():
+        res[f"{label} {name}"] = timeit(fn)
+    for name in ("/compare", "/weekly/insights", "/dashboard"):
+        res[f"{label} {name} (cold page cache)"] = timeit(lambda: (evict(db), fns[name]()), repeat=5)
+
+
+def body(resp):
+    return resp.body if getattr(resp, "media_type", None) == "text/csv" else payload(resp)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    api = load_api(db)
+    country = synth.COUNTRIES[0]
+    res = {"disk db": f"{os.path.getsize(db) / 1e6:.0f} MB"}
+
+    disk = routes(api, country)
+    expected = {name: body(fn()) for name, fn in disk.items()}
+    measure(res, "disk", disk, db)
+
+    for days, budget in ((14, 256 << 20), (14, 32 << 20)):
+        api.HOT = HotReplica(str(api.DB_PATH), api._db_stamp, days=days, max_bytes=budget)
+        stats = api.HOT.build()
+        label = f"hot {days}d/{budget >> 20}MB"
+        res[f"{label}: replica"] = {k: stats[k] for k in ("days", "rows", "bytes", "build_s")}
+        fns = routes(api, country)
+        for name, fn in fns.items():
+            if body(fn()) != expected[name]:
+                print(f"[CHECK] {label} {name}: response differs from disk")
+        measure(res, label, fns, db)
+        res[f"{label}: routed hot / disk"] = f"{api.HOT.stats['hot']} / {api.HOT.stats['disk']}"
+
+    # извън прозореца: история за 60 дни -> диска
+    before = api.HOT.stats["disk"]
+    api.history_view(country=country, category=None, subcategory=None, lookback_days=60, date=None, status=None,
+                     export=None, limit=500, cursor=None)
+    print(f"[CHECK] 60-day /history routed to disk: {api.HOT.stats['disk'] == before + 1}")
+    report(f"hot replica, {a.days} days x {a.countries} countries", res)
+    os.remove(db)
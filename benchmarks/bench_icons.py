@@ -0,0 +1,111 @@
+# benchmarks/bench_icons.py
+# /icons/{app_id} срещу локален stub сървър вместо CDN-а на Apple (фиксирано забавяне на заявка):
+# предварително теглене след скрейпа (1 срещу N нишки), студен и топъл кеш при зареждане на таблото,
+# hit rate и LRU изхвърляне при малък лимит. Проверява ETag / 304 и че лимитът се спазва.
+import os, time, random, sqlite3, argparse, tempfile, threading, statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import synth
+
+TMP = tempfile.mkdtemp()
+os.environ["ICON_CACHE_DIR"] = os.path.join(TMP, "icons")  # преди импорта на icon_cache / API-то
+from common import load_api, timeit, report
+from icon_cache import IconCache, prefetch_icons, fetch_icon
+
+
+class Stub(BaseHTTPRequestHandler):
+    latency, requests = 0.03, 0
+
+    def do_GET(self):
+        Stub.requests += 1
+        time.sleep(Stub.latency)
+        n = int(self.path.split("/")[3])
+        body = b"\x89PNG\r\n\x1a\n" + random.Random(n).randbytes(4000 + n % 8000)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *a):
+        pass
+
+
+def page_loads(api, charts: list, loads: int) -> list:
+    """Зареждания на таблото: всяко рисува иконите на една класация, популярните филтри по-често."""
+    rnd, samples = random.Random(3), []
+    for _ in range(loads):
+        for app_id in charts[min(int(rnd.paretovariate(1.0)) - 1, len(charts) - 1)]:
+            t0 = time.perf_counter()
+            api.icon(app_id, if_none_match=None)
+            samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def ms(samples: list) -> dict:
+    samples = sorted(samples)
+    return {"p50_ms": round(statistics.median(samples), 3), "p95_ms": round(samples[int(len(samples) * 0.95)], 3),
+            "requests": len(samples)}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=3)
+    p.add_argument("--countries", type=int, default=2)
+    p.add_argument("--latency-ms", type=float, default=30)
+    a = p.parse_args()
+    Stub.latency = a.latency_ms / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub = f"http://127.0.0.1:{server.server_address[1]}"
+
+    db = os.path.join(TMP, "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    con = sqlite3.connect(db)
+    con.execute("UPDATE charts SET icon_url = replace(icon_url, 'https://is1-ssl.mzstatic.com', ?)", (stub,))
+    con.commit()
+    latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+    charts = {}
+    for key, app_id in con.execute("SELECT country || category || IFNULL(subcategory, ''), app_id FROM charts "
+                                   "WHERE snapshot_date=? ORDER BY country, category, subcategory, rank", (latest,)):
+        charts.setdefault(key, []).append(app_id)
+    charts = list(charts.values())
+    ids = list(dict.fromkeys(x for c in charts for x in c))
+    url = con.execute("SELECT icon_url FROM charts LIMIT 1").fetchone()[0]
+
+    res = {"icons in the latest snapshot": len(ids),
+           f"direct fetch from the stub ({a.latency_ms:.0f} ms)": timeit(lambda: fetch_icon(url), repeat=10)}
+    for workers in (1, 8):
+        t0 = time.perf_counter()
+        out = IconCache(os.path.join(TMP, f"prefetch{workers}")).prefetch(
+            [r[0] for r in con.execute("SELECT DISTINCT icon_url FROM charts WHERE snapshot_date=?", (latest,))],
+            workers=workers)
+        res[f"prefetch after scrape, {workers} thread(s)"] = f"{time.perf_counter() - t0:.1f} s ({out})"
+
+    api = load_api(db)
+    res["cold cache: 20 dashboard loads"] = ms(page_loads(api, charts, 20))
+    res["cold cache: hit rate"] = api.ICONS.summary()["hit_rate"]
+    prefetch_icons(con, latest, api.ICONS)
+    api.ICONS.stats.update(hits=0, misses=0)
+    res["after prefetch: 20 dashboard loads"] = ms(page_loads(api, charts, 20))
+    res["after prefetch: hit rate"] = api.ICONS.summary()["hit_rate"]
+    r = api.icon(ids[0], if_none_match=None)
+    again = api.icon(ids[0], if_none_match=r.headers["ETag"])
+    print(f"[CHECK] Cache-Control: {r.headers['Cache-Control']!r}, conditional request -> {again.status_code}")
+
+    # LRU: лимит 1/4 от иконите на деня
+    total = api.ICONS.summary()["bytes"]
+    small = IconCache(os.path.join(TMP, "small"), max_bytes=total // 4)
+    small.prefetch([r[0] for r in con.execute("SELECT DISTINCT icon_url FROM charts WHERE snapshot_date=?",
+                                              (latest,))])
+    api.ICONS = small
+    page_loads(api, charts, 40)
+    s = small.summary()
+    print(f"[CHECK] LRU size {s['bytes']} <= limit {s['max_bytes']}: {s['bytes'] <= s['max_bytes']}")
+    res["LRU at 1/4 of the icons: 40 dashboard loads hit rate"] = s["hit_rate"]
+    res["LRU evictions"] = s["evicted"]
+    res["stub requests total"] = Stub.requests
+    con.close()
+    server.shutdown()
+    report(f"icon cache, stub latency {a.latency_ms:.0f} ms", res)
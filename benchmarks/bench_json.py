@@ -0,0 +1,73 @@
+# benchmarks/bench_json.py
+# Кодиране/декодиране: stdlib json срещу json_codec (orjson) върху реалистични данни:
+# iTunes lookup (raw), RSS feed и API отговори (/compare/weekly-full, /history).
+import os, json, argparse, tempfile
+from common import load_api, timeit, report
+import json_codec
+import synth
+
+
+def lookup_payload(n: int = 50) -> dict:
+    """Като отговора на itunes.apple.com/lookup за един chunk от 50 id-та."""
+    results = []
+    for i in range(n):
+        app_id = str(1_400_000_000 + i * 7919)
+        results.append({
+            "trackId": int(app_id), "trackName": synth.app_name(app_id) + " – Ëdition",
+            "bundleId": f"com.dev{i}.app{app_id}", "sellerName": synth.developer_name(app_id),
+            "artistName": synth.developer_name(app_id), "price": 0.0, "currency": "USD",
+            "averageUserRating": 4.5 + i / 100, "userRatingCount": 10_000 + i,
+            "trackViewUrl": f"https://apps.apple.com/us/app/id{app_id}?uo=4",
+            "sellerUrl": f"https://dev{i}.example.com", "artworkUrl100": f"https://is1-ssl.mzstatic.com/{app_id}/100x100bb.jpg",
+            "screenshotUrls": [f"https://is1-ssl.mzstatic.com/{app_id}/{k}.jpg" for k in range(8)],
+            "genres": ["Games", "Puzzle", "Casual"], "genreIds": ["6014", "7012", "7003"],
+            "description": "Съвпадни бонбоните и спаси кралството! Match candies. " * 40,
+            "releaseNotes": "Bug fixes and performance improvements. 🚀" * 5,
+            "languageCodesISO2A": ["EN", "BG", "DE", "FR", "ES", "IT", "RU"],
+            "fileSizeBytes": str(200_000_000 + i), "minimumOsVersion": "13.0", "contentAdvisoryRating": "4+",
+        })
+    return {"resultCount": n, "results": results}
+
+
+def rss_payload(n: int = 50) -> dict:
+    entries = []
+    for i in range(n):
+        app_id = str(1_400_000_000 + i * 7919)
+        entries.append({
+            "im:name": {"label": synth.app_name(app_id)},
+            "im:image": [{"label": f"https://is1-ssl.mzstatic.com/{app_id}/{s}.png", "attributes": {"height": str(s)}} for s in (53, 75, 100)],
+            "summary": {"label": "Lorem ipsum dolor sit amet " * 30},
+            "im:price": {"label": "Get", "attributes": {"amount": "0.00000", "currency": "USD"}},
+            "id": {"label": f"https://apps.apple.com/us/app/x/id{app_id}?uo=2", "attributes": {"im:id": app_id}},
+            "im:artist": {"label": synth.developer_name(app_id)},
+            "category": {"attributes": {"im:id": "7012", "term": "Puzzle", "label": "Puzzle"}},
+        })
+    return {"feed": {"author": {"name": {"label": "iTunes Store"}}, "entry": entries}}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=60)
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    synth.build(db, days=a.days)
+    api = load_api(db)
+    payloads = {
+        "lookup chunk (50 apps)": lookup_payload(),
+        "RSS feed (50 entries)": rss_payload(),
+        "/compare/weekly-full all": json_codec.loads(api.compare_weekly_full(country="US").body),
+        "/history 30d page (1000)": json_codec.loads(api.history_view(country="US", lookback_days=30, limit=1000).body),
+    }
+
+    res = {"backend": json_codec.BACKEND}
+    for name, obj in payloads.items():
+        raw_std = json.dumps(obj, ensure_ascii=False)
+        raw_fast = json_codec.dumps_bytes(obj)
+        assert json.loads(raw_fast) == json.loads(raw_std)
+        res[f"{name}: size"] = f"{len(raw_std.encode())} B stdlib / {len(raw_fast)} B codec"
+        res[f"{name}: encode stdlib"] = timeit(lambda: json.dumps(obj, ensure_ascii=False).encode(), repeat=30)
+        res[f"{name}: encode codec"] = timeit(lambda: json_codec.dumps_bytes(obj), repeat=30)
+        res[f"{name}: decode stdlib"] = timeit(lambda: json.loads(raw_std), repeat=30)
+        res[f"{name}: decode codec"] = timeit(lambda: json_codec.loads(raw_fast), repeat=30)
+    report("JSON codec", res)
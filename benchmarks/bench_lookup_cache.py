@@ -0,0 +1,97 @@
+# benchmarks/bench_lookup_cache.py
+# Поредица дневни скрейпове офлайн (класациите идват от синтетична база, iTunes Lookup е фалшив и брои
+# заявките): lookup на всичко всеки ден срещу LookupCache с различни TTL. Проверява, че записаните
+# редове са пълни, и мери колко стари са lookup данните в тях.
+import os, math, sqlite3, argparse, tempfile
+from common import report
+import lookup_cache
+from lookup_cache import LookupCache, LOOKUP_BATCH, DAY
+from chart_schema import ensure_charts_table
+from json_codec import dumps
+import synth
+
+BASE = 1_700_000_000.0
+
+
+class FakeLookup:
+    """enrich_with_lookup без мрежа: рейтингът се мени всеки ден, останалото е постоянно."""
+
+    def __init__(self):
+        self.day, self.requests = 0, 0
+
+    def __call__(self, country, ids):
+        self.requests += math.ceil(len(ids) / LOOKUP_BATCH)
+        out = {}
+        for x in ids:
+            r = {"trackId": int(x), "bundleId": f"com.app{x}", "day": self.day,
+                 "averageUserRating": round(3 + (int(x) + self.day) % 20 / 10, 1)}
+            out[x] = {"bundle_id": r["bundleId"], "price": 0.0, "currency": "USD", "rating": r["averageUserRating"],
+                      "ratings_count": int(x) % 1000 + self.day, "app_store_url": f"https://apps.apple.com/app/id{x}",
+                      "app_url": None, "icon_url": f"https://is1-ssl.mzstatic.com/{x}/100x100bb.png", "raw": dumps(r)}
+        return out
+
+
+def feed(src, days: list) -> dict:
+    """ден -> [(country, category, subcategory, items)] както ги връща fetch_unit."""
+    out = {}
+    for snap, country, cat, sub, rank, app_id in src.execute(
+            "SELECT snapshot_date, country, category, subcategory, rank, app_id FROM charts ORDER BY 1, 2, 3, 4, 5"):
+        units = out.setdefault(snap, {})
+        units.setdefault((country, cat, sub), []).append({"id": app_id, "rank": rank})
+    return {d: [(*k, v) for k, v in out[d].items()] for d in days}
+
+
+def run(units_by_day: dict, ttl: float, rating_ttl: float, budget: int, cached: bool = True) -> dict:
+    lookup_cache.LOOKUP_TTL_DAYS, lookup_cache.LOOKUP_RATING_TTL_DAYS = ttl, rating_ttl
+    conn = sqlite3.connect(":memory:")
+    ensure_charts_table(conn)
+    fake = FakeLookup()
+    incomplete = age_sum = outdated = 0
+    for d, snap in enumerate(sorted(units_by_day)):
+        fake.day = d
+        cache = LookupCache(conn, fake, snap, now=BASE + d * DAY)
+        for country, cat, sub, items in units_by_day[snap]:
+            lookup = cache.lookup(country, items) if cached else fake(country, [i["id"] for i in items])
+            conn.executemany(
+                "INSERT INTO charts (snapshot_date, country, category, subcategory, chart_type, rank, app_id, "
+                "bundle_id, rating, icon_url, raw) VALUES (?,?,?,?,'top_free',?,?,?,?,?,?)",
+                [(snap, country, cat, sub, it["rank"], it["id"], *(lookup.get(it["id"], {}).get(c) for c in
+                  ("bundle_id", "rating", "icon_url", "raw"))) for it in items])
+        if cached:
+            cache.flush()
+            cache.refresh_stale(budget)
+        incomplete += conn.execute("SELECT COUNT(*) FROM charts WHERE snapshot_date=? AND "
+                                   "(bundle_id IS NULL OR icon_url IS NULL OR raw IS NULL)", (snap,)).fetchone()[0]
+        # възраст на lookup данните в днешните редове (денят на lookup-а е в raw)
+        for age, n in conn.execute("SELECT ? - json_extract(raw, '$.day'), COUNT(*) FROM charts "
+                                   "WHERE snapshot_date=? GROUP BY 1", (d, snap)):
+            age_sum += age * n
+            outdated += n if age > rating_ttl else 0
+    rows = conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    conn.close()
+    return {"requests": fake.requests, "incomplete rows": incomplete, "avg data age days": round(age_sum / rows, 2),
+            "older than rating ttl": f"{outdated / rows:.1%}"}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "feed.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    src = sqlite3.connect(db)
+    days = [r[0] for r in src.execute("SELECT DISTINCT snapshot_date FROM charts ORDER BY 1")]
+    units = feed(src, days)
+    src.close()
+
+    base = run(units, 7, 7, 0, cached=False)
+    res = {"no cache (lookup every app every day)": base}
+    for ttl, rating_ttl, budget in ((7, 7, 2000), (7, 1, 2000), (7, 1, 500), (30, 30, 2000)):
+        r = run(units, ttl, rating_ttl, budget)
+        r["avoided"] = f"{1 - r['requests'] / base['requests']:.0%}"
+        res[f"ttl={ttl}d rating_ttl={rating_ttl}d budget={budget}"] = r
+    report(f"iTunes Lookup over {a.days} daily runs, {a.countries} countries", res)
+    os.remove(db)
@@ -0,0 +1,82 @@
+# benchmarks/bench_meta.py
+# /meta: три SELECT DISTINCT по целия charts срещу каталога dim_catalog (кеширан в паметта на API-то),
+# при къса и дълга история — каталогът не трябва да зависи от броя дни. Проверява и че
+# инкременталният каталог (ден по ден) съвпада с пълния и с GROUP BY по charts.
+import os, sqlite3, argparse, tempfile
+from common import load_api, payload, timeit, report
+from dimensions import refresh_chart_ranks, catalog
+import synth
+
+
+def legacy_meta(con, category=None) -> dict:
+    data = {
+        "countries": [r[0] for r in con.execute(
+            "SELECT DISTINCT country FROM charts WHERE country IS NOT NULL ORDER BY country")],
+        "categories": [r[0] for r in con.execute(
+            "SELECT DISTINCT category FROM charts WHERE category IS NOT NULL ORDER BY category")],
+    }
+    if category:
+        data["subcategories"] = [r[0] for r in con.execute(
+            "SELECT DISTINCT subcategory FROM charts WHERE category=? AND subcategory IS NOT NULL ORDER BY subcategory",
+            (category,))]
+    else:
+        data["subcategories"] = [r[0] for r in con.execute(
+            "SELECT DISTINCT subcategory FROM charts WHERE subcategory IS NOT NULL ORDER BY subcategory")]
+    return data
+
+
+def expected_catalog(con) -> list:
+    return sorted(con.execute("""
+        SELECT country, chart_type, category, subcategory, MIN(snapshot_date), MAX(snapshot_date), COUNT(*)
+        FROM charts GROUP BY country, chart_type, category, IFNULL(subcategory, '')
+    """).fetchall(), key=repr)
+
+
+def as_tuples(rows) -> list:
+    return sorted((tuple(r.values()) for r in rows), key=repr)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, nargs="+", default=[30, 365, 1095])
+    p.add_argument("--countries", type=int, default=2)
+    a = p.parse_args()
+
+    res = {}
+    for days in a.days:
+        tmp = tempfile.mkdtemp()
+        db = os.path.join(tmp, "bench.db")
+        print(f"generating {days} days x {a.countries} countries -> {db}")
+        synth.build(db, days=days, countries=synth.COUNTRIES[:a.countries])
+        con = sqlite3.connect(db)
+
+        res[f"{days}d: legacy /meta (3x DISTINCT)"] = timeit(lambda: legacy_meta(con), repeat=5)
+        res[f"{days}d: legacy /meta category=Games"] = timeit(lambda: legacy_meta(con, "Games"), repeat=5)
+
+        # пълният build, после последните 3 дни наново един по един (както post_scrape)
+        refresh_chart_ranks(con)
+        full = as_tuples(catalog(con))
+        dates = [r[0] for r in con.execute("SELECT DISTINCT snapshot_date FROM charts ORDER BY 1 DESC LIMIT 3")]
+        res[f"{days}d: chart ranks + catalog (one day)"] = timeit(lambda: refresh_chart_ranks(con, dates[0]), repeat=3)
+        for d in reversed(dates):
+            refresh_chart_ranks(con, d)
+        incremental = as_tuples(catalog(con))
+        print(f"[CHECK] {days}d: incremental == full: {incremental == full}, "
+              f"== GROUP BY charts: {full == expected_catalog(con)}")
+        res[f"{days}d: catalog rows"] = len(full)
+        want = legacy_meta(con), legacy_meta(con, "Games")
+        con.close()
+
+        api = load_api(db)
+        got = payload(api.get_meta()), payload(api.get_meta(category="Games"))
+        same = all(g[k] == w[k] for g, w in zip(got, want) for k in ("countries", "categories", "subcategories"))
+        print(f"[CHECK] {days}d: /meta lists == legacy: {same}")
+
+        def cold():
+            api._META_CACHE["stamp"] = None
+            api.get_meta(category="Games")
+
+        res[f"{days}d: /meta (cold cache)"] = timeit(cold, repeat=10)
+        res[f"{days}d: /meta category=Games (cached)"] = timeit(lambda: api.get_meta(category="Games"), repeat=200)
+        os.remove(db)
+    report("dimension catalog for /meta", res)
@@ -0,0 +1,144 @@
+# benchmarks/bench_migrations.py
+# Миграциите на схемата (scraper/migrations.py) върху голяма база в старите формати на charts:
+#   api      — схемата на скрейперите + колона developer, която старият ensure_tables_exist добавяше
+#              (така изглеждат базите в продукция) -> copy-and-swap, при няколко размера на порцията;
+#              за сравнение ALTER TABLE DROP COLUMN на SQLite (една транзакция през цялата таблица)
+#   init_db  — AUTOINCREMENT id + 5 вторични индекса + изгледи (appstore-api/init_db.py) -> copy-and-swap
+#   canonical — без schema_version, но вече в каноничния вид -> само проверки
+# Без VACUUM файлът остава ~2x (свободните страници на старата таблица); с него се свива обратно.
+# Мери редове/s и MB/s и проверява, че резултатът е като току-що създадена база.
+import os, time, shutil, sqlite3, argparse, tempfile
+from common import report
+import migrations
+from migrations import migrate, current_version
+import synth
+
+INIT_DB_CHARTS = """
+    CREATE TABLE charts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, snapshot_date TEXT NOT NULL, country TEXT NOT NULL,
+        chart_type TEXT NOT NULL, category TEXT NOT NULL, subcategory TEXT, rank INTEGER NOT NULL,
+        app_id TEXT NOT NULL, bundle_id TEXT, app_name TEXT NOT NULL, developer_name TEXT, price REAL,
+        currency TEXT, rating REAL, ratings_count INTEGER, fetched_at TEXT DEFAULT (datetime('now')), raw TEXT
+    );
+    CREATE UNIQUE INDEX ux_charts_context_rank ON charts (snapshot_date, country, chart_type, category, subcategory, rank);
+    CREATE UNIQUE INDEX ux_charts_context_app ON charts (snapshot_date, country, chart_type, category, subcategory, app_id);
+    CREATE INDEX idx_charts_date ON charts (snapshot_date);
+    CREATE INDEX idx_charts_app_date ON charts (app_id, snapshot_date);
+    CREATE INDEX idx_charts_ctx_date ON charts (country, chart_type, category, subcategory, snapshot_date);
+    CREATE VIEW IF NOT EXISTS v_current_top50 AS
+    SELECT * FROM charts WHERE snapshot_date = (SELECT MAX(snapshot_date) FROM charts) AND rank <= 50;
+    CREATE VIEW IF NOT EXISTS v_last7 AS
+    SELECT * FROM charts WHERE snapshot_date >= date((SELECT MAX(snapshot_date) FROM charts), '-6 day');
+"""
+INIT_DB_COLS = ("snapshot_date, country, chart_type, category, subcategory, rank, app_id, bundle_id, app_name, "
+                "developer_name, price, currency, rating, ratings_count, raw")
+
+
+def layout(path: str) -> tuple:
+    """Схемата без имената в кавички (RENAME ги слага) — за сравнение с нова база."""
+    con = sqlite3.connect(path)
+    out = tuple((t, n, " ".join((s or "").replace('"', "").split())) for t, n, s in con.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_autoindex%' ORDER BY type, name"))
+    con.close()
+    return out
+
+
+def fingerprint(path: str) -> tuple:
+    con = sqlite3.connect(path)
+    out = con.execute("SELECT COUNT(*), SUM(rank), COUNT(DISTINCT app_id), COUNT(developer_name), "
+                      "SUM(length(raw)) FROM charts").fetchone()
+    con.close()
+    return out
+
+
+def run(src: str, dst: str, batch: int = None, vacuum: bool = True) -> dict:
+    shutil.copy(src, dst)
+    size = os.path.getsize(dst)
+    if batch:
+        migrations.MIGRATE_BATCH_ROWS = batch
+    migrations.MIGRATE_VACUUM = vacuum
+    con = sqlite3.connect(dst)
+    rows = con.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    t0 = time.perf_counter()
+    applied = migrate(con)
+    dt = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    migrate(con)  # вече на последната версия
+    noop = time.perf_counter() - t1
+    version = current_version(con)
+    con.close()
+    if dt < 0.1:  # само проверки
+        return {"seconds": round(dt, 4), "applied": [a["result"] for a in applied], "version": version,
+                "noop_ms": round(noop * 1000, 3)}
+    return {"seconds": round(dt, 2), "rows/s": f"{rows / dt:,.0f}", "MB/s": round(size / 2**20 / dt, 1),
+            "file MB before/after": f"{size / 2**20:.0f} / {os.path.getsize(dst) / 2**20:.0f}",
+            "applied": [a["result"] for a in applied], "version": version, "noop_ms": round(noop * 1000, 3)}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    p.add_argument("--no-raw", action="store_true", help="without the raw JSON column (smaller rows)")
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    canonical = os.path.join(tmp, "canonical.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {canonical}")
+    synth.build(canonical, days=a.days, countries=synth.COUNTRIES[:a.countries], with_raw=not a.no_raw)
+    con = sqlite3.connect(canonical)
+    con.execute("PRAGMA journal_mode=DELETE")
+    con.close()
+    expected_layout, expected = layout(canonical), fingerprint(canonical)
+
+    # старите формати
+    api = os.path.join(tmp, "api.db")
+    shutil.copy(canonical, api)
+    con = sqlite3.connect(api)
+    con.execute("DELETE FROM schema_version")
+    con.execute("ALTER TABLE charts ADD COLUMN developer TEXT")
+    con.commit()
+    con.close()
+    init_db = os.path.join(tmp, "init_db.db")
+    con = sqlite3.connect(init_db)
+    con.executescript(INIT_DB_CHARTS)
+    con.execute("ATTACH DATABASE ? AS src", (canonical,))
+    con.execute(f"INSERT INTO charts ({INIT_DB_COLS}) SELECT {INIT_DB_COLS} FROM src.charts ORDER BY rowid")
+    con.commit()
+    con.close()
+    unversioned = os.path.join(tmp, "unversioned.db")
+    shutil.copy(canonical, unversioned)
+    con = sqlite3.connect(unversioned)
+    con.execute("DROP TABLE schema_version")
+    con.commit()
+    con.close()
+
+    res = {"rows": f"{expected[0]:,}", "canonical db": f"{os.path.getsize(canonical) / 2**20:.0f} MB"}
+    out = os.path.join(tmp, "work.db")
+    checks = []
+    for label, src, batch, vacuum in (
+            ("api, batch 50k", api, 50_000, False), ("api, batch 250k", api, 250_000, False),
+            ("api, batch 1M", api, 1_000_000, False), ("api, batch 250k + VACUUM", api, 250_000, True),
+            ("init_db, batch 250k + VACUUM", init_db, 250_000, True),
+            ("canonical, unversioned", unversioned, None, True)):
+        res[label] = run(src, out, batch, vacuum)
+        got = fingerprint(out)
+        # init_db не пази genre_id / URL-ите — сравняват се броят, ранговете и разработчиците
+        same = got == expected if src != init_db else got[:4] == expected[:4]
+        checks.append(f"{label}: layout {'same' if layout(out) == expected_layout else 'DIFFERS'}, "
+                      f"rows {'same' if same else f'DIFFER {got} vs {expected}'}")
+
+    # SQLite само маха колоната (също пренаписва всички редове, но в една транзакция и без смяна на ключа)
+    shutil.copy(api, out)
+    con = sqlite3.connect(out)
+    t0 = time.perf_counter()
+    con.execute("ALTER TABLE charts DROP COLUMN developer")
+    con.commit()
+    dt = time.perf_counter() - t0
+    con.close()
+    res["api, ALTER TABLE DROP COLUMN (reference)"] = {"seconds": round(dt, 2),
+                                                       "MB/s": round(os.path.getsize(api) / 2**20 / dt, 1)}
+    for line in checks:
+        print(f"[CHECK] {line}")
+    report(f"schema migrations, {a.days} days x {a.countries} countries", res)
+    shutil.rmtree(tmp)
@@ -0,0 +1,77 @@
+# benchmarks/bench_overlap.py
+# Пълната матрица държава x държава (среден Jaccard на топ 50) за всички жанрове и година снапшоти:
+# Python set-ове от chart_ranks срещу bitset-ите в chart_bitsets. Проверява, че двете матрици
+# съвпадат, мери пълния build и обновяването за един ден, и латентността на /overlap.
+import os, sqlite3, argparse, tempfile
+import numpy as np
+from common import load_api, payload, timeit, report
+from dimensions import refresh_chart_ranks
+from overlap import refresh_overlap, genres, jaccard_matrix, OVERLAP_DEPTH
+import synth
+
+
+def naive_matrix(con, countries: list, lo: int, hi: int) -> np.ndarray:
+    """Среден Jaccard с set-ове: (ден, жанр) -> държава -> set от app_id."""
+    sets = {}
+    for day, country, chart_type, category, sub, app_id in con.execute("""
+        SELECT r.day, x.country, x.chart_type, x.category, x.subcategory, r.app_id
+        FROM chart_ranks r JOIN dim_context x ON x.ctx_id = r.ctx_id
+        WHERE r.day BETWEEN ? AND ? AND r.rank <= ? AND x.chart_type = 'top_free'
+    """, (lo, hi, OVERLAP_DEPTH)):
+        sets.setdefault((day, category, sub), {}).setdefault(country, set()).add(app_id)
+    k = len(countries)
+    sums, counts = np.zeros((k, k)), np.zeros((k, k))
+    for by_country in sets.values():
+        for i, a in enumerate(countries):
+            for j, b in enumerate(countries):
+                if a in by_country and b in by_country:
+                    sa, sb = by_country[a], by_country[b]
+                    sums[i, j] += len(sa & sb) / len(sa | sb)
+                    counts[i, j] += 1
+    return sums / np.maximum(counts, 1)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    a = p.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    con = sqlite3.connect(db)
+    refresh_chart_ranks(con)
+    countries = [r[0] for r in con.execute("SELECT DISTINCT country FROM dim_context ORDER BY country")]
+    lo, hi = con.execute("SELECT MIN(day), MAX(day) FROM chart_ranks").fetchone()
+    latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+
+    res = {"refresh_overlap full build": timeit(lambda: refresh_overlap(con), repeat=1),
+           "refresh_overlap (one day)": timeit(lambda: refresh_overlap(con, latest), repeat=3)}
+    res["bitsets"] = con.execute("SELECT COUNT(*) FROM chart_bitsets").fetchone()[0]
+    res["avg bitset bytes"] = round(con.execute("SELECT AVG(LENGTH(bits)) FROM chart_bitsets").fetchone()[0], 1)
+
+    gids = [g[0] for g in genres(con)]
+    label = f"{len(countries)}x{len(countries)} matrix, {len(gids)} genres, {hi - lo + 1} days"
+    want = naive_matrix(con, countries, lo, hi)
+    sums, counts = jaccard_matrix(con, gids, countries, lo, hi)
+    print(f"[CHECK] bitset matrix == set matrix: {np.allclose(sums / np.maximum(counts, 1), want)}")
+    res[f"{label}: Python sets from chart_ranks"] = timeit(lambda: naive_matrix(con, countries, lo, hi), repeat=1)
+    res[f"{label}: bitsets + np.bitwise_count"] = timeit(lambda: jaccard_matrix(con, gids, countries, lo, hi),
+                                                          repeat=3)
+    con.close()
+
+    api = load_api(db)
+    res["/overlap all genres, 365 days"] = timeit(
+        lambda: api.overlap(countries=None, chart_type="top_free", category=None, subcategory=None,
+                            date=None, days=365), repeat=3)
+    res["/overlap Games/Puzzle, latest day"] = timeit(
+        lambda: api.overlap(countries="US,GB,DE", chart_type="top_free", category="Games", subcategory="Puzzle",
+                            date=None, days=1))
+    d = payload(api.overlap(countries="US,GB,DE", chart_type="top_free", category="Games", subcategory="Puzzle",
+                            date=None, days=1))
+    g = d["genres"][0]
+    print("Games/Puzzle US-GB:", d["matrix"]["US"]["GB"], "in all:", len(g["in_all"]),
+          "only US:", len(g["only"]["US"]))
+    report(f"chart overlap bitsets, {a.days} days x {a.countries} countries", res)
+    os.remove(db)
@@ -0,0 +1,44 @@
+# benchmarks/bench_pagination.py
+# Keyset пагинация: страница 1 срещу страница N и размер на отговора за /compare, /history, /weekly/insights.
+import os, argparse, tempfile
+from common import load_api, payload, timeit, report
+import synth
+
+
+def walk(fn, **kw):
+    """Връща cursor-ите на всички страници (за да можем да мерим произволна страница)."""
+    cursors, c = [None], None
+    while True:
+        page = payload(fn(cursor=c, **kw))
+        c = page.get("next_cursor")
+        if not c:
+            return cursors
+        cursors.append(c)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--db")
+    a = p.parse_args()
+
+    db = a.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    if not a.db:
+        synth.build(db, days=a.days)
+    api = load_api(db)
+
+    cases = {
+        "/compare all categories": (api.compare_alias, dict(country="US", limit=50)),
+        "/weekly/insights all categories": (api.weekly_insights, dict(country="US", limit=50, lookback_days=7)),
+        "/weekly/insights 30d lookback": (api.weekly_insights, dict(country="US", limit=50, lookback_days=30)),
+        "/history all categories 30d": (api.history_view, dict(country="US", limit=50, lookback_days=30)),
+    }
+    res = {}
+    for name, (fn, kw) in cases.items():
+        cursors = walk(fn, **kw)
+        last = cursors[-1]
+        res[f"{name}: pages"] = len(cursors)
+        res[f"{name}: page 1"] = timeit(lambda: fn(cursor=None, **kw), repeat=5)
+        res[f"{name}: page {len(cursors)}"] = timeit(lambda: fn(cursor=last, **kw), repeat=5)
+        res[f"{name}: page bytes"] = len(fn(cursor=None, **kw).body)
+    report(f"keyset pagination ({db})", res)
@@ -0,0 +1,44 @@
+# benchmarks/bench_retention.py
+# retention.py върху синтетична база с raw: размер на файла и латентност на заявките преди/след,
+# плюс проверка, че архивните сегменти връщат точно изтритите редове.
+import os, sqlite3, argparse, tempfile
+from common import report
+from retention import apply_retention, plan_tiers
+import synth
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=500)
+    p.add_argument("--countries", type=int, default=1)
+    p.add_argument("--raw-days", type=int, default=90)
+    p.add_argument("--daily-days", type=int, default=365)
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db = os.path.join(tmp, "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries (with raw) -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries], with_raw=True)
+
+    con = sqlite3.connect(db)
+    tiers = plan_tiers(con, a.raw_days, a.daily_days)
+    total_before = con.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    con.close()
+
+    archive_dir = os.path.join(tmp, "archive")
+    r = apply_retention(db, a.raw_days, a.daily_days, archive_dir)
+
+    # сегментите + останалото = всички редове отпреди
+    seg_rows = sum(sqlite3.connect(os.path.join(archive_dir, f)).execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+                   for f in os.listdir(archive_dir))
+    left = sqlite3.connect(db).execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    print(f"[CHECK] {left} kept + {seg_rows} archived = {left + seg_rows} (was {total_before})")
+
+    res = {
+        "tiers": f"raw from {tiers['raw_cutoff']}, daily from {tiers['archive_cutoff']}, "
+                 f"{len(tiers['archive_months'])} months archived",
+        "file size": f"{r['size_before'] / 1e6:.1f} MB -> {r['size_after'] / 1e6:.1f} MB ({r['compaction']})",
+        "archive segments": f"{sum(os.path.getsize(os.path.join(archive_dir, f)) for f in os.listdir(archive_dir)) / 1e6:.1f} MB",
+    }
+    for name, (before, after) in r["latency_ms"].items():
+        res[f"{name} (ms)"] = f"{before} -> {after}"
+    report("tiered retention", res)
@@ -0,0 +1,49 @@
+# benchmarks/bench_rollups.py
+# chart_rollups: пълно изграждане, инкрементално обновяване след нов ден и /stats/apps
+# за 30/90/180/365 дни (rollup-и + краища) срещу чисто дневно изчисление. Проверява и точното съвпадение.
+import os, time, sqlite3, argparse, tempfile
+from datetime import date, timedelta
+from common import load_api, timeit, report
+from rollups import refresh_rollups, range_stats, scan_days
+import synth
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=400)
+    p.add_argument("--countries", type=int, default=2)
+    p.add_argument("--db", help="reuse an existing DB instead of generating one")
+    a = p.parse_args()
+
+    db = a.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    if not a.db:
+        print(f"generating {a.days} days x {a.countries} countries -> {db}")
+        synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+
+    con = sqlite3.connect(db)
+    res = {}
+    t0 = time.perf_counter()
+    n = refresh_rollups(con)
+    res["full build"] = f"{time.perf_counter() - t0:.2f} s, {n} rollup rows"
+
+    # нов ден: rollup-ите на засегнатите седмици/месеци
+    latest = con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]
+    t0 = time.perf_counter()
+    n = refresh_rollups(con, latest)
+    res["incremental (latest day)"] = f"{time.perf_counter() - t0:.2f} s, {n} rollup rows"
+
+    where, params = "AND chart_type='top_free' AND country=?", ("US",)
+    mismatches = 0
+    for days in (30, 90, 180, 365):
+        lo = (date.fromisoformat(latest) - timedelta(days=days - 1)).isoformat()
+        fast, plan = range_stats(con, lo, latest, where, params)
+        daily = {k[2:]: v for k, v in scan_days(con, lo, latest, ["all"], where, params).items()}
+        mismatches += fast != daily
+        res[f"{days}d rollups ({len(plan['month'])}m+{len(plan['week'])}w+{plan['days']}d)"] = timeit(
+            lambda: range_stats(con, lo, latest, where, params), repeat=3)
+        res[f"{days}d daily rows"] = timeit(lambda: scan_days(con, lo, latest, ["all"], where, params), repeat=3)
+    print(f"[CHECK] rollups vs daily: {mismatches} mismatching ranges")
+
+    api = load_api(db)
+    res["/stats/apps days=365"] = timeit(lambda: api.stats_apps(country="US", days=365), repeat=3)
+    con.close()
+    report(f"chart rollups ({db})", res)
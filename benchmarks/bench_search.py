@@ -0,0 +1,37 @@
+# benchmarks/bench_search.py
+# FTS5 /search срещу наивен LIKE '%x%' върху charts, при растяща история.
+import os, sqlite3, argparse, tempfile
+from common import load_api, timeit, report
+from search_index import sync_search_index
+import synth
+
+QUERIES = ["clash", "pix", "super", "candy rush", "com.dev12", "moon act"]
+
+
+def like_search(con, q, limit=20):
+    pat = f"%{q}%"
+    return con.execute("""
+        SELECT app_id, MAX(app_name), MAX(developer_name), MAX(bundle_id) FROM charts
+        WHERE app_name LIKE ? OR developer_name LIKE ? OR bundle_id LIKE ?
+        GROUP BY app_id LIMIT ?
+    """, (pat, pat, pat, limit)).fetchall()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, nargs="+", default=[30, 180, 365])
+    a = p.parse_args()
+
+    for days in a.days:
+        db = os.path.join(tempfile.mkdtemp(), f"bench_{days}.db")
+        synth.build(db, days=days)
+        con = sqlite3.connect(db)
+        res = {"full index build": timeit(lambda: sync_search_index(con), repeat=1)}
+        res["incremental sync (latest day)"] = timeit(
+            lambda: sync_search_index(con, con.execute("SELECT MAX(snapshot_date) FROM charts").fetchone()[0]), repeat=3)
+        api = load_api(db)
+        for q in QUERIES:
+            res[f"/search q={q!r}"] = timeit(lambda: api.search(q=q, limit=20))
+            res[f"LIKE    q={q!r}"] = timeit(lambda: like_search(con, q), repeat=3)
+        con.close()
+        report(f"search, {days} days of history", res)
@@ -0,0 +1,144 @@
+# benchmarks/bench_shards.py
+# Един ден скрейп (apps + games) офлайн: iTunes RSS и Lookup са фалшиви, но детерминирани (класацията зависи
+# от държава + жанр, lookup данните — от държава + id) и всяка заявка чака --latency ms, както по мрежата.
+# Без шардове (scrape_apps + scrape_games в един процес) срещу shard_scrape.run_local с 4 / 8 / 16 шарда
+# (по държава; при 8 държави и по група жанрове). Проверява, че слетият ден е същият като без шардове,
+# че всички единици са done и че резултатът не зависи от броя шардове.
+# Локалните процеси делят един IP — реалното ускорение зависи от лимитите на Apple; в CI шардовете са
+# отделни runner-и.
+import os, io, time, shutil, sqlite3, argparse, tempfile, contextlib
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+os.environ["ICON_PREFETCH"] = "0"  # иконите не са част от сравнението (и са мрежа)
+from common import report
+import scraper_apps, scraper_games
+import shard_scrape
+from json_codec import dumps
+import synth
+
+# 150 кода — колкото държави има App Store приблизително
+ALL_COUNTRIES = synth.COUNTRIES + """
+    JP CN KR AU NZ BR MX AR CL CO PE NL BE AT CH SE NO DK FI PL CZ SK HU RO BG GR PT IE TR IL AE SA QA KW EG
+    ZA NG KE MA IN PK BD LK ID MY SG TH VN PH TW HK UA BY KZ UZ AZ GE AM LT LV EE SI HR RS BA MK AL ME MT CY
+    LU IS EC UY PY BO VE CR PA GT HN SV NI DO JM TT BB BS BZ BM KY GY SR BN KH LA MN NP MM MV BT FJ PG SB VU
+    TO WS NR PW FM MH KI TV OM BH JO LB DZ TN LY GH CI SN CM UG TZ ZW ZM MZ AO NA BW MW RW MU SC MG MD KG TJ
+    TM AF IQ YE
+""".split()
+
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.status_code, self.content = 200, body
+        self.text = body.decode()
+
+    def json(self):
+        from json_codec import loads
+        return loads(self.content)
+
+
+class FakeAppStore:
+    """requests.get за RSS и Lookup; класациите на жанровете в една държава се застъпват частично."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def rss(self, cc: str, gid: str) -> dict:
+        seed = sum(map(ord, cc)) * 7919 + int(gid)
+        ids = [str(100_000 + (seed * 31 + i * (int(gid) % 7 + 1)) % 40_000) for i in range(50)]
+        ids = list(dict.fromkeys(ids))
+        return {"feed": {"entry": [{"id": {"label": f"https://apps.apple.com/{cc}/app/id{x}?uo=2"},
+                                    "im:name": {"label": synth.app_name(x)},
+                                    "im:artist": {"label": synth.developer_name(x)}} for x in ids]}}
+
+    def lookup(self, cc: str, ids: list) -> dict:
+        return {"resultCount": len(ids), "results": [
+            {"trackId": int(x), "bundleId": f"com.app{x}", "price": 0.0, "currency": "USD",
+             "averageUserRating": round(3 + (int(x) + len(cc)) % 20 / 10, 1), "userRatingCount": int(x) % 5000,
+             "trackViewUrl": f"https://apps.apple.com/{cc.lower()}/app/id{x}", "sellerUrl": None,
+             "artworkUrl100": f"https://is1-ssl.mzstatic.com/image/{x}/100x100bb.png", "primaryGenreId": 6000}
+            for x in ids]}
+
+    def get(self, url, timeout=None, headers=None):
+        time.sleep(self.latency)
+        u = urlparse(url)
+        if u.path == "/lookup":
+            q = parse_qs(u.query)
+            return FakeResponse(dumps(self.lookup(q["country"][0], q["id"][0].split(","))).encode())
+        parts = u.path.strip("/").split("/")  # {cc}/rss/topfreeapplications/limit=50/genre={gid}/json
+        return FakeResponse(dumps(self.rss(parts[0].upper(), parts[4].split("=")[1])).encode())
+
+
+def day_state(db: str, snap: str) -> dict:
+    con = sqlite3.connect(db)
+    out = {
+        "charts": con.execute("SELECT COUNT(*), SUM(rank), COUNT(DISTINCT app_id), COUNT(bundle_id), "
+                              "SUM(length(raw)) FROM charts WHERE snapshot_date=?", (snap,)).fetchone(),
+        "rows": con.execute("SELECT country, category, subcategory, chart_type, rank, app_id, rating FROM charts "
+                            "WHERE snapshot_date=? ORDER BY 1, 2, 3, 4, 5", (snap,)).fetchall(),
+        "jobs": con.execute("SELECT status, COUNT(*) FROM scrape_jobs WHERE snapshot_date=? GROUP BY 1",
+                            (snap,)).fetchall(),
+        "history_events": con.execute("SELECT COUNT(*) FROM history_events WHERE snapshot_date=?",
+                                      (snap,)).fetchone()[0],
+        "lookup_cache": con.execute("SELECT COUNT(*) FROM lookup_cache").fetchone()[0],
+    }
+    con.close()
+    return out
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--countries", default="8,40,150", help="comma-separated scenario sizes")
+    p.add_argument("--shards", default="4,8,16")
+    p.add_argument("--latency", type=float, default=20, help="ms per fake HTTP request")
+    p.add_argument("--history-days", type=int, default=7)
+    a = p.parse_args()
+
+    fake = FakeAppStore(a.latency / 1000)
+    scraper_apps.requests.get = scraper_games.requests.get = fake.get  # преди fork-а на процесите
+
+    tmp = tempfile.mkdtemp()
+    base = os.path.join(tmp, "base.db")
+    snap = date.today().isoformat()  # денят след синтетичната история
+    synth.build(base, days=a.history_days, countries=synth.COUNTRIES, end=date.today() - timedelta(days=1))
+    res, checks = {}, []
+    for n in map(int, a.countries.split(",")):
+        countries = ALL_COUNTRIES[:n]
+        units = {s: [(c, g) for c in countries for g in genres] for s, (_, genres, _) in shard_scrape.SOURCES.items()}
+        label = f"{n} countries ({sum(map(len, units.values()))} units)"
+
+        db = os.path.join(tmp, "single.db")
+        shutil.copy(base, db)
+        t0 = time.perf_counter()
+        for source, (scrape, _, _) in shard_scrape.SOURCES.items():
+            quiet(scrape, db_path=db, units=units[source], snapshot_date=snap)
+        single = time.perf_counter() - t0
+        expected = day_state(db, snap)
+        res[f"{label}: unsharded"] = f"{single:.1f}s"
+
+        variants = [(s, "country") for s in map(int, a.shards.split(","))]
+        if n <= len(synth.COUNTRIES):
+            variants.append((max(variants)[0], "genre"))
+        for shards, by in variants:
+            db = os.path.join(tmp, "sharded.db")
+            shutil.copy(base, db)
+            t0 = time.perf_counter()
+            r = quiet(shard_scrape.run_local, shards, snapshot_date=snap, db_path=db,
+                      out_dir=os.path.join(tmp, "shards"), by=by, countries=countries)
+            dt = time.perf_counter() - t0
+            res[f"{label}: {shards} shards by {by}"] = (
+                f"{dt:.1f}s (x{single / dt:.1f}), scrape {r['scrape_seconds']}s, "
+                f"merge {r['total_seconds']}s (clear {r['clear_seconds']}s, insert {r['seconds']}s)")
+            got = day_state(db, snap)
+            diff = [k for k in expected if got[k] != expected[k]]
+            checks.append(f"{label}, {shards} by {by}: " + (f"DIFFERS in {diff}" if diff else
+                          f"same as unsharded, jobs {dict(got['jobs'])}"))
+        os.remove(db)
+    for line in checks:
+        print(f"[CHECK] {line}")
+    report(f"sharded scrape, latency {a.latency:g} ms/request", res)
+    shutil.rmtree(tmp)
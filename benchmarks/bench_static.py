@@ -0,0 +1,79 @@
+# benchmarks/bench_static.py
+# Пълен рендер на статичния снапшот (publish_static) върху синтетична база: 1 процес срещу пул,
+# брой и размер на файловете (сурови и .gz) и четене на един изглед от диска срещу /dashboard.
+# Проверява, че файловете съвпадат с живите маршрути (JSON-ът със следване на всички страници).
+import os, gzip, time, shutil, argparse, tempfile
+from common import load_api, payload, timeit, report
+import publish_static
+from json_codec import loads
+import synth
+
+
+def check(api, out_dir: str, manifest: dict) -> int:
+    """Сравнява файловете на всеки 7-и изглед с отговорите на API-то. Връща броя разлики."""
+    bad = 0
+    root = os.path.join(out_dir, manifest["base"])
+    for i, (key, base) in enumerate(manifest["views"].items()):
+        if i % 7:
+            continue
+        country, cat, sub = (None if x == "all" else x for x in key.split("|"))
+        f = {"country": country, "category": cat, "subcategory": sub}
+        rows, cur = [], None
+        while True:
+            p = payload(api.compare_alias(limit=100, format=None, cursor=cur, **f))
+            rows += p.get("results", [])
+            cur = p.get("next_cursor")
+            if not cur:
+                break
+        with open(os.path.join(root, base, "compare.json"), "rb") as fh:
+            bad += loads(fh.read())["results"] != rows
+        csv = api.weekly_insights(lookback_days=7, status=None, format="csv", limit=500, cursor=None, **f)
+        with gzip.open(os.path.join(root, base, "weekly.csv.gz"), "rb") as fh:
+            bad += fh.read() != getattr(csv, "body", b"")
+    return bad
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db = os.path.join(tmp, "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    api = load_api(db)
+    publish_static._api = api
+
+    res = {"cpus": os.cpu_count()}
+    manifest = None
+    for workers in a.workers:
+        out_dir = os.path.join(tmp, f"static{workers}")
+        t0 = time.perf_counter()
+        manifest = publish_static.publish(db, out_dir, workers)
+        res[f"full render, {workers} process(es)"] = f"{time.perf_counter() - t0:.1f} s"
+
+    files = manifest["files"]
+    res["views (country x category x subcategory)"] = len(manifest["views"])
+    res["files (+ .gz each)"] = len(files)
+    res["bytes raw"] = f"{sum(x['bytes'] for x in files.values()) / 1e6:.1f} MB"
+    res["bytes gz"] = f"{sum(x['gz_bytes'] for x in files.values()) / 1e6:.1f} MB"
+
+    key = next(k for k in manifest["views"] if k.count("all") == 2)
+    base = os.path.join(out_dir, manifest["base"], manifest["views"][key])
+
+    def static_view():
+        for name in ("compare.json.gz", "weekly.json.gz"):
+            with gzip.open(os.path.join(base, name), "rb") as fh:
+                loads(fh.read())
+
+    res[f"static {key}: read + gunzip + parse"] = timeit(static_view)
+    country = key.split("|")[0]
+    res[f"live /dashboard {country}"] = timeit(lambda: api.dashboard(
+        country=country, category=None, subcategory=None, lookback_days=7, status=None, limit=500))
+    bad = check(api, out_dir, manifest)
+    print(f"[CHECK] static files equal to live routes: {bad == 0} ({bad} mismatches)")
+    report(f"static publish, {a.days} days x {a.countries} countries", res)
+    shutil.rmtree(tmp, ignore_errors=True)
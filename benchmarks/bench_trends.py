@@ -0,0 +1,106 @@
+# benchmarks/bench_trends.py
+# Трендовете за всички контексти във всички държави: пълен build от chart_ranks срещу инкременталното
+# обновяване след скрейп (отместване на сериите), проверка инкрементално == пълно, проверка срещу наивна
+# реализация серия по серия (np.polyfit) и латентност на /trends.
+import os, sqlite3, time, random, argparse, tempfile
+import numpy as np
+from common import load_api, payload, timeit, report
+from dimensions import refresh_chart_ranks
+from trends import refresh_trends, load_series, compute_trends, TREND_WINDOWS, SERIES_LEN
+import synth
+
+
+def naive(con, ctx_id: int, app_id: int, win: int) -> dict:
+    """Същите метрики за една серия с обикновен Python/np.polyfit по снапшотите на контекста."""
+    days = [r[0] for r in con.execute(
+        "SELECT DISTINCT day FROM chart_ranks WHERE ctx_id=? ORDER BY day DESC LIMIT ?", (ctx_id, SERIES_LEN))]
+    depth = con.execute(f"SELECT MAX(rank) FROM chart_ranks WHERE ctx_id=? AND day IN ({','.join(map(str, days))})",
+                        (ctx_id,)).fetchone()[0]
+    ranks = dict(con.execute("SELECT day, MIN(rank) FROM chart_ranks WHERE ctx_id=? AND app_id=? GROUP BY day",
+                             (ctx_id, app_id)).fetchall())
+    x = np.array([ranks.get(d, depth + 1) for d in days], dtype=float)
+    cur, base = x[:win], x[win:2 * win]
+    half = max(win // 2, 2)
+    slope = lambda v: np.polyfit(-np.arange(len(v)), v, 1)[0]
+    return {
+        "velocity": -slope(cur),
+        "acceleration": (-slope(cur[:half]) + slope(cur[win - half:])) / half,
+        "volatility": np.diff(cur).std(),
+        "breakout": (base.mean() - cur[0]) / (base.std() + 1) if len(base) == win else None,
+    }
+
+
+def dump(con) -> tuple:
+    return (con.execute("SELECT * FROM app_trends ORDER BY win, ctx_id, app_id").fetchall(),
+            con.execute("SELECT * FROM app_rank_series ORDER BY ctx_id, app_id").fetchall())
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db, inc_db = os.path.join(tmp, "bench.db"), os.path.join(tmp, "incremental.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    con = sqlite3.connect(db)
+    refresh_chart_ranks(con)
+    dates = [r[0] for r in con.execute("SELECT DISTINCT snapshot_date FROM charts ORDER BY 1 DESC LIMIT 3")][::-1]
+
+    res = {"contexts": con.execute("SELECT COUNT(*) FROM dim_context").fetchone()[0]}
+    res["refresh_trends full (build series from chart_ranks)"] = timeit(lambda: refresh_trends(con), repeat=2)
+
+    # същата база без последните 3 дни; после ден по ден, както след всеки скрейп
+    con.execute("VACUUM INTO ?", (inc_db,))
+    inc = sqlite3.connect(inc_db)
+    inc.execute("DELETE FROM charts WHERE snapshot_date >= ?", (dates[0],))
+    inc.commit()
+    refresh_chart_ranks(inc)
+    refresh_trends(inc)
+    inc.execute("ATTACH ? AS src", (db,))
+    per_day = []
+    for d in dates:
+        inc.execute("INSERT INTO charts SELECT * FROM src.charts WHERE snapshot_date=?", (d,))
+        inc.commit()
+        refresh_chart_ranks(inc, d)
+        t0 = time.perf_counter()
+        refresh_trends(inc, d)
+        per_day.append((time.perf_counter() - t0) * 1000)
+    res["refresh_trends after a scrape (one day)"] = f"{', '.join(f'{ms:.0f}' for ms in per_day)} ms"
+    t0 = time.perf_counter()
+    refresh_trends(inc, dates[-1])  # повторен ден
+    res["refresh_trends re-run of the same day"] = f"{(time.perf_counter() - t0) * 1000:.0f} ms"
+    print(f"[CHECK] incremental == full build: {dump(inc) == dump(con)}")
+    inc.close()
+
+    loaded = load_series(con)
+    t0 = time.perf_counter()
+    for win in TREND_WINDOWS:
+        compute_trends(*loaded[3:], win)
+    res["series scored (apps in latest snapshot)"] = len(loaded[0])
+    res[f"  of which: numpy compute, {len(TREND_WINDOWS)} windows"] = f"{(time.perf_counter() - t0) * 1000:.0f} ms"
+
+    # 200 случайни серии срещу наивната реализация
+    rnd = random.Random(5)
+    sample = rnd.sample(con.execute("SELECT win, ctx_id, app_id, velocity, acceleration, volatility, breakout "
+                                    "FROM app_trends").fetchall(), 200)
+    worst = 0.0
+    for win, ctx_id, app_id, *got in sample:
+        for g, w in zip(got, naive(con, ctx_id, app_id, win).values()):
+            if (g is None) != (w is None):
+                worst = float("inf")
+            elif g is not None:
+                worst = max(worst, abs(g - w))
+    print(f"[CHECK] max abs difference vs per-series reference: {worst:.5f}")
+    con.close()
+
+    api = load_api(db)
+    res["/trends US window=7 top 50"] = timeit(lambda: api.trends(country="US", window=7, limit=50))
+    res["/trends all countries window=30 top 100"] = timeit(
+        lambda: api.trends(country="all", window=30, sort="velocity", limit=100))
+    top = payload(api.trends(country="US", window=7, limit=3))["results"]
+    print("top breakouts US:", [(r["app_name"], r["category"], r["rank"], r["breakout"]) for r in top])
+    report(f"trend engine, {a.days} days x {a.countries} countries", res)
+    os.remove(db); os.remove(inc_db)
@@ -0,0 +1,96 @@
+# benchmarks/bench_workers.py
+# Няколко процеса с API-то (като uvicorn --workers), всеки със собствен импорт на main.py:
+# студен старт (bootstrap-ът под lock — строи само първият), после еднакъв поток заявки (Zipf по
+# популярност) през compress_responses във всеки worker. Пропускателна способност при 1, 2 и 4 worker-а
+# със и без общия кеш на диска, и колко отговора са рендерирани общо.
+import os, sys, time, random, argparse, tempfile, multiprocessing as mp
+from common import load_api, report
+import synth
+
+ROUTES = ("dashboard", "compare_alias", "weekly_insights", "history_view")
+
+
+def views(countries, categories) -> list:
+    out = []
+    for country in countries:
+        for cat in [None, *categories]:
+            f = {"country": country, "category": cat, "subcategory": None}
+            out += [
+                ("/dashboard", "dashboard", {**f, "lookback_days": 7, "status": None, "limit": 500}),
+                ("/compare", "compare_alias", {**f, "limit": 500, "format": None, "cursor": None}),
+                ("/weekly/insights", "weekly_insights", {**f, "lookback_days": 7, "status": None, "format": None,
+                                                         "limit": 500, "cursor": None}),
+                ("/history", "history_view", {**f, "lookback_days": 7, "date": None, "status": None,
+                                              "export": None, "limit": 500, "cursor": None}),
+            ]
+    return out
+
+
+def worker(idx, db, cache_path, shared, stream, barrier, results):
+    os.environ["RESPONSE_CACHE_PATH"] = cache_path
+    os.environ["RESPONSE_CACHE_SHARED"] = "1" if shared else "0"
+    sys.stdout = open(os.devnull, "w")
+    from bench_compression import request
+    t0 = time.perf_counter()
+    api = load_api(db)
+    boot = time.perf_counter() - t0
+    barrier.wait()
+    t1 = time.perf_counter()
+    for path, route, params in stream:
+        request(api, path, getattr(api, route), params, "br, gzip")
+    s = api.RESPONSES.summary()
+    results.put((idx, boot, time.perf_counter() - t1, s["misses"], s["shared_hits"], s["compressions"]))
+
+
+def run(db, cache_path, workers, shared, streams) -> dict:
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(workers + 1), ctx.Queue()
+    t0 = time.perf_counter()
+    procs = [ctx.Process(target=worker, args=(i, db, cache_path, shared, streams[i], barrier, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    ready = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    out = [results.get() for _ in procs]
+    wall = time.perf_counter() - t1
+    for p in procs:
+        p.join()
+    n = sum(len(s) for s in streams[:workers])
+    return {"ready s": round(ready, 1), "slowest bootstrap s": round(max(o[1] for o in out), 1),
+            "req/s": round(n / wall, 1), "rendered": sum(o[3] for o in out),
+            "from shared": sum(o[4] for o in out), "compressions": sum(o[5] for o in out)}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--countries", type=int, default=len(synth.COUNTRIES))
+    p.add_argument("--requests", type=int, default=400, help="total per scenario, split across the workers")
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db = os.path.join(tmp, "bench.db")
+    print(f"generating {a.days} days x {a.countries} countries -> {db}")
+    synth.build(db, days=a.days, countries=synth.COUNTRIES[:a.countries])
+    import sqlite3
+    con = sqlite3.connect(db)
+    categories = [r[0] for r in con.execute("SELECT DISTINCT category FROM charts ORDER BY 1 LIMIT 3")]
+    con.close()
+    keys = views(synth.COUNTRIES[:a.countries], categories)
+    rnd = random.Random(7)
+    # популярните изгледи (първите) се искат най-често
+    mix = [keys[min(int(rnd.paretovariate(0.6)) - 1, len(keys) - 1)] for _ in range(a.requests)]
+
+    res = {"cpus": os.cpu_count(), "distinct views": len(keys), "requests per scenario": a.requests}
+    # студен старт: производните таблици са празни, 4 worker-а стартират едновременно
+    res["cold start, 4 workers (one builds)"] = run(db, os.path.join(tmp, "cold.db"), 4, True,
+                                                    [[] for _ in range(4)])
+    for workers in (1, 2, 4):
+        streams = [mix[i::workers] for i in range(workers)]
+        for shared in (False, True):
+            cache = os.path.join(tmp, f"cache{workers}{int(shared)}.db")
+            res[f"{workers} worker(s), shared cache {'on' if shared else 'off'}"] = run(
+                db, cache, workers, shared, streams)
+    report(f"API workers, {a.days} days x {a.countries} countries", res)
@@ -0,0 +1,42 @@
+# benchmarks/common.py
+import os, sys, time, importlib, statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+
+
+def load_api(db_path: str):
+    """Импортира appstore-api/main.py срещу дадена база (bootstrap-ът минава върху нея)."""
+    os.environ["DB_PATH"] = os.path.abspath(db_path)
+    sys.path.insert(0, os.path.join(ROOT, "appstore-api"))
+    if "main" in sys.modules:
+        return importlib.reload(sys.modules["main"])
+    return importlib.import_module("main")
+
+
+def payload(resp):
+    """Тялото на отговор от маршрут (FastJSONResponse -> dict); обикновен dict минава както е."""
+    from json_codec import loads
+    return loads(resp.body) if hasattr(resp, "body") else resp
+
+
+def timeit(fn, repeat: int = 20) -> dict:
+    """Връща p50/p95/max в милисекунди."""
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def report(title: str, rows: dict):
+    print(f"\n== {title}")
+    for k, v in rows.items():
+        print(f"  {k:<40} {v}")
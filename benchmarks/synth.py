@@ -0,0 +1,127 @@
+# benchmarks/synth.py
+# Синтетична многогодишна база във формата на скрейперите (charts), за бенчмаркове.
+import os, sys, json, random, sqlite3, argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from chart_schema import ensure_charts_table
+
+COUNTRIES = ["US", "GB", "FR", "DE", "ES", "RU", "IT", "CA"]
+
+APP_CATEGORIES = [
+    "Books", "Business", "Developer Tools", "Education", "Entertainment", "Finance", "Food Drink",
+    "Graphics Design", "Health Fitness", "Kids", "Lifestyle", "Magazines Newspapers", "Medical",
+    "Music", "Navigation", "News", "Photo Video", "Productivity", "Reference", "Shopping",
+    "Social Networking", "Sports", "Travel", "Utilities", "Weather",
+]
+GAME_SUBCATEGORIES = [
+    "Action", "Adventure", "Casual", "Board", "Card", "Casino", "Family", "Music", "Puzzle",
+    "Racing", "Role Playing", "Simulation", "Sports", "Strategy", "Trivia", "Word",
+]
+
+CONTEXTS = [(c, None) for c in APP_CATEGORIES] + [("Games", s) for s in GAME_SUBCATEGORIES]
+
+_WORDS = [
+    "Clash", "Royal", "Pixel", "Candy", "Magic", "Quest", "Tiny", "Ocean", "Space", "Farm", "City", "Dream",
+    "Block", "Puzzle", "Word", "Hero", "Legend", "Rush", "Merge", "Idle", "Photo", "Music", "Cloud", "Smart",
+    "Budget", "Health", "Sleep", "Fit", "Chat", "Note", "Scan", "Maps", "Bank", "Wallet", "Learn", "Kids",
+    "Story", "Tales", "Shop", "Deal", "Food", "Recipe", "Travel", "Trip", "Weather", "Radar", "News", "Daily",
+]
+_DEVS = [
+    "Supercell", "King", "Playrix", "Zynga", "Rovio", "Voodoo", "Niantic", "Moon Active", "Scopely", "Miniclip",
+    "Google LLC", "Meta Platforms", "Microsoft Corporation", "Spotify AB", "Duolingo", "Adobe Inc.",
+]
+
+
+def app_name(app_id: str) -> str:
+    n = int(app_id)
+    return f"{_WORDS[n % len(_WORDS)]} {_WORDS[(n // 7) % len(_WORDS)]} {n % 1000}"
+
+
+def developer_name(app_id: str) -> str:
+    n = int(app_id) % 300
+    return f"{_DEVS[n % len(_DEVS)]} {n}" if n >= len(_DEVS) else _DEVS[n]
+
+
+def _row(snap, country, cat, subcat, rank, app_id, with_raw):
+    raw = None
+    if with_raw:
+        raw = json.dumps({
+            "trackId": int(app_id), "trackName": app_name(app_id), "bundleId": f"com.dev{int(app_id) % 300}.app{app_id}",
+            "artworkUrl100": f"https://is1-ssl.mzstatic.com/image/thumb/{app_id}/100x100bb.png",
+            "description": "Lorem ipsum dolor sit amet. " * 20, "genres": [subcat or cat],
+        }, ensure_ascii=False)
+    return (
+        snap, country, cat, subcat, "top_free", rank, app_id, f"com.dev{int(app_id) % 300}.app{app_id}",
+        app_name(app_id), developer_name(app_id), 0.0, "USD", round(3 + (int(app_id) % 20) / 10, 1),
+        int(app_id) % 100000, None,
+        f"https://apps.apple.com/app/id{app_id}", f"https://dev{int(app_id) % 300}.example.com",
+        f"https://is1-ssl.mzstatic.com/image/thumb/{app_id}/100x100bb.png", raw,
+    )
+
+
+def build(db_path: str, days: int = 365, countries=None, end: date | None = None,
+          seed: int = 1, with_raw: bool = False) -> int:
+    """Пише `days` дневни снапшота (top 50 за всяка държава × контекст) и връща броя редове."""
+    countries = countries or COUNTRIES
+    end = end or date.today()
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    ensure_charts_table(conn)
+
+    next_id = [1_000_000_000]
+
+    def new_app():
+        next_id[0] += 1
+        return str(next_id[0])
+
+    # общ пул от приложения за жанр (за да се припокриват държавите) + топ 50 за всяка държава
+    pools = {ctx: [new_app() for _ in range(90)] for ctx in CONTEXTS}
+    tops = {(c, ctx): rnd.sample(pools[ctx], 50) for c in countries for ctx in CONTEXTS}
+
+    total = 0
+    for d in range(days):
+        snap = (end - timedelta(days=days - 1 - d)).isoformat()
+        rows = []
+        for (country, ctx), top in tops.items():
+            # churn: няколко излизат, влизат нови или стари (re-entry)
+            for _ in range(rnd.randint(0, 3)):
+                pos = rnd.randint(10, 49)
+                if rnd.random() < 0.4:
+                    cand = new_app()
+                    pools[ctx].append(cand)
+                else:
+                    cand = rnd.choice(pools[ctx])
+                if cand not in top:
+                    top[pos] = cand
+            # разместване на съседи
+            for _ in range(rnd.randint(2, 8)):
+                i = rnd.randint(0, 48)
+                top[i], top[i + 1] = top[i + 1], top[i]
+            for rank, app_id in enumerate(top, 1):
+                rows.append(_row(snap, country, ctx[0], ctx[1], rank, app_id, with_raw))
+        conn.executemany("""
+            INSERT OR REPLACE INTO charts (
+                snapshot_date,country,category,subcategory,chart_type,rank,
+                app_id,bundle_id,app_name,developer_name,price,currency,
+                rating,ratings_count,genre_id,
+                app_store_url,app_url,icon_url,raw
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """, rows)
+        total += len(rows)
+    conn.commit()
+    conn.close()
+    return total
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Generate a synthetic app_data.db")
+    p.add_argument("db")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--countries", type=int, default=len(COUNTRIES))
+    p.add_argument("--raw", action="store_true", help="include raw JSON payloads")
+    a = p.parse_args()
+    n = build(a.db, days=a.days, countries=COUNTRIES[:a.countries], with_raw=a.raw)
+    print(f"[OK] {n} rows -> {a.db}")
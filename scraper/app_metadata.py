@@ -0,0 +1,155 @@
+# scraper/app_metadata.py
+# SCD история на lookup метаданните на приложение (цена, рейтинг, bundle id, URL-и) по държава:
+# нов ред само когато някое поле реално се промени, с валидност [valid_from, valid_to).
+# Старите charts редове могат да се „изтънят“ до ранговете (compact_chart_metadata), а изгледът
+# charts_wide връща пълната форма. Стойността за ден е MAX по редовете на app-а в държавата
+# (едно приложение се среща в няколко категории с един и същ lookup).
+import sqlite3
+from typing import Optional
+
+META_COLS = ("bundle_id", "price", "currency", "rating", "ratings_count", "app_store_url", "app_url", "icon_url")
+
+METADATA_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS app_metadata_history (
+        app_id TEXT, country TEXT,
+        bundle_id TEXT, price REAL, currency TEXT, rating REAL, ratings_count INTEGER,
+        app_store_url TEXT, app_url TEXT, icon_url TEXT,
+        valid_from TEXT, valid_to TEXT,          -- valid_to = NULL -> текущата версия
+        PRIMARY KEY (app_id, country, valid_from)
+    )
+    """,
+    # „какво се е променило от дата X“ за /metadata/changes
+    "CREATE INDEX IF NOT EXISTS ix_app_metadata_changes ON app_metadata_history (country, valid_from)",
+    # докъде charts е изтънен; историята не се преизчислява преди тази дата
+    """
+    CREATE TABLE IF NOT EXISTS app_metadata_compaction (
+        compacted_before TEXT, rows INTEGER, compacted_at TEXT
+    )
+    """,
+]
+
+_HAS_META = " OR ".join(f"{c} IS NOT NULL" for c in META_COLS)
+_COLS = ", ".join(META_COLS)
+
+# пълната форма на charts: изтънените редове взимат метаданните от версията, валидна за деня
+CHARTS_WIDE_VIEW = f"""
+    CREATE VIEW IF NOT EXISTS charts_wide AS
+    SELECT c.snapshot_date, c.country, c.category, c.subcategory, c.chart_type, c.rank, c.app_id,
+           COALESCE(c.bundle_id, h.bundle_id) AS bundle_id, c.app_name, c.developer_name,
+           COALESCE(c.price, h.price) AS price, COALESCE(c.currency, h.currency) AS currency,
+           COALESCE(c.rating, h.rating) AS rating, COALESCE(c.ratings_count, h.ratings_count) AS ratings_count,
+           c.genre_id,
+           COALESCE(c.app_store_url, h.app_store_url) AS app_store_url,
+           COALESCE(c.app_url, h.app_url) AS app_url,
+           COALESCE(c.icon_url, h.icon_url) AS icon_url,
+           c.raw
+    FROM charts c
+    LEFT JOIN app_metadata_history h
+      ON h.app_id = c.app_id AND h.country = c.country
+     AND h.valid_from <= c.snapshot_date AND (h.valid_to IS NULL OR h.valid_to > c.snapshot_date)
+"""
+
+
+def ensure_app_metadata(conn: sqlite3.Connection):
+    outer = conn.in_transaction  # чужда транзакция (напр. retention.py) не се комитва оттук
+    for ddl in METADATA_DDL:
+        conn.execute(ddl)
+    try:
+        conn.execute(CHARTS_WIDE_VIEW)
+    except sqlite3.OperationalError as e:
+        # стара/тясна charts таблица без lookup колоните — изгледът се създава при следващия скрейп
+        print(f"⚠️ Skipping charts_wide view: {e}")
+    if not outer:
+        conn.commit()
+
+
+def compacted_before(conn: sqlite3.Connection) -> Optional[str]:
+    return conn.execute("SELECT MAX(compacted_before) FROM app_metadata_compaction").fetchone()[0]
+
+
+def refresh_app_metadata(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Преиграва наблюденията от snapshot_date нататък (None -> от първата неизтъняна дата):
+    версиите след нея се трият, затворените към нея се отварят и промените се записват наново.
+    Редове без нито едно lookup поле (неуспешен lookup) не са наблюдение. Връща броя нови версии.
+    """
+    ensure_app_metadata(conn)
+    lo = snapshot_date or conn.execute(
+        f"SELECT MIN(snapshot_date) FROM charts WHERE app_id IS NOT NULL AND ({_HAS_META})"
+    ).fetchone()[0]
+    if not lo:
+        return 0
+    floor = compacted_before(conn)
+    if floor and lo < floor:
+        lo = floor
+
+    conn.execute("DELETE FROM app_metadata_history WHERE valid_from >= ?", (lo,))
+    conn.execute("UPDATE app_metadata_history SET valid_to = NULL WHERE valid_to >= ?", (lo,))
+
+    lags = ", ".join(f"LAG({c}) OVER w AS p_{c}" for c in META_COLS)
+    changed = " OR ".join(f"{c} IS NOT p_{c}" for c in META_COLS)
+    cur = conn.execute(f"""
+        INSERT INTO app_metadata_history (app_id, country, {_COLS}, valid_from)
+        WITH day AS (
+            SELECT app_id, country, snapshot_date AS d, {', '.join(f'MAX({c}) AS {c}' for c in META_COLS)}
+            FROM charts
+            WHERE snapshot_date >= ? AND app_id IS NOT NULL AND ({_HAS_META})
+            GROUP BY app_id, country, snapshot_date
+        ),
+        seq AS (
+            SELECT app_id, country, valid_from AS d, {_COLS}, 1 AS seed
+            FROM app_metadata_history WHERE valid_to IS NULL
+            UNION ALL
+            SELECT app_id, country, d, {_COLS}, 0 FROM day
+        ),
+        lagged AS (
+            SELECT *, {lags}, ROW_NUMBER() OVER w AS rn
+            FROM seq
+            WINDOW w AS (PARTITION BY app_id, country ORDER BY d)
+        )
+        SELECT app_id, country, {_COLS}, d FROM lagged
+        WHERE seed = 0 AND (rn = 1 OR {changed})
+    """, (lo,))
+    added = cur.rowcount
+
+    # затваряме всяка отворена версия, след която вече има по-нова
+    conn.execute("""
+        UPDATE app_metadata_history AS h SET valid_to = (
+            SELECT MIN(n.valid_from) FROM app_metadata_history n
+            WHERE n.app_id = h.app_id AND n.country = h.country AND n.valid_from > h.valid_from
+        )
+        WHERE valid_to IS NULL AND EXISTS (
+            SELECT 1 FROM app_metadata_history n
+            WHERE n.app_id = h.app_id AND n.country = h.country AND n.valid_from > h.valid_from
+        )
+    """)
+    conn.commit()
+    return added
+
+
+def compact_chart_metadata(conn: sqlite3.Connection, before: str) -> int:
+    """
+    Изтънява charts редовете отпреди `before` до ранговете: lookup полетата стават NULL там,
+    където съвпадат точно с валидната версия в историята (charts_wide ги връща същите).
+    Без commit — вика се в транзакцията на retention.py.
+    """
+    ensure_app_metadata(conn)
+    start = compacted_before(conn) or ""
+    same = " AND ".join(f"h.{c} IS charts.{c}" for c in META_COLS)
+    cur = conn.execute(f"""
+        UPDATE charts SET {', '.join(f'{c} = NULL' for c in META_COLS)}
+        WHERE snapshot_date >= ? AND snapshot_date < ? AND ({_HAS_META})
+          AND EXISTS (
+            SELECT 1 FROM app_metadata_history h
+            WHERE h.app_id = charts.app_id AND h.country = charts.country
+              AND h.valid_from <= charts.snapshot_date
+              AND (h.valid_to IS NULL OR h.valid_to > charts.snapshot_date)
+              AND {same}
+          )
+    """, (start, before))
+    if before > start:
+        conn.execute(
+            "INSERT INTO app_metadata_compaction VALUES (?, ?, datetime('now'))", (before, cur.rowcount)
+        )
+    return cur.rowcount
@@ -0,0 +1,110 @@
+# scraper/chart_html.py
+# Бърз парсър за HTML класациите на apps.apple.com (fallback, когато iTunes RSS е празен).
+# lxml pull parser: подаваме страницата на парчета и спираме след първите `limit` елемента,
+# без да строим дърво за останалата част от страницата. Резултатът е като при BeautifulSoup версията.
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
+
+try:
+    from lxml import etree
+except ImportError:  # без lxml -> старият BeautifulSoup път
+    etree = None
+
+LOCKUP_CLASS = "we-lockup__content"
+SUBTITLE_CLASS = "we-lockup__subtitle"
+FEED_CHUNK = 64 * 1024
+
+# CHART_HTML_DUMP_DIR=... -> всяка изтеглена страница се записва там (fixture корпус за бенчмарка)
+DUMP_DIR = os.getenv("CHART_HTML_DUMP_DIR")
+
+
+def _has_class(el, cls: str) -> bool:
+    return cls in (el.get("class") or "").split()
+
+
+def _text(el) -> str:
+    # като bs4 get_text(strip=True): всеки текстов възел се strip-ва, празните се пропускат
+    return "".join(t.strip() for t in el.itertext() if t.strip())
+
+
+def _app_id(href: str) -> str:
+    return href.split("/id")[-1].split("?")[0] if "/id" in href else ""
+
+
+def _item(rank: int, lockup) -> Optional[Dict[str, Any]]:
+    a = next((x for x in lockup.iter("a") if x.get("href") is not None), None)
+    if a is None:
+        return None
+    sub = next((d for d in lockup.iter("div") if _has_class(d, SUBTITLE_CLASS)), None)
+    app_id = _app_id(a.get("href"))
+    if not app_id:
+        return None
+    return {"rank": rank, "id": app_id, "name": _text(a), "artistName": _text(sub) if sub is not None else ""}
+
+
+def _lockup_events(parser) -> Iterator:
+    for _, el in parser.read_events():
+        if _has_class(el, LOCKUP_CLASS) and next(el.iterancestors("li"), None) is not None:
+            yield el
+
+
+def parse_chart_html(html: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """`li div.we-lockup__content` -> [{rank, id, name, artistName}], само първите `limit` позиции."""
+    if etree is None:
+        return parse_chart_html_bs4(html, limit)
+    parser = etree.HTMLPullParser(events=("end",), tag="div")
+
+    def lockups():
+        for pos in range(0, len(html), FEED_CHUNK):
+            parser.feed(html[pos:pos + FEED_CHUNK])
+            yield from _lockup_events(parser)
+        parser.close()
+        yield from _lockup_events(parser)
+
+    items = []
+    for rank, el in enumerate(lockups(), 1):
+        it = _item(rank, el)
+        if it:
+            items.append(it)
+        if rank >= limit:
+            break
+    return items
+
+
+def parse_chart_html_bs4(html: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """Референтната (стара) реализация с BeautifulSoup — за fallback и за сравнение в бенчмарка."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    items = []
+    for i, li in enumerate(soup.select("li div.we-lockup__content")[:limit], 1):
+        a = li.find("a", href=True)
+        name = a.get_text(strip=True)
+        artist = li.find("div", class_="we-lockup__subtitle").get_text(strip=True)
+        href = a["href"]
+        app_id = _app_id(href)
+        if app_id:
+            items.append({"rank": i, "id": app_id, "name": name, "artistName": artist})
+    return items
+
+
+def dump_html(html: str, name: str):
+    if not DUMP_DIR:
+        return
+    os.makedirs(DUMP_DIR, exist_ok=True)
+    with open(os.path.join(DUMP_DIR, f"{name}.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def prefetch(fn: Callable, jobs: Iterable[tuple], ahead: int = 1) -> Iterator[tuple]:
+    """
+    Изпълнява fn(*job) в отделна нишка `ahead` задачи напред и връща (job, резултат) по реда на jobs.
+    Така изтеглянето + парсването на следващата класация върви, докато текущата се обогатява/записва.
+    """
+    jobs = list(jobs)
+    with ThreadPoolExecutor(max_workers=ahead) as pool:
+        pending = [pool.submit(fn, *job) for job in jobs[:ahead]]
+        for i, job in enumerate(jobs):
+            if i + ahead < len(jobs):
+                pending.append(pool.submit(fn, *jobs[i + ahead]))
+            yield job, pending.pop(0).result()
@@ -0,0 +1,52 @@
+# scraper/chart_schema.py
+# Каноничната схема на таблицата charts — една за скрейперите, API-то, init_db скриптовете и merge_db.
+# Стари бази се докарват до нея от migrations.py (версиите са в schema_version).
+import sqlite3
+
+# колоните в реда на каноничната таблица (URL-ите са след raw — така са в базите, където са добавени с ALTER)
+CHARTS_COLUMNS = {
+    "snapshot_date": "TEXT", "country": "TEXT", "category": "TEXT", "subcategory": "TEXT",
+    "chart_type": "TEXT", "rank": "INTEGER", "app_id": "TEXT", "bundle_id": "TEXT",
+    "app_name": "TEXT", "developer_name": "TEXT", "price": "REAL", "currency": "TEXT",
+    "rating": "REAL", "ratings_count": "INTEGER", "genre_id": "TEXT", "raw": "TEXT",
+    "app_store_url": "TEXT", "app_url": "TEXT", "icon_url": "TEXT",
+}
+CHARTS_KEY = ("snapshot_date", "country", "category", "subcategory", "chart_type", "rank")
+
+# колони от старите варианти: id (AUTOINCREMENT от init_db.py / API-то), developer (API-то) -> developer_name,
+# fetched_at (appstore-api/init_db.py)
+CHARTS_RENAMES = {"developer": "developer_name"}
+CHARTS_DROPPED = ("id", "fetched_at")
+
+CHARTS_DDL_TEMPLATE = (
+    "CREATE TABLE IF NOT EXISTS {table} (\n        "
+    + ",\n        ".join(f"{c} {t}" for c, t in CHARTS_COLUMNS.items())
+    + f",\n        PRIMARY KEY ({','.join(CHARTS_KEY)})\n    )"
+)
+CHARTS_DDL = CHARTS_DDL_TEMPLATE.format(table="charts")
+
+# PK-то покрива заявките по дата (+ държава/контекст); по app_id се чете през chart_ranks. Тези индекси от
+# старите схеми само забавят записа и се махат при миграцията.
+LEGACY_CHARTS_INDEXES = ("ux_charts_context_rank", "ux_charts_context_app", "idx_charts_date",
+                         "idx_charts_app_date", "idx_charts_ctx_date", "idx_charts_app_history")
+
+CHARTS_VIEWS = [
+    # текущ топ 50 (последната налична дата)
+    """
+    CREATE VIEW IF NOT EXISTS v_current_top50 AS
+    SELECT * FROM charts
+    WHERE snapshot_date = (SELECT MAX(snapshot_date) FROM charts) AND rank <= 50
+    """,
+    # всички редове от последните 7 дни спрямо последната налична дата
+    """
+    CREATE VIEW IF NOT EXISTS v_last7 AS
+    SELECT * FROM charts
+    WHERE snapshot_date >= date((SELECT MAX(snapshot_date) FROM charts), '-6 day')
+    """,
+]
+
+
+def ensure_charts_table(conn: sqlite3.Connection):
+    """Докарва базата до последната версия на схемата (вкл. charts); евтино, ако вече е там."""
+    from migrations import migrate  # migrations.py импортира тази схема
+    migrate(conn)
@@ -0,0 +1,115 @@
+# scraper/developers.py
+# Агрегати по разработчик: за всеки ден и контекст (dim_context) — колко места държи, най-добър ранг,
+# сума на ранговете и списък [app_id, rank]. Разработчикът е нормализиран ключ (developer_key):
+# „Google LLC“, „Google, LLC“ и „google llc“ са един и същ dev_id в dim_developer.
+# developer_days има PK по разработчик и ден (история за /developers/{name} — диапазон по PK) и индекс
+# по ден (класация за /developers) — заявките четат прозореца, не цялата история.
+# Пълното преизчисляване минава по дните, които още са в charts; по-старите (архивирани от
+# retention.py) агрегати остават.
+import re, sqlite3, unicodedata
+from functools import lru_cache
+from typing import Optional, Dict
+from json_codec import dumps
+from dimensions import ensure_dimensions, sync_contexts, day_number
+
+DEVELOPERS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS dim_developer (
+        dev_id INTEGER PRIMARY KEY,
+        dev_key TEXT UNIQUE,
+        name TEXT                        -- името от последния обновен ден
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS developer_days (
+        dev_id INTEGER, day INTEGER, ctx_id INTEGER,
+        slots INTEGER, best_rank INTEGER, rank_sum INTEGER,
+        apps TEXT,                       -- JSON [[app_id, rank], ...] по ранг
+        PRIMARY KEY (dev_id, day, ctx_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_developer_days_day ON developer_days (day, ctx_id)",
+]
+
+# правни форми в края на името, които не различават разработчици. Само еднозначните: „co“ / „company“
+# и „as“ са и част от имена („Foo Co“ и „Foo“ са различни издатели)
+_SUFFIXES = {
+    "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "gmbh", "ag",
+    "ab", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "oy", "plc", "pty", "pte", "kg", "llp", "lp",
+}
+
+
+@lru_cache(maxsize=65536)
+def developer_key(name: Optional[str]) -> Optional[str]:
+    """Нормализиран ключ: NFKC, casefold, без пунктуация и без правната форма накрая."""
+    if not name:
+        return None
+    words = re.sub(r"[\W_]+", " ", unicodedata.normalize("NFKC", name).casefold()).split()
+    while len(words) > 1 and words[-1] in _SUFFIXES:
+        words.pop()
+    return " ".join(words) or None
+
+
+def ensure_developers(conn: sqlite3.Connection):
+    for ddl in DEVELOPERS_DDL:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def _refresh_day(conn: sqlite3.Connection, snapshot_date: str, dev_ids: Dict[str, int]) -> int:
+    day = day_number(snapshot_date)
+    conn.execute("DELETE FROM developer_days WHERE day=?", (day,))
+    cur = conn.execute("""
+        SELECT x.ctx_id, c.developer_name, c.app_id, c.rank
+        FROM charts c
+        JOIN dim_context x
+          ON x.country IS c.country AND x.chart_type IS c.chart_type AND x.category IS c.category
+         AND IFNULL(x.subcategory, '') = IFNULL(c.subcategory, '')
+        WHERE c.snapshot_date=? AND c.developer_name IS NOT NULL AND c.app_id IS NOT NULL
+        ORDER BY x.ctx_id, c.rank
+    """, (snapshot_date,))
+    groups: Dict[tuple, list] = {}
+    names: Dict[str, str] = {}
+    for ctx_id, name, app_id, rank in cur.fetchall():
+        key = developer_key(name)
+        if key is None:
+            continue
+        names[key] = name
+        groups.setdefault((key, ctx_id), []).append((app_id, rank))
+
+    new = [(k, n) for k, n in names.items() if k not in dev_ids]
+    conn.executemany("INSERT INTO dim_developer (dev_key, name) VALUES (?, ?)", new)
+    conn.executemany("UPDATE dim_developer SET name=? WHERE dev_key=?", [(n, k) for k, n in names.items()])
+    if new:
+        dev_ids.update(conn.execute("SELECT dev_key, dev_id FROM dim_developer").fetchall())
+
+    rows = []
+    for (key, ctx_id), apps in groups.items():
+        ranks = [r for _, r in apps if r is not None]
+        rows.append((dev_ids[key], day, ctx_id, len(apps), min(ranks, default=None), sum(ranks),
+                     dumps([[a, r] for a, r in apps])))
+    conn.executemany("INSERT INTO developer_days VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def refresh_developers(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """Преизчислява агрегатите за деня (или за всички дни в charts при None). Връща броя редове."""
+    ensure_dimensions(conn)
+    ensure_developers(conn)
+    sync_contexts(conn, snapshot_date)
+    dev_ids = dict(conn.execute("SELECT dev_key, dev_id FROM dim_developer").fetchall())
+    if snapshot_date:
+        dates = [snapshot_date]
+    else:
+        dates = [r[0] for r in conn.execute("SELECT DISTINCT snapshot_date FROM charts ORDER BY snapshot_date")]
+    n = sum(_refresh_day(conn, d, dev_ids) for d in dates if d)
+    conn.commit()
+    return n
+
+
+def find_developer(conn: sqlite3.Connection, name: str) -> Optional[tuple]:
+    """(dev_id, dev_key, name) по име или ключ в свободна форма."""
+    key = developer_key(name)
+    if key is None:
+        return None
+    return conn.execute("SELECT dev_id, dev_key, name FROM dim_developer WHERE dev_key=?", (key,)).fetchone()
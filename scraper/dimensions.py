@@ -0,0 +1,231 @@
+# scraper/dimensions.py
+# Компактни ключове за класациите: контекстът (country, chart_type, category, subcategory) е
+# малко цяло ctx_id в dim_context, датата е номер на ден (дни от 1970-01-01), app_id е INTEGER.
+# chart_ranks държи само ранговете с тези ключове (WITHOUT ROWID, app-major PK + индекс по ден) и
+# замества широкия текстов idx_charts_app_history. charts остава източникът с пълните редове;
+# изгледът chart_ranks_named връща старите имена на колоните.
+# dim_catalog е каталогът за /meta: по контекст първи/последен ден и брой редове, поддържан
+# инкрементално през дневните бройки в dim_context_days (малки — контексти x дни).
+# archived_spans пази първия/последния ден на приложение в контекст за месеците, които retention.py е
+# изнесъл от charts/chart_ranks — „виждано ли е преди“ (RE-ENTRY срещу NEW) не зависи от архивирането.
+import sqlite3
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Any
+
+EPOCH = date(1970, 1, 1)
+
+# snapshot_date (TEXT) -> номер на ден; julianday на полунощ е X.5
+DAY_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+DIMENSIONS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS dim_context (
+        ctx_id INTEGER PRIMARY KEY,
+        country TEXT, chart_type TEXT, category TEXT, subcategory TEXT
+    )
+    """,
+    # subcategory е NULL за категориите на приложенията — UNIQUE не би го засякло
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_dim_context ON dim_context "
+    "(country, chart_type, category, IFNULL(subcategory, ''))",
+    """
+    CREATE TABLE IF NOT EXISTS chart_ranks (
+        app_id INTEGER, day INTEGER, ctx_id INTEGER, rank INTEGER,
+        PRIMARY KEY (app_id, day, ctx_id, rank)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_chart_ranks_day ON chart_ranks (day, ctx_id)",
+    """
+    CREATE TABLE IF NOT EXISTS dim_context_days (
+        ctx_id INTEGER, day INTEGER, rows INTEGER,
+        PRIMARY KEY (ctx_id, day)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_catalog (
+        ctx_id INTEGER PRIMARY KEY, first_day INTEGER, last_day INTEGER, rows INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archived_spans (
+        app_id INTEGER, ctx_id INTEGER, first_day INTEGER, last_day INTEGER,
+        PRIMARY KEY (app_id, ctx_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS chart_ranks_named AS
+    SELECT date(r.day * 86400, 'unixepoch') AS snapshot_date, x.country, x.chart_type, x.category,
+           x.subcategory, r.rank, CAST(r.app_id AS TEXT) AS app_id
+    FROM chart_ranks r JOIN dim_context x ON x.ctx_id = r.ctx_id
+    """,
+]
+
+
+def day_number(d: str) -> int:
+    return date.fromisoformat(d).toordinal() - EPOCH.toordinal()
+
+
+def day_date(n: int) -> str:
+    return (EPOCH + timedelta(days=n)).isoformat()
+
+
+def ensure_dimensions(conn: sqlite3.Connection):
+    for ddl in DIMENSIONS_DDL:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def sync_contexts(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """Добавя новите контексти от charts (от деня или от всички дни)."""
+    date_filter, params = ("WHERE snapshot_date=?", (snapshot_date,)) if snapshot_date else ("", ())
+    cur = conn.execute(f"""
+        INSERT OR IGNORE INTO dim_context (country, chart_type, category, subcategory)
+        SELECT DISTINCT country, chart_type, category, subcategory FROM charts {date_filter}
+    """, params)
+    return cur.rowcount
+
+
+def refresh_chart_ranks(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Презаписва ранговете на деня в chart_ranks (или всичко при None). Връща броя записани редове.
+    Нечислови app_id (няма такива от скрейперите) не влизат — търсят се в charts.
+    """
+    ensure_dimensions(conn)
+    sync_contexts(conn, snapshot_date)
+    if snapshot_date:
+        conn.execute("DELETE FROM chart_ranks WHERE day=?", (day_number(snapshot_date),))
+        date_filter, params = "AND c.snapshot_date=?", (snapshot_date,)
+    else:
+        conn.execute("DELETE FROM chart_ranks")
+        date_filter, params = "", ()
+    cur = conn.execute(f"""
+        INSERT OR IGNORE INTO chart_ranks (app_id, day, ctx_id, rank)
+        SELECT CAST(c.app_id AS INTEGER), {DAY_SQL.format('c.snapshot_date')}, x.ctx_id, c.rank
+        FROM charts c
+        JOIN dim_context x
+          ON x.country IS c.country AND x.chart_type IS c.chart_type AND x.category IS c.category
+         AND IFNULL(x.subcategory, '') = IFNULL(c.subcategory, '')
+        WHERE c.app_id GLOB '[0-9]*' {date_filter}
+    """, params)
+    n = cur.rowcount
+    refresh_catalog(conn, snapshot_date)
+    # app-major достъпът вече е през chart_ranks; широкият текстов индекс само тежи
+    conn.execute("DROP INDEX IF EXISTS idx_charts_app_history")
+    conn.commit()
+    return n
+
+
+def archive_ranks(conn: sqlite3.Connection, lo: str, hi: str) -> int:
+    """
+    Маха дните lo..hi от chart_ranks, като първо слива обхвата им по (app_id, ctx_id) в archived_spans.
+    Без commit — вика се в транзакцията на retention.py. Връща броя изтрити редове.
+    """
+    conn.execute("""
+        INSERT INTO archived_spans (app_id, ctx_id, first_day, last_day)
+        SELECT app_id, ctx_id, MIN(day), MAX(day) FROM chart_ranks WHERE day BETWEEN ? AND ? GROUP BY app_id, ctx_id
+        ON CONFLICT (app_id, ctx_id) DO UPDATE SET
+            first_day = MIN(first_day, excluded.first_day), last_day = MAX(last_day, excluded.last_day)
+    """, (day_number(lo), day_number(hi)))
+    return conn.execute("DELETE FROM chart_ranks WHERE day BETWEEN ? AND ?", (day_number(lo), day_number(hi))).rowcount
+
+
+def seen_before_sql(app: str, ctx: str) -> str:
+    """
+    SQL условие: приложението (израз app, с квалифицирани колони — вътре в EXISTS голото app_id е на
+    chart_ranks) е имало ранг в контекстите (подзаявка ctx) преди деня (?) — в chart_ranks или в
+    архивираните месеци. Параметрите се подават два пъти: [day, *ctx_params] * 2.
+    """
+    return f"""(
+        EXISTS (SELECT 1 FROM chart_ranks b WHERE b.app_id = {app} AND b.day < ? AND b.ctx_id IN ({ctx}))
+        OR EXISTS (SELECT 1 FROM archived_spans s WHERE s.app_id = {app} AND s.first_day < ? AND s.ctx_id IN ({ctx}))
+    )"""
+
+
+def refresh_catalog(conn: sqlite3.Connection, snapshot_date: Optional[str] = None):
+    """
+    Преброява деня (или всички дни при None) от chart_ranks в dim_context_days и преизчислява
+    редовете на засегнатите контексти в dim_catalog. Без commit — вика се и в транзакцията на retention.py.
+    """
+    if snapshot_date:
+        day = day_number(snapshot_date)
+        touched = [r[0] for r in conn.execute("SELECT ctx_id FROM dim_context_days WHERE day=?", (day,))]
+        conn.execute("DELETE FROM dim_context_days WHERE day=?", (day,))
+        conn.execute("""
+            INSERT INTO dim_context_days (ctx_id, day, rows)
+            SELECT ctx_id, day, COUNT(*) FROM chart_ranks WHERE day=? GROUP BY ctx_id
+        """, (day,))
+        touched += [r[0] for r in conn.execute("SELECT ctx_id FROM dim_context_days WHERE day=?", (day,))]
+        ctx_filter = f"WHERE ctx_id IN ({','.join(str(int(c)) for c in set(touched))})" if touched else "WHERE 0"
+    else:
+        conn.execute("DELETE FROM dim_context_days")
+        conn.execute("""
+            INSERT INTO dim_context_days (ctx_id, day, rows)
+            SELECT ctx_id, day, COUNT(*) FROM chart_ranks GROUP BY day, ctx_id
+        """)
+        ctx_filter = ""
+    conn.execute(f"DELETE FROM dim_catalog {ctx_filter}")
+    conn.execute(f"""
+        INSERT INTO dim_catalog (ctx_id, first_day, last_day, rows)
+        SELECT ctx_id, MIN(day), MAX(day), SUM(rows) FROM dim_context_days {ctx_filter} GROUP BY ctx_id
+    """)
+
+
+def catalog(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Целият каталог (по ред на контекст) — размерът му не зависи от дължината на историята."""
+    cur = conn.execute("""
+        SELECT x.country, x.chart_type, x.category, x.subcategory, k.first_day, k.last_day, k.rows
+        FROM dim_catalog k JOIN dim_context x ON x.ctx_id = k.ctx_id
+    """)
+    return [
+        {"country": c, "chart_type": t, "category": cat, "subcategory": sub,
+         "first_date": day_date(lo), "last_date": day_date(hi), "rows": n}
+        for c, t, cat, sub, lo, hi, n in cur.fetchall()
+    ]
+
+
+def context_ids(conn: sqlite3.Connection, filters: Dict[str, Optional[str]], chart_type: str = "top_free") -> List[int]:
+    """ctx_id-тата за филтрите на API-то (None / "all" = без филтър по колоната)."""
+    parts, params = ["chart_type=?"], [chart_type]
+    for col in ("country", "category", "subcategory"):
+        val = filters.get(col)
+        if val and val != "all":
+            parts.append(f"{col}=?")
+            params.append(val)
+    cur = conn.execute(f"SELECT ctx_id FROM dim_context WHERE {' AND '.join(parts)}", params)
+    return [r[0] for r in cur.fetchall()]
+
+
+def recent_days(conn: sqlite3.Connection, ctx_ids: List[int], n: int, before: Optional[str] = None) -> List[str]:
+    """Последните n дати (низходящо) с редове в някой от контекстите — обратно по ix_chart_ranks_day."""
+    if not ctx_ids:
+        return []
+    marks = ",".join(["?"] * len(ctx_ids))
+    bound, params = ("AND day < ?", [day_number(before)]) if before else ("", [])
+    out, hi = [], None
+    # по една дата на стъпка: всяко търсене е кратък обратен scan от горната граница
+    while len(out) < n:
+        cond, args = (bound, params) if hi is None else ("AND day < ?", [hi])
+        row = conn.execute(
+            f"SELECT day FROM chart_ranks WHERE ctx_id IN ({marks}) {cond} ORDER BY day DESC LIMIT 1",
+            (*ctx_ids, *args),
+        ).fetchone()
+        if not row:
+            break
+        hi = row[0]
+        out.append(day_date(hi))
+    return out
+
+
+def app_ranks(conn: sqlite3.Connection, app_id: str, since: str, until: str,
+              chart_type: str = "top_free") -> List[Dict[str, Any]]:
+    """Всички рангове на приложение за периода (PK range scan) със старите имена на колоните."""
+    if not app_id.isdigit():
+        return []
+    cur = conn.execute("""
+        SELECT r.day, x.country, x.category, x.subcategory, r.rank
+        FROM chart_ranks r JOIN dim_context x ON x.ctx_id = r.ctx_id
+        WHERE r.app_id=? AND r.day BETWEEN ? AND ? AND x.chart_type=?
+    """, (int(app_id), day_number(since), day_number(until), chart_type))
+    return [
+        {"snapshot_date": day_date(d), "country": c, "category": cat, "subcategory": sub, "rank": rank}
+        for d, c, cat, sub, rank in cur.fetchall()
+    ]
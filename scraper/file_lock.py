@@ -0,0 +1,26 @@
+# scraper/file_lock.py
+# Междупроцесно заключване с файл (flock): bootstrap-ът на API-то при няколко worker-а и други стъпки,
+# които не бива да вървят паралелно върху една база. Без fcntl (Windows) заключването е no-op.
+import os, time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str):
+    """Държи изключителен lock върху path (създава файла при нужда); чака, ако е зает."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is None:
+            yield 0.0
+            return
+        t0 = time.perf_counter()
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield time.perf_counter() - t0  # колко е чакал
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
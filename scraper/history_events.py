@@ -0,0 +1,172 @@
+# scraper/history_events.py
+# Предварително изчислени събития NEW / DROPPED / RE-ENTRY (Re-Entry Tracker) за всеки контекст
+# (държава, chart_type, категория, подкатегория) и дата. /history ги чете с keyset пагинация,
+# вместо да сравнява снапшотите при всяка заявка.
+import sqlite3
+from typing import Optional, List, Dict, Any
+from dimensions import day_number, day_date
+
+EVENTS_DDL = """
+    CREATE TABLE IF NOT EXISTS history_events (
+        snapshot_date TEXT, country TEXT, chart_type TEXT, category TEXT, subcategory TEXT,
+        status TEXT, s_ord INTEGER, rank INTEGER, app_id TEXT, app_name TEXT,
+        replaced_app_id TEXT, replaced_app_name TEXT, replaced_prev_rank INTEGER,
+        replaced_current_rank INTEGER, replaced_status TEXT,
+        replaced_by_app_id TEXT, replaced_by_app_name TEXT, replaced_by_rank INTEGER
+    )
+"""
+EVENTS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_history_events_ctx ON history_events "
+    "(country, chart_type, category, subcategory, snapshot_date, s_ord, rank, app_id)",
+    "CREATE INDEX IF NOT EXISTS ix_history_events_date ON history_events (snapshot_date, s_ord, rank, app_id)",
+]
+
+STATUS_ORDER = {"NEW": 1, "DROPPED": 2, "RE-ENTRY": 3}
+
+_COLS = (
+    "snapshot_date", "country", "chart_type", "category", "subcategory", "status", "s_ord", "rank",
+    "app_id", "app_name", "replaced_app_id", "replaced_app_name", "replaced_prev_rank",
+    "replaced_current_rank", "replaced_status", "replaced_by_app_id", "replaced_by_app_name", "replaced_by_rank",
+)
+
+
+def ensure_history_events(conn: sqlite3.Connection):
+    conn.execute(EVENTS_DDL)
+    for ddl in EVENTS_INDEXES:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def day_events(curr: List[tuple], prev: List[tuple], prev_prev: Optional[List[tuple]]) -> List[Dict[str, Any]]:
+    """
+    Събитията за един контекст между два поредни снапшота. Редовете са (rank, app_id, app_name).
+    Логиката е същата като в /history: заместникът/заместеният е на същия ранг.
+    """
+    prev_by_id = {r[1]: r for r in prev}
+    prev_by_rank = {r[0]: r for r in prev}
+    curr_by_id = {r[1]: r for r in curr}
+    curr_by_rank = {r[0]: r for r in curr}
+    out = []
+
+    # NEW: кого е изместил (същия ранг от вчера)
+    for app_id in curr_by_id.keys() - prev_by_id.keys():
+        rank_now, _, name = curr_by_id[app_id]
+        replaced = prev_by_rank.get(rank_now)
+        ev = {"status": "NEW", "rank": rank_now, "app_id": app_id, "app_name": name}
+        if replaced:
+            still = curr_by_id.get(replaced[1])
+            ev.update({
+                "replaced_app_id": replaced[1],
+                "replaced_app_name": replaced[2],
+                "replaced_prev_rank": rank_now,
+                "replaced_current_rank": still[0] if still else None,
+                "replaced_status": "STILL_IN_TOP" if still else "DROPPED",
+            })
+        out.append(ev)
+
+    # DROPPED: кой го е заменил днес на същия ранг
+    for app_id in prev_by_id.keys() - curr_by_id.keys():
+        rank_prev, _, name = prev_by_id[app_id]
+        replacer = curr_by_rank.get(rank_prev)
+        ev = {"status": "DROPPED", "rank": rank_prev, "app_id": app_id, "app_name": name}
+        if replacer:
+            ev.update({
+                "replaced_by_app_id": replacer[1],
+                "replaced_by_app_name": replacer[2],
+                "replaced_by_rank": rank_prev,
+            })
+        out.append(ev)
+
+    # RE-ENTRY: бил е преди два дни, липсвал вчера, днес отново е вътре
+    if prev_prev is not None:
+        prev_prev_ids = {r[1] for r in prev_prev}
+        for app_id in (curr_by_id.keys() & prev_prev_ids) - prev_by_id.keys():
+            rank_now, _, name = curr_by_id[app_id]
+            out.append({"status": "RE-ENTRY", "rank": rank_now, "app_id": app_id, "app_name": name})
+    return out
+
+
+def _insert(conn, ctx: tuple, snapshot_date: str, events: List[Dict[str, Any]]):
+    country, chart_type, category, subcategory = ctx
+    conn.executemany(
+        f"INSERT INTO history_events ({','.join(_COLS)}) VALUES ({','.join(['?'] * len(_COLS))})",
+        [(snapshot_date, country, chart_type, category, subcategory, e["status"], STATUS_ORDER[e["status"]],
+          e["rank"], e["app_id"], e["app_name"], e.get("replaced_app_id"), e.get("replaced_app_name"),
+          e.get("replaced_prev_rank"), e.get("replaced_current_rank"), e.get("replaced_status"),
+          e.get("replaced_by_app_id"), e.get("replaced_by_app_name"), e.get("replaced_by_rank"))
+         for e in events],
+    )
+
+
+def refresh_history_events(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Преизчислява събитията за snapshot_date (или цялата история, ако е None). Идемпотентно.
+    Връща броя записани събития.
+    """
+    ensure_history_events(conn)
+    cur = conn.cursor()
+    wanted = None
+    if snapshot_date:
+        # всеки контекст на деня спрямо собствените си два предишни дни (от dim_context_days, обновени от
+        # refresh_chart_ranks преди това) — както при пълното преизчисляване, липсващ ден се прескача
+        cur.execute("DELETE FROM history_events WHERE snapshot_date=?", (snapshot_date,))
+        day = day_number(snapshot_date)
+        cur.execute("""
+            SELECT x.country, x.chart_type, x.category, x.subcategory, d.day
+            FROM dim_context_days t
+            JOIN dim_context x ON x.ctx_id = t.ctx_id
+            JOIN dim_context_days d ON d.ctx_id = t.ctx_id
+             AND d.day IN (SELECT day FROM dim_context_days WHERE ctx_id = t.ctx_id AND day <= t.day
+                           ORDER BY day DESC LIMIT 3)
+            WHERE t.day = ?
+        """, (day,))
+        wanted = {(c, t, cat, sub, day_date(d)) for c, t, cat, sub, d in cur.fetchall()}
+        dates = sorted({w[4] for w in wanted})
+        if not dates:
+            conn.commit()
+            return 0
+        date_filter = f"WHERE snapshot_date IN ({','.join(['?'] * len(dates))})"
+        params = dates
+    else:
+        cur.execute("DELETE FROM history_events")
+        date_filter, params = "", []
+
+    cur.execute(f"""
+        SELECT DISTINCT country, chart_type, category, subcategory, snapshot_date, rank, app_id, app_name
+        FROM charts {date_filter}
+        ORDER BY country, chart_type, category, subcategory, snapshot_date, rank
+    """, params)
+
+    total = 0
+    ctx, days = None, []
+
+    def flush():
+        # събития за последния натрупан ден на контекста спрямо предишния (и по-предишния)
+        nonlocal total
+        if len(days) < 2:
+            return
+        d_curr, curr = days[-1]
+        if snapshot_date and d_curr != snapshot_date:
+            return
+        prev = days[-2][1]
+        prev_prev = days[-3][1] if len(days) >= 3 else None
+        events = day_events(curr, prev, prev_prev)
+        _insert(conn, ctx, d_curr, events)
+        total += len(events)
+
+    for country, chart_type, category, subcategory, d, rank, app_id, app_name in cur:
+        key = (country, chart_type, category, subcategory)
+        if wanted is not None and (*key, d) not in wanted:
+            continue
+        if key != ctx:
+            flush()
+            ctx, days = key, []
+        if not days or days[-1][0] != d:
+            flush()
+            days = days[-2:] + [(d, [])]
+        if app_id:
+            days[-1][1].append((rank, app_id, app_name))
+    flush()
+
+    conn.commit()
+    return total
@@ -0,0 +1,133 @@
+# scraper/hot_replica.py
+# Реплика в паметта на последните HOT_REPLICA_DAYS снапшота за API-то: charts и history_events от тези
+# дни се копират в in-memory SQLite (shared cache, за да я виждат всички връзки на процеса) със същата
+# схема и индексите от диска. Базата на диска е закачена към всяка връзка като `disk`, затова таблиците,
+# които не са в паметта (chart_ranks, dim_*, ...), се четат оттам със същите некачествени имена —
+# заявките на маршрутите не се променят. Маршрутът пита covers(най-ранна дата) и при по-стари дати
+# чете само от диска.
+# Репликата се пълни от най-новия ден назад, докато не се събере HOT_REPLICA_DAYS или не стигне своя дял
+# от HOT_REPLICA_MAX_BYTES (тогава прозорецът е по-къс). Бюджетът е общ за инстанцията: всеки от
+# WEB_CONCURRENCY worker-ите държи собствена реплика и взима 1/WEB_CONCURRENCY от него. Строи се във фонова
+# нишка; докато не е готова или ако базата на диска се е сменила след нея (stamp), заявките отиват на диска.
+import os, time, sqlite3, threading, itertools
+from typing import Optional, Dict, Any, Callable
+from dimensions import day_date
+
+HOT_REPLICA = os.environ.get("HOT_REPLICA", "1") != "0"
+HOT_REPLICA_DAYS = int(os.environ.get("HOT_REPLICA_DAYS", 14))
+HOT_REPLICA_MAX_BYTES = int(os.environ.get("HOT_REPLICA_MAX_BYTES", 256 * 1024 * 1024))  # за всички worker-и
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY") or 1))
+HOT_TABLES = ("charts", "history_events")  # таблиците с колона snapshot_date, които се режат по прозорец
+
+
+class HotConnection(sqlite3.Connection):
+    """Връзка към репликата; hot_since е първата дата в паметта (по-старите са само на диска)."""
+    hot_since: Optional[str] = None
+
+
+class HotReplica:
+    _names = itertools.count(1)  # имената на in-memory базите са общи за процеса
+
+    def __init__(self, db_path: str, stamp: Callable[[], Any], days: int = HOT_REPLICA_DAYS,
+                 max_bytes: int = HOT_REPLICA_MAX_BYTES // WEB_CONCURRENCY):
+        self.db_path, self.stamp, self.days, self.max_bytes = db_path, stamp, days, max_bytes
+        self.current: Optional[Dict[str, Any]] = None  # uri, since, stamp, anchor, stats
+        self.building = False
+        self.lock = threading.Lock()
+        self.stats = {"hot": 0, "disk": 0, "builds": 0}
+
+    def _size(self, con: sqlite3.Connection) -> int:
+        return con.execute("PRAGMA page_count").fetchone()[0] * con.execute("PRAGMA page_size").fetchone()[0]
+
+    def build(self) -> Dict[str, Any]:
+        """Строи нова реплика и я подменя; старата изчезва със затварянето на последната ѝ връзка."""
+        t0 = time.perf_counter()
+        stamp = self.stamp()
+        uri = f"file:hot_replica_{os.getpid()}_{next(self._names)}?mode=memory&cache=shared"
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            anchor.execute("ATTACH DATABASE ? AS disk", (self.db_path,))
+            # първо схемата с индексите, после данните — размерът по време на пълненето включва индексите
+            tables = [t for t in HOT_TABLES if anchor.execute(
+                "SELECT 1 FROM disk.sqlite_master WHERE type='table' AND name=?", (t,)).fetchone()]
+            for table in tables:
+                for (sql,) in anchor.execute(
+                    "SELECT sql FROM disk.sqlite_master WHERE tbl_name=? AND sql IS NOT NULL "
+                    "ORDER BY type='index'", (table,)).fetchall():
+                    anchor.execute(sql)
+            days = [day_date(r[0]) for r in anchor.execute(
+                "SELECT DISTINCT day FROM disk.chart_ranks ORDER BY day DESC LIMIT ?", (self.days,))]
+            loaded, rows = [], 0
+            for d in days:
+                n = 0
+                for table in tables:
+                    n += anchor.execute(f"INSERT INTO main.{table} SELECT * FROM disk.{table} WHERE snapshot_date=?",
+                                        (d,)).rowcount
+                if self._size(anchor) > self.max_bytes:  # денят не се събира -> прозорецът спира преди него
+                    for table in tables:
+                        anchor.execute(f"DELETE FROM main.{table} WHERE snapshot_date=?", (d,))
+                    anchor.commit()
+                    anchor.execute("VACUUM main")  # освободените страници на последния ден
+                    break
+                anchor.commit()
+                loaded.append(d)
+                rows += n
+        except Exception:
+            anchor.close()  # недостроената база в паметта изчезва с последната си връзка
+            raise
+        stats = {"days": len(loaded), "since": loaded[-1] if loaded else None, "rows": rows,
+                 "bytes": self._size(anchor), "max_bytes": self.max_bytes,
+                 "build_s": round(time.perf_counter() - t0, 2)}
+        old, self.current = self.current, {"uri": uri, "since": stats["since"], "stamp": stamp,
+                                           "anchor": anchor, "stats": stats}
+        if old:
+            old["anchor"].close()
+        self.stats["builds"] += 1
+        print(f"[HOT] replica: {stats['days']} days since {stats['since']}, {rows} rows, "
+              f"{stats['bytes'] / 1e6:.1f} MB, {stats['build_s']}s")
+        return stats
+
+    def refresh(self, background: bool = True):
+        """Нова реплика (при старт и след опресняване на базата); в нишка, ако background."""
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"⚠️ Hot replica build failed: {e}")
+            finally:
+                self.building = False
+
+        if background:
+            threading.Thread(target=run, daemon=True).start()
+        else:
+            run()
+
+    def covers(self, oldest: Optional[str]) -> bool:
+        """Готова, актуална спрямо базата и с всички дати от oldest нататък."""
+        cur = self.current
+        if not cur or not cur["since"] or not oldest or oldest < cur["since"]:
+            return False
+        if cur["stamp"] != self.stamp():
+            self.refresh()  # базата е сменена — нова реплика във фона, дотогава диска
+            return False
+        return True
+
+    def connect(self) -> Optional[HotConnection]:
+        cur = self.current
+        if not cur:
+            return None
+        con = sqlite3.connect(cur["uri"], uri=True, factory=HotConnection)
+        con.execute("ATTACH DATABASE ? AS disk", (self.db_path,))
+        con.hot_since = cur["since"]
+        return con
+
+    def summary(self) -> Dict[str, Any]:
+        cur = self.current
+        return {**self.stats, "enabled": True, "building": self.building,
+                "replica": cur["stats"] if cur else None,
+                "fresh": bool(cur) and cur["stamp"] == self.stamp()}
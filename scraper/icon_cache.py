@@ -0,0 +1,189 @@
+# scraper/icon_cache.py
+# Локален кеш на иконите (artworkUrl100 -> icon_url) за /icons/{app_id}: съдържанието е на диска по
+# sha256 (content-addressed: ICON_CACHE_DIR/ab/abcdef...), а индексът url -> sha, размер и последен
+# достъп е в малка SQLite база до файловете (не в app_data.db, която се качва в Drive).
+# Над ICON_CACHE_MAX_BYTES се изхвърлят най-отдавна ползваните (LRU по размер).
+# Скрейпът тегли иконите на деня предварително в пул от нишки (prefetch_icons).
+import os, time, sqlite3, hashlib, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ICON_CACHE_DIR = os.environ.get("ICON_CACHE_DIR") or os.path.join(BASE_DIR, "..", "appstore-api", "data", "icons")
+ICON_CACHE_MAX_BYTES = int(os.environ.get("ICON_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+ICON_WORKERS = int(os.environ.get("ICON_WORKERS", 8))
+# предварително теглене след скрейпа; изключва се, където дискът не се споделя с API-то (CI)
+ICON_PREFETCH = os.environ.get("ICON_PREFETCH", "1") != "0"
+ICON_TIMEOUT = 10
+# last_access се записва най-много веднъж на толкова секунди за икона (без запис при всеки hit)
+TOUCH_EVERY = 3600
+
+INDEX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS icons (
+        url TEXT PRIMARY KEY,
+        sha TEXT, size INTEGER, content_type TEXT,
+        fetched_at REAL, last_access REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_icons_last_access ON icons (last_access)",
+    "CREATE INDEX IF NOT EXISTS ix_icons_sha ON icons (sha)",
+]
+
+
+def fetch_icon(url: str) -> Tuple[bytes, str]:
+    req = urllib.request.Request(url, headers={"User-Agent": "charts-bot/1.0"})
+    with urllib.request.urlopen(req, timeout=ICON_TIMEOUT) as r:
+        return r.read(), r.headers.get_content_type() or "image/png"
+
+
+class IconCache:
+    """Индексът + файловете; броячите (hits/misses/...) са за процеса."""
+
+    def __init__(self, root: str = ICON_CACHE_DIR, max_bytes: int = ICON_CACHE_MAX_BYTES):
+        self.root, self.max_bytes = root, max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, "index.db")
+        con = self._connect()
+        for ddl in INDEX_DDL:
+            con.execute(ddl)
+        con.commit()
+        con.close()
+        self.stats = {"hits": 0, "misses": 0, "fetched": 0, "fetch_errors": 0, "evicted": 0, "bytes_served": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.index_path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha)
+
+    def get(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """(път до файла, sha, content type) или None, ако иконата не е в кеша."""
+        con = self._connect()
+        try:
+            row = con.execute("SELECT sha, content_type, last_access FROM icons WHERE url=?", (url,)).fetchone()
+            if not row or not os.path.exists(self.blob_path(row[0])):
+                return None
+            now = time.time()
+            if now - row[2] > TOUCH_EVERY:
+                con.execute("UPDATE icons SET last_access=? WHERE url=?", (now, url))
+                con.commit()
+            return self.blob_path(row[0]), row[0], row[1]
+        finally:
+            con.close()
+
+    def _write_blob(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # атомарно — четящият никога не вижда половин файл
+        return sha
+
+    def put(self, url: str, data: bytes, content_type: str) -> str:
+        sha = self._write_blob(data)
+        now = time.time()
+        con = self._connect()
+        try:
+            con.execute("INSERT OR REPLACE INTO icons VALUES (?,?,?,?,?,?)",
+                        (url, sha, len(data), content_type, now, now))
+            con.commit()
+            self._evict(con)
+        finally:
+            con.close()
+        return sha
+
+    def _evict(self, con: sqlite3.Connection):
+        """Изтрива най-отдавна ползваните икони, докато размерът на уникалните файлове е под лимита."""
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT sha, MAX(size) AS size FROM icons "
+                            "GROUP BY sha)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, sha, size in con.execute("SELECT url, sha, size FROM icons ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            con.execute("DELETE FROM icons WHERE url=?", (url,))
+            if not con.execute("SELECT 1 FROM icons WHERE sha=? LIMIT 1", (sha,)).fetchone():
+                try:
+                    os.remove(self.blob_path(sha))
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.stats["evicted"] += 1
+        con.commit()
+
+    def ensure(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """Иконата от кеша или изтеглена сега; None, ако източникът не отговаря."""
+        hit = self.get(url)
+        if hit:
+            self.stats["hits"] += 1
+            return hit
+        self.stats["misses"] += 1
+        try:
+            data, ctype = fetch_icon(url)
+        except Exception as e:
+            print(f"[ICONS] fetch failed {url}: {e}")
+            self.stats["fetch_errors"] += 1
+            return None
+        self.stats["fetched"] += 1
+        self.put(url, data, ctype)
+        return self.get(url)
+
+    def prefetch(self, urls: List[str], workers: int = ICON_WORKERS) -> Dict[str, int]:
+        """Тегли липсващите икони в пул от нишки; записът в индекса е в текущата нишка."""
+        con = self._connect()
+        have = set()
+        urls = list(dict.fromkeys(u for u in urls if u))
+        for i in range(0, len(urls), 500):
+            part = urls[i:i + 500]
+            have.update(r[0] for r in con.execute(
+                f"SELECT url FROM icons WHERE url IN ({','.join(['?'] * len(part))})", part))
+        con.close()
+        todo = [u for u in urls if u not in have]
+
+        def one(url):
+            try:
+                return url, fetch_icon(url)
+            except Exception as e:
+                return url, e
+
+        out = {"urls": len(urls), "cached": len(have), "fetched": 0, "failed": 0}
+        rows = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for url, res in pool.map(one, todo):
+                if isinstance(res, Exception):
+                    out["failed"] += 1
+                    continue
+                data, ctype = res
+                now = time.time()
+                rows.append((url, self._write_blob(data), len(data), ctype, now, now))
+        con = self._connect()
+        con.executemany("INSERT OR REPLACE INTO icons VALUES (?,?,?,?,?,?)", rows)
+        con.commit()
+        self._evict(con)
+        con.close()
+        out["fetched"] = len(rows)
+        self.stats["fetched"] += out["fetched"]
+        self.stats["fetch_errors"] += out["failed"]
+        return out
+
+    def summary(self) -> Dict[str, float]:
+        con = self._connect()
+        entries, size = con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM icons").fetchone()
+        con.close()
+        s = self.stats
+        looked = s["hits"] + s["misses"]
+        return {**s, "hit_rate": round(s["hits"] / looked, 4) if looked else None,
+                "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+def prefetch_icons(conn: sqlite3.Connection, snapshot_date: str, cache: Optional[IconCache] = None) -> Dict[str, int]:
+    """Иконите от класациите на деня — в кеша преди първото зареждане на таблото."""
+    urls = [r[0] for r in conn.execute(
+        "SELECT DISTINCT icon_url FROM charts WHERE snapshot_date=? AND icon_url IS NOT NULL", (snapshot_date,))]
+    return (cache or IconCache()).prefetch(urls)
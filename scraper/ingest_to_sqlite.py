@@ -1,8 +1,28 @@
 import os
 import csv
+import time
+import hashlib
 import sqlite3
 import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+COLUMNS = [
+    "snapshot_date", "country", "chart", "category", "genre_id", "rank", "app_id",
+    "bundle_id", "name", "developer", "developer_id", "app_store_url", "icon_url",
+]
+# контекст на снапшота: един ред на (дата, държава, класация, категория, ранг)
+KEY_COLUMNS = ["snapshot_date", "country", "chart", "category", "rank"]
+_KEY_IDX = [COLUMNS.index(c) for c in KEY_COLUMNS]
+
+CHUNK_SIZE = 5000
+
+UPSERT_SQL = f"""
+    INSERT INTO apps ({', '.join(COLUMNS)}) VALUES ({', '.join(['?'] * len(COLUMNS))})
+    ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET
+        {', '.join(f'{c}=excluded.{c}' for c in COLUMNS if c not in KEY_COLUMNS)}
+"""
+
 
 def init_db(db_path: Path):
     conn = sqlite3.connect(db_path)
@@ -24,59 +44,156 @@ def init_db(db_path: Path):
         icon_url TEXT
     )
     """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        sha256 TEXT PRIMARY KEY,
+        file_name TEXT,
+        rows INTEGER,
+        ingested_at TEXT
+    )
+    """)
+
+    # Стари бази (обикновен INSERT) може да имат дубликати — оставяме последно вкарания ред,
+    # иначе уникалният индекс за upsert не може да се създаде.
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_apps_snapshot'")
+    if not cur.fetchone():
+        cur.execute(f"""
+            DELETE FROM apps WHERE rowid NOT IN (
+                SELECT MAX(rowid) FROM apps GROUP BY {', '.join(KEY_COLUMNS)}
+            )
+        """)
+        if cur.rowcount:
+            print(f"🧹 Премахнати дубликати: {cur.rowcount}")
+        cur.execute(f"CREATE UNIQUE INDEX ux_apps_snapshot ON apps ({', '.join(KEY_COLUMNS)})")
     conn.commit()
     conn.close()
 
-def ingest_csv_to_db(csv_dir: Path, db_path: Path):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
 
-    csv_files = list(csv_dir.glob("*.csv"))
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def iter_csv_rows(csv_file: Path):
+    """Поточно чете CSV-то като кортежи в реда на COLUMNS."""
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            # Уверяваме се, че всички колони съществуват; празен ключ -> '' (NULL не се засича от UNIQUE)
+            values = [row.get(c) for c in COLUMNS]
+            for i in _KEY_IDX:
+                if values[i] is None:
+                    values[i] = ""
+            yield tuple(values)
+
+
+def parse_csv(csv_file: Path) -> list:
+    # изпълнява се в работен процес; записът остава в главния
+    return list(iter_csv_rows(csv_file))
+
+
+def _open_writer(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    return conn
+
+
+def _write_file(conn: sqlite3.Connection, csv_file: Path, sha: str, rows) -> int:
+    """Един файл = една транзакция (редовете + записът в манифеста), на порции по CHUNK_SIZE."""
+    n = 0
+    conn.execute("BEGIN")
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                conn.executemany(UPSERT_SQL, chunk)
+                n += len(chunk)
+                chunk = []
+        if chunk:
+            conn.executemany(UPSERT_SQL, chunk)
+            n += len(chunk)
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_manifest (sha256, file_name, rows, ingested_at) "
+            "VALUES (?, ?, ?, datetime('now'))",
+            (sha, csv_file.name, n),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n
+
+
+def ingest_csv_to_db(csv_dir: Path, db_path: Path, workers: int = 0, force: bool = False) -> dict:
+    """
+    Импортира всички *.csv от csv_dir (upsert по контекст на снапшота).
+    Файлове, чийто хеш вече е в ingest_manifest, се прескачат (освен при force).
+    workers > 1 -> парсване в пул от процеси, записът е само в един (главния) процес.
+    """
+    t0 = time.perf_counter()
+    stats = {"files": 0, "skipped": 0, "rows": 0}
+
+    csv_files = sorted(csv_dir.glob("*.csv"))
     if not csv_files:
         print(f"⚠️ Няма CSV файлове за импорт в {csv_dir}")
-        return
+        return stats
 
+    conn = _open_writer(db_path)
+    known = set() if force else {r[0] for r in conn.execute("SELECT sha256 FROM ingest_manifest")}
+
+    todo = []
     for csv_file in csv_files:
-        print(f"📥 Импортирам: {csv_file.name}")
-        with open(csv_file, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            rows = []
-            for row in reader:
-                # Уверяваме се, че всички колони съществуват
-                rows.append((
-                    row.get("snapshot_date"),
-                    row.get("country"),
-                    row.get("chart"),
-                    row.get("category"),
-                    row.get("genre_id"),
-                    row.get("rank"),
-                    row.get("app_id"),
-                    row.get("bundle_id"),
-                    row.get("name"),
-                    row.get("developer"),
-                    row.get("developer_id"),
-                    row.get("app_store_url"),
-                    row.get("icon_url"),
-                ))
-            if rows:
-                cur.executemany("""
-                INSERT INTO apps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, rows)
-                print(f"✅ {len(rows)} реда добавени от {csv_file.name}")
-            else:
-                print(f"⚠️ Празен CSV: {csv_file.name}")
+        sha = file_sha256(csv_file)
+        if sha in known:
+            stats["skipped"] += 1
+            continue
+        known.add(sha)  # един и същ файл два пъти в папката
+        todo.append((csv_file, sha))
+
+    def done(csv_file, n):
+        stats["files"] += 1
+        stats["rows"] += n
+        if n:
+            print(f"✅ {n} реда от {csv_file.name}")
+        else:
+            print(f"⚠️ Празен CSV: {csv_file.name}")
+
+    try:
+        if workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # map пази реда на файловете -> при припокриване печели по-късният файл, както при серийния режим
+                for (csv_file, sha), rows in zip(todo, pool.map(parse_csv, [f for f, _ in todo])):
+                    done(csv_file, _write_file(conn, csv_file, sha, rows))
+        else:
+            for csv_file, sha in todo:
+                print(f"📥 Импортирам: {csv_file.name}")
+                done(csv_file, _write_file(conn, csv_file, sha, iter_csv_rows(csv_file)))
+    finally:
+        conn.close()
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    print(f"[INGEST] {stats['files']} файла, {stats['rows']} реда, "
+          f"{stats['skipped']} прескочени (вече импортирани), {stats['seconds']}s")
+    return stats
 
-    conn.commit()
-    conn.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--csv-dir", type=str, required=True, help="Папка с CSV файлове")
     parser.add_argument("--db", type=str, required=True, help="Път до SQLite DB")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Процеси за парсване (1 = последователно, поточно)")
+    parser.add_argument("--force", action="store_true", help="Игнорира манифеста и импортира всичко отново")
     args = parser.parse_args()
 
     csv_dir = Path(args.csv_dir)
     db_path = Path(args.db)
 
     init_db(db_path)
-    ingest_csv_to_db(csv_dir, db_path)
+    ingest_csv_to_db(csv_dir, db_path, workers=args.workers, force=args.force)
@@ -0,0 +1,99 @@
+# scraper/job_ledger.py
+# Дневник на работните единици на скрейпа: (snapshot_date, source, country, genre) + статус.
+# Всяка единица се записва атомарно заедно с редовете си в charts, така че прекъснат run
+# може да продължи (--resume) само с липсващите/неуспешните единици.
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+
+LEDGER_DDL = """
+    CREATE TABLE IF NOT EXISTS scrape_jobs (
+        snapshot_date TEXT, source TEXT, country TEXT, genre TEXT,
+        status TEXT DEFAULT 'pending',      -- pending | done | failed
+        rows INTEGER, attempts INTEGER DEFAULT 0, error TEXT,
+        started_at TEXT, finished_at TEXT,
+        PRIMARY KEY (snapshot_date, source, country, genre)
+    )
+"""
+
+# за --resume празна класация (failed с error='empty') не държи деня отворен; shard_scrape.missing_units
+# пак я брои за недовършена (мрежова грешка изглежда по същия начин)
+UNFINISHED = "status!='done' AND COALESCE(error, '')!='empty'"
+
+
+def ensure_job_ledger(conn: sqlite3.Connection):
+    conn.execute(LEDGER_DDL)
+    conn.commit()
+
+
+def plan_jobs(conn: sqlite3.Connection, snapshot_date: str, source: str, units: List[Tuple[str, str]]):
+    """Регистрира (country, genre) единиците за деня; вече съществуващите запазват статуса си."""
+    ensure_job_ledger(conn)
+    conn.executemany(
+        "INSERT OR IGNORE INTO scrape_jobs (snapshot_date, source, country, genre) VALUES (?,?,?,?)",
+        [(snapshot_date, source, c, g) for c, g in units],
+    )
+    conn.commit()
+
+
+def pending_jobs(conn: sqlite3.Connection, snapshot_date: str, source: str) -> set:
+    """(country, genre), които още не са done."""
+    cur = conn.execute(
+        "SELECT country, genre FROM scrape_jobs WHERE snapshot_date=? AND source=? AND status!='done'",
+        (snapshot_date, source),
+    )
+    return {(c, g) for c, g in cur.fetchall()}
+
+
+def resume_date(conn: sqlite3.Connection, source: str) -> Optional[str]:
+    """
+    Последният ден с недовършени единици за source (или None). Класациите се теглят на живо, така че
+    продължаваме само днешния или вчерашния UTC ден — по-стар ден се довършва само с изрично --date.
+    """
+    ensure_job_ledger(conn)
+    row = conn.execute(
+        f"SELECT MAX(snapshot_date) FROM scrape_jobs WHERE source=? AND {UNFINISHED}", (source,)
+    ).fetchone()
+    day = row[0] if row else None
+    if day and day < (datetime.utcnow().date() - timedelta(days=1)).isoformat():
+        print(f"[RESUME] ⚠️ {source}: last unfinished day {day} is too old to resume — "
+              f"pass --date {day} to finish it explicitly")
+        return None
+    return day
+
+
+def mark_done(conn: sqlite3.Connection, snapshot_date: str, source: str, country: str, genre: str,
+              rows: int):
+    # без commit — вика се в транзакцията, която пише редовете на единицата
+    conn.execute("""
+        UPDATE scrape_jobs SET status='done', rows=?, error=NULL, attempts=attempts+1,
+               finished_at=datetime('now')
+        WHERE snapshot_date=? AND source=? AND country=? AND genre=?
+    """, (rows, snapshot_date, source, country, genre))
+
+
+def mark_failed(conn: sqlite3.Connection, snapshot_date: str, source: str, country: str, genre: str,
+                error: str):
+    conn.execute("""
+        UPDATE scrape_jobs SET status='failed', error=?, attempts=attempts+1, finished_at=datetime('now')
+        WHERE snapshot_date=? AND source=? AND country=? AND genre=?
+    """, (error, snapshot_date, source, country, genre))
+    conn.commit()
+
+
+def summary(conn: sqlite3.Connection, snapshot_date: str, source: str) -> dict:
+    cur = conn.execute(
+        "SELECT status, COUNT(*) FROM scrape_jobs WHERE snapshot_date=? AND source=? GROUP BY status",
+        (snapshot_date, source),
+    )
+    return dict(cur.fetchall())
+
+
+def clear_unit_rows(conn: sqlite3.Connection, snapshot_date: str, country: str, category: str,
+                    subcategory: Optional[str], chart_type: str = "top_free"):
+    # частично записан ден от прекъснат run не бива да се смесва с новите редове
+    # (INSERT OR REPLACE не засича NULL subcategory и оставя стари рангове над новия брой)
+    conn.execute("""
+        DELETE FROM charts
+        WHERE snapshot_date=? AND country=? AND category=? AND subcategory IS ? AND chart_type=?
+    """, (snapshot_date, country, category, subcategory, chart_type))
@@ -0,0 +1,33 @@
+# scraper/json_codec.py
+# Общ JSON кодек за скрейперите и API-то: orjson, ако е инсталиран, иначе stdlib json.
+# И двата бекенда пишат компактен JSON с UTF-8 (без \uXXXX escape), за да е еднакво съдържанието в `raw`.
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+if orjson:
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=_OPTS)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=_OPTS).decode()
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return dumps(obj).encode()
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
@@ -0,0 +1,189 @@
+# scraper/lookup_cache.py
+# Кеш на iTunes Lookup по (country, app_id): bundle id, URL-ите и иконата почти не се менят, а всеки
+# дневен run иначе прави lookup на всяко приложение във всяка класация (по заявка на класация).
+# - запис по-нов от LOOKUP_TTL_DAYS (и от LOOKUP_RATING_TTL_DAYS — рейтингът остарява по-бързо) -> от кеша;
+# - по-стар, но в рамките на LOOKUP_MAX_AGE_DAYS -> редът се пише от кеша, а приложението влиза в
+#   опашката за опресняване;
+# - липсващите се събират по държава и се теглят по LOOKUP_BATCH в заявка (не по заявка на класация);
+#   редовете, записани преди заявката, се допълват в charts. flush() в края на run-а тегли остатъка
+#   и всичко от деня, което още е без lookup данни (напр. след прекъснат run);
+# - refresh_stale() опреснява опашката по приоритет (първо изтеклите, после по най-добър ранг днес и
+#   по възраст), до LOOKUP_REFRESH_BUDGET приложения, и поправя днешните им редове.
+import os, math, time, sqlite3
+from typing import Callable, Dict, List, Optional
+from chart_html import prefetch
+from json_codec import dumps, loads
+
+DAY = 86400
+LOOKUP_TTL_DAYS = float(os.environ.get("LOOKUP_TTL_DAYS", 7))
+LOOKUP_RATING_TTL_DAYS = float(os.environ.get("LOOKUP_RATING_TTL_DAYS", LOOKUP_TTL_DAYS))
+LOOKUP_MAX_AGE_DAYS = float(os.environ.get("LOOKUP_MAX_AGE_DAYS", 30))
+LOOKUP_REFRESH_BUDGET = int(os.environ.get("LOOKUP_REFRESH_BUDGET", 2000))
+LOOKUP_BATCH = 50  # id-та в една заявка към iTunes Lookup
+
+# полетата от enrich_with_lookup, които се допълват/поправят в редовете на деня
+PATCH_COLS = ("bundle_id", "price", "currency", "rating", "ratings_count", "app_store_url", "app_url",
+              "icon_url", "raw")
+
+LOOKUP_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS lookup_cache (
+        country TEXT, app_id TEXT,
+        fetched_at REAL,                 -- unix време на lookup-а
+        data TEXT,                       -- JSON: речникът от enrich_with_lookup за app-а без raw
+        raw TEXT,                        -- отговорът на iTunes за app-а (JSON), веднъж — не вграден в data
+        PRIMARY KEY (country, app_id)
+    ) WITHOUT ROWID
+"""
+
+
+def ensure_lookup_cache(conn: sqlite3.Connection):
+    conn.execute(LOOKUP_CACHE_DDL)
+    if "raw" not in {r[1] for r in conn.execute("PRAGMA main.table_info(lookup_cache)")}:
+        # стар кеш: raw беше JSON низ вътре в data -> изваждаме го в собствената колона
+        conn.execute("ALTER TABLE lookup_cache ADD COLUMN raw TEXT")
+        conn.execute("""
+            UPDATE lookup_cache SET raw = json_extract(data, '$.raw'), data = json_remove(data, '$.raw')
+            WHERE json_type(data, '$.raw') = 'text'
+        """)
+    conn.commit()
+
+
+def _pack(info: dict) -> tuple:
+    """(data, raw) за реда в кеша."""
+    return dumps({k: v for k, v in info.items() if k != "raw"}), info.get("raw")
+
+
+def _unpack(data: str, raw: Optional[str]) -> dict:
+    info = loads(data)
+    info["raw"] = raw
+    return info
+
+
+class LookupCache:
+    """Кешът за един run (един снапшот): брои заявките, събира липсващите и остарелите записи."""
+
+    def __init__(self, conn: sqlite3.Connection, fetch: Callable[[str, List[str]], Dict[str, dict]],
+                 snapshot_date: str, now: Optional[float] = None):
+        ensure_lookup_cache(conn)
+        self.conn, self.fetch, self.snapshot_date = conn, fetch, snapshot_date
+        self.now = now or time.time()
+        self.pending: Dict[str, Dict[str, None]] = {}  # country -> липсващи app_id (по реда на срещане)
+        self.stale: Dict[tuple, int] = {}  # (country, app_id) -> най-добър ранг днес
+        self.stats = {"ids": 0, "hits": 0, "stale_served": 0, "looked_up": 0, "requests": 0,
+                      "per_chart_requests": 0, "refreshed": 0, "refresh_requests": 0}
+
+    def _store(self, country: str, found: Dict[str, dict]):
+        """Записва lookup-а в кеша и в редовете на деня, които вече са в charts."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO lookup_cache (country, app_id, fetched_at, data, raw) VALUES (?,?,?,?,?)",
+                [(country, app_id, self.now, *_pack(info)) for app_id, info in found.items()],
+            )
+            self.conn.executemany(
+                f"UPDATE charts SET {', '.join(f'{c}=?' for c in PATCH_COLS)} "
+                "WHERE snapshot_date=? AND country=? AND app_id=?",
+                [(*(info.get(c) for c in PATCH_COLS), self.snapshot_date, country, app_id)
+                 for app_id, info in found.items()],
+            )
+
+    def _fetch(self, country: str, ids: List[str]) -> Dict[str, dict]:
+        found = self.fetch(country, ids)
+        self.stats["requests"] += math.ceil(len(ids) / LOOKUP_BATCH)
+        self.stats["looked_up"] += len(ids)
+        self._store(country, found)
+        return found
+
+    def lookup(self, country: str, items: List[dict]) -> Dict[str, dict]:
+        """
+        Като enrich_with_lookup(country, ids) за items от класацията ({"id", "rank", ...}). Липсващите
+        app-и, за които още няма пълна заявка, не са в резултата — допълват се в charts по-късно.
+        """
+        rank: Dict[str, int] = {}
+        for it in items:
+            if it["id"]:
+                rank[it["id"]] = min(it["rank"], rank.get(it["id"], it["rank"]))
+        ids = list(rank)
+        fresh_after = self.now - min(LOOKUP_TTL_DAYS, LOOKUP_RATING_TTL_DAYS) * DAY
+        usable_after = self.now - LOOKUP_MAX_AGE_DAYS * DAY
+        out: Dict[str, dict] = {}
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            cur = self.conn.execute(
+                f"SELECT app_id, fetched_at, data, raw FROM lookup_cache WHERE country=? AND app_id IN "
+                f"({','.join(['?'] * len(part))})", (country, *part))
+            for app_id, fetched_at, data, raw in cur.fetchall():
+                if fetched_at < usable_after:
+                    continue
+                out[app_id] = _unpack(data, raw)
+                if fetched_at < fresh_after:
+                    self.stats["stale_served"] += 1
+                    key = (country, app_id)
+                    self.stale[key] = min(rank[app_id], self.stale.get(key, rank[app_id]))
+
+        missing = [x for x in ids if x not in out]
+        self.stats["ids"] += len(ids)
+        self.stats["hits"] += len(ids) - len(missing)
+        self.stats["per_chart_requests"] += math.ceil(len(ids) / LOOKUP_BATCH)
+        queue = self.pending.setdefault(country, {})
+        queue.update(dict.fromkeys(missing))
+        if len(queue) >= LOOKUP_BATCH:
+            batch = list(queue)[:len(queue) // LOOKUP_BATCH * LOOKUP_BATCH]
+            for x in batch:
+                del queue[x]
+            found = self._fetch(country, batch)
+            out.update((x, found[x]) for x in missing if x in found)
+        return out
+
+    def flush(self) -> int:
+        """Тегли остатъка от липсващите и редовете на деня, които още са без lookup данни."""
+        cur = self.conn.execute(
+            "SELECT DISTINCT country, app_id FROM charts "
+            "WHERE snapshot_date=? AND raw IS NULL AND bundle_id IS NULL AND app_id IS NOT NULL",
+            (self.snapshot_date,))
+        for country, app_id in cur.fetchall():
+            self.pending.setdefault(country, {})[app_id] = None
+        n = 0
+        for country, queue in self.pending.items():
+            if queue:
+                n += len(self._fetch(country, list(queue)))
+        self.pending = {}
+        return n
+
+    def refresh_stale(self, budget: int = LOOKUP_REFRESH_BUDGET) -> int:
+        """Опреснява остарелите записи по приоритет. Връща броя опреснени приложения."""
+        if not self.stale or budget <= 0:
+            return 0
+        keys = list(self.stale)
+        age = {}
+        for country, app_id in keys:
+            row = self.conn.execute("SELECT fetched_at FROM lookup_cache WHERE country=? AND app_id=?",
+                                    (country, app_id)).fetchone()
+            age[country, app_id] = row[0] if row else 0
+        # изтеклите по LOOKUP_TTL_DAYS преди тези, при които е остарял само рейтингът
+        expired_before = self.now - LOOKUP_TTL_DAYS * DAY
+        keys.sort(key=lambda k: (age[k] >= expired_before, self.stale[k], age[k]))
+        keys = keys[:budget]
+
+        by_country: Dict[str, List[str]] = {}
+        for country, app_id in keys:
+            by_country.setdefault(country, []).append(app_id)
+        batches = [(country, ids[i:i + LOOKUP_BATCH]) for country, ids in by_country.items()
+                   for i in range(0, len(ids), LOOKUP_BATCH)]
+
+        n = 0
+        # следващата заявка се тегли във фонова нишка, докато текущата се записва
+        for (country, ids), found in prefetch(self.fetch, batches):
+            self._store(country, found)
+            n += len(found)
+        self.stats["refreshed"] += n
+        self.stats["refresh_requests"] += len(batches)
+        for k in keys:
+            self.stale.pop(k, None)
+        return n
+
+    def report(self) -> str:
+        s = self.stats
+        made = s["requests"] + s["refresh_requests"]
+        return (f"{s['ids']} ids, {s['hits']} from cache ({s['stale_served']} stale), {s['looked_up']} looked up, "
+                f"{s['refreshed']} refreshed | requests {made} instead of {s['per_chart_requests']} "
+                f"({s['per_chart_requests'] - made} avoided) | {len(self.stale)} stale left")
@@ -0,0 +1,198 @@
+# scraper/merge_db.py
+# Сливане на N бази (charts) в една — изцяло в SQLite (ATTACH + INSERT ... SELECT), без редовете да минават през Python.
+#   python scraper/merge_db.py --out app_data.db app_data_old.db app_data_new.db --since 2025-10-05
+# Източниците се прилагат в подадения ред; при --on-conflict replace печели последният.
+import os, sys, time, sqlite3, argparse
+from typing import List, Optional
+from chart_schema import ensure_charts_table, CHARTS_RENAMES, CHARTS_DROPPED
+from dimensions import ensure_dimensions
+
+CONFLICT_POLICIES = ("replace", "ignore", "abort")
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns(conn, schema: str, table: str) -> list:
+    return conn.execute(f"PRAGMA {schema}.table_info({_q(table)})").fetchall()
+
+
+def _legacy_columns(table: str) -> set:
+    """Колони от стари схеми, които не се пренасят в целта (charts се мигрира до каноничната схема)."""
+    return {"id", *CHARTS_RENAMES, *CHARTS_DROPPED} if table == "charts" else {"id"}
+
+
+def _reconcile_columns(conn, table: str, src_cols: list) -> int:
+    """Добавя в main.table колоните, които ги има в източника, а липсват в целта."""
+    have = {r[1] for r in _columns(conn, "main", table)}
+    added = 0
+    for _, name, col_type, *_ in src_cols:
+        if name not in have and name not in _legacy_columns(table):
+            print(f"[DB] Adding missing column: {name}")
+            conn.execute(f"ALTER TABLE main.{_q(table)} ADD COLUMN {_q(name)} {col_type or ''}")
+            have.add(name)
+            added += 1
+    return added
+
+
+def _drop_secondary_indexes(conn, table: str) -> list:
+    """Маха вторичните индекси (PK остава за проверката на конфликти); връща DDL-ите им за накрая."""
+    rows = conn.execute(
+        "SELECT name, sql FROM main.sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    for name, _ in rows:
+        conn.execute(f"DROP INDEX main.{_q(name)}")
+    return [sql for _, sql in rows]
+
+
+def _merge_source(conn, table: str, policy: str, since: Optional[str], until: Optional[str]) -> int:
+    """INSERT ... SELECT от src.table в main.table. Връща броя записани редове."""
+    src_cols = _columns(conn, "src", table)
+    if not src_cols:
+        print(f"⚠️ Няма таблица {table} в източника — пропускам")
+        return 0
+    _reconcile_columns(conn, table, src_cols)
+
+    dst = _columns(conn, "main", table)
+    src_names = {r[1] for r in src_cols}
+    # id (ако го има) не се копира — генерира се наново в целта
+    exprs = {r[1]: f"s.{_q(r[1])}" for r in dst if r[1] in src_names and r[1] != "id"}
+    if table == "charts":  # източник със стара схема: charts.developer от API-то пълни developer_name
+        dst_names = {r[1] for r in dst}
+        for old, new in CHARTS_RENAMES.items():
+            if old in src_names and new in dst_names:
+                exprs[new] = f"COALESCE(s.{_q(new)}, s.{_q(old)})" if new in src_names else f"s.{_q(old)}"
+    cols = list(exprs)
+    key = [r[1] for r in sorted(dst, key=lambda r: r[5]) if r[5] > 0 and r[1] != "id"]
+
+    def date_range(alias):
+        cond, args = [], []
+        if since and "snapshot_date" in src_names:
+            cond.append(f"{alias}.snapshot_date >= ?")
+            args.append(since)
+        if until and "snapshot_date" in src_names:
+            cond.append(f"{alias}.snapshot_date <= ?")
+            args.append(until)
+        return cond, args
+
+    where, params = date_range("s")
+
+    # Конфликт по PK, сравнен с IS, за да хване и NULL subcategory (UNIQUE не го засича)
+    same_key = " AND ".join(f"t.{_q(c)} IS s.{_q(c)}" for c in key)
+    clash = f"SELECT 1 FROM src.{_q(table)} s WHERE {same_key}{''.join(' AND ' + w for w in where)}"
+    if key and policy in ("replace", "abort"):
+        # кандидатите в целта: само датите, които източникът носи (range по PK вместо пълен scan)
+        t_where, t_params = date_range("t")
+        if "snapshot_date" in key:
+            t_where.append(f"t.snapshot_date IN (SELECT DISTINCT snapshot_date FROM src.{_q(table)})")
+        t_filter = "".join(w + " AND " for w in t_where)
+        if policy == "replace":
+            conn.execute(f"DELETE FROM main.{_q(table)} AS t WHERE {t_filter}EXISTS ({clash})", t_params + params)
+        elif conn.execute(f"SELECT 1 FROM main.{_q(table)} AS t WHERE {t_filter}EXISTS ({clash}) LIMIT 1",
+                          t_params + params).fetchone():
+            raise sqlite3.IntegrityError(f"{table}: rows already present in target (--on-conflict abort)")
+    if key and policy == "ignore":
+        where.append(f"NOT EXISTS (SELECT 1 FROM main.{_q(table)} t WHERE {same_key})")
+
+    col_list = ", ".join(_q(c) for c in cols)
+    verb = "INSERT OR ABORT" if policy == "abort" else "INSERT OR REPLACE" if policy == "replace" else "INSERT OR IGNORE"
+    cur = conn.execute(f"""
+        {verb} INTO main.{_q(table)} ({col_list})
+        SELECT {', '.join(exprs.values())} FROM src.{_q(table)} s
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+    """, params)
+    return cur.rowcount
+
+
+def merge_databases(out_db: str, sources: List[str], tables: List[str] = None, policy: str = "replace",
+                    since: Optional[str] = None, until: Optional[str] = None, derived: bool = True) -> dict:
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"policy must be one of {CONFLICT_POLICIES}")
+    tables = tables or ["charts"]
+    t_start = time.perf_counter()
+
+    conn = sqlite3.connect(out_db, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")
+    if "charts" in tables:
+        ensure_charts_table(conn)
+        ensure_dimensions(conn)
+
+    # целевата таблица трябва да съществува; ако я няма — копираме схемата от първия източник, който я има
+    for table in tables:
+        if _columns(conn, "main", table):
+            continue
+        for path in sources:
+            conn.execute("ATTACH DATABASE ? AS src", (path,))
+            ddl = conn.execute("SELECT sql FROM src.sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+            conn.execute("DETACH DATABASE src")
+            if ddl:
+                conn.execute(ddl[0])
+                break
+
+    saved_indexes = {t: _drop_secondary_indexes(conn, t) for t in tables}
+
+    report = {"sources": [], "rows": 0, "bytes": 0}
+    try:
+        for path in sources:
+            size = os.path.getsize(path)
+            t0 = time.perf_counter()
+            conn.execute("ATTACH DATABASE ? AS src", (path,))
+            try:
+                conn.execute("BEGIN")
+                n = sum(_merge_source(conn, t, policy, since, until) for t in tables)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("DETACH DATABASE src")
+            dt = time.perf_counter() - t0
+            report["sources"].append({"db": path, "rows": n, "seconds": round(dt, 3)})
+            report["rows"] += n
+            report["bytes"] += size
+            print(f"📦 {os.path.basename(path)}: {n} реда за {dt:.2f}s "
+                  f"({n / dt if dt else 0:,.0f} реда/s, {size / 2**20 / dt if dt else 0:,.1f} MB/s)")
+    finally:
+        # индексите се строят веднъж, след всички източници
+        t0 = time.perf_counter()
+        for ddls in saved_indexes.values():
+            for ddl in ddls:
+                conn.execute(ddl)
+        report["index_seconds"] = round(time.perf_counter() - t0, 3)
+
+    total = time.perf_counter() - t_start
+    report["seconds"] = round(total, 3)
+    print(f"✅ Merged {len(sources)} DB -> {out_db}: {report['rows']} реда, "
+          f"{report['bytes'] / 2**20:,.1f} MB входни данни за {total:.2f}s "
+          f"({report['rows'] / total:,.0f} реда/s, {report['bytes'] / 2**20 / total:,.1f} MB/s), "
+          f"индекси {report['index_seconds']}s")
+
+    if derived and "charts" in tables:
+        from post_scrape import refresh_derived
+        refresh_derived(conn, None)
+
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.close()
+    return report
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Merge any number of app_data.db files into one")
+    p.add_argument("sources", nargs="+", help="Source DBs, applied in this order")
+    p.add_argument("--out", required=True, help="Target DB (created if missing)")
+    p.add_argument("--since", help="First snapshot_date to copy (YYYY-MM-DD)")
+    p.add_argument("--until", help="Last snapshot_date to copy (YYYY-MM-DD)")
+    p.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="replace",
+                   help="replace: later source wins; ignore: keep existing; abort: fail on duplicates")
+    p.add_argument("--table", action="append", dest="tables", help="Table to merge (default: charts)")
+    p.add_argument("--no-derived", action="store_true", help="Skip rebuilding search index / history events")
+    a = p.parse_args()
+
+    if os.path.abspath(a.out) in {os.path.abspath(s) for s in a.sources}:
+        sys.exit("❌ --out must not be one of the sources")
+    merge_databases(a.out, a.sources, a.tables, a.on_conflict, a.since, a.until, derived=not a.no_derived)
@@ -0,0 +1,286 @@
+# scraper/migrations.py
+# Версионирани миграции на схемата на app_data.db. Всички входни точки (скрейперите през
+# ensure_charts_table, API-то, init_db скриптовете, merge_db) викат migrate(conn): приложените версии са в
+# schema_version, така че при актуална база това е една заявка.
+# Всяка миграция е идемпотентна — сама проверява какво има в базата. Затова прекъсната миграция, пусната
+# отново, продължава оттам, докъдето е стигнала. Таблица, която се различава от каноничната само по липсващи
+# колони, получава ALTER TABLE ADD COLUMN. Друг ключ, стари или преименувани колони -> copy-and-swap: нова
+# таблица, редовете се копират на порции по rowid (всяка порция е отделна транзакция; напредъкът е в
+# schema_migration_progress), накрая в една транзакция старата се трие и новата заема името ѝ.
+#   python scraper/migrations.py [path/to/app_data.db]
+import os, sys, time, sqlite3
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple, Optional, Any
+from chart_schema import (CHARTS_COLUMNS, CHARTS_KEY, CHARTS_RENAMES, CHARTS_DROPPED, CHARTS_DDL_TEMPLATE,
+                          LEGACY_CHARTS_INDEXES, CHARTS_VIEWS)
+from file_lock import file_lock
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "..", "appstore-api", "data", "app_data.db")
+
+MIGRATE_BATCH_ROWS = int(os.environ.get("MIGRATE_BATCH_ROWS", 250_000))
+MIGRATE_VACUUM = os.environ.get("MIGRATE_VACUUM", "1") != "0"  # след преписана таблица файлът е ~2x
+MIGRATE_CACHE_KB = 262144  # page cache по време на преписването (PK индексът на новата таблица)
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY, name TEXT, applied_at TEXT, seconds REAL
+    )
+"""
+PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migration_progress (
+        tbl TEXT PRIMARY KEY, last_rowid INTEGER, rows INTEGER
+    )
+"""
+
+
+class TableSpec:
+    """Каноничният вид на таблица: DDL шаблон ({table}), колони -> тип, ключ, преименувани и махнати колони."""
+
+    def __init__(self, name: str, template: str, columns: Dict[str, str], key: Tuple[str, ...],
+                 renames: Optional[Dict[str, str]] = None, dropped: Tuple[str, ...] = ()):
+        self.name, self.template, self.columns, self.key = name, template, columns, key
+        self.renames, self.dropped = renames or {}, dropped
+
+
+CHARTS = TableSpec("charts", CHARTS_DDL_TEMPLATE, CHARTS_COLUMNS, CHARTS_KEY, CHARTS_RENAMES, CHARTS_DROPPED)
+
+# Старите таблици на API-то (попълват се при първи старт от populate_derived_tables). Каноничен е
+# вариантът от main.py; utils/init_db.py имаше други ключове и имена на колони.
+APPS = TableSpec("apps", """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        app_id TEXT, name TEXT, developer TEXT, price TEXT, url TEXT
+    )
+""", {"id": "INTEGER", "app_id": "TEXT", "name": "TEXT", "developer": "TEXT", "price": "TEXT", "url": "TEXT"},
+    ("id",))
+SNAPSHOTS = TableSpec("snapshots", """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        snapshot_date TEXT, country TEXT, category TEXT, subcategory TEXT, data TEXT
+    )
+""", {"id": "INTEGER", "snapshot_date": "TEXT", "country": "TEXT", "category": "TEXT", "subcategory": "TEXT",
+      "data": "TEXT"}, ("id",), dropped=("created_at",))
+COMPARE_RESULTS = TableSpec("compare_results", """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        snapshot_date TEXT, country TEXT, app_id TEXT, app_name TEXT, developer TEXT,
+        category TEXT, subcategory TEXT, rank_now INTEGER, rank_prev INTEGER, rank_change INTEGER, status TEXT
+    )
+""", {"id": "INTEGER", "snapshot_date": "TEXT", "country": "TEXT", "app_id": "TEXT", "app_name": "TEXT",
+      "developer": "TEXT", "category": "TEXT", "subcategory": "TEXT", "rank_now": "INTEGER",
+      "rank_prev": "INTEGER", "rank_change": "INTEGER", "status": "TEXT"}, ("id",),
+    renames={"current_rank": "rank_now", "previous_rank": "rank_prev", "delta": "rank_change"},
+    dropped=("chart_type",))
+
+
+def _table_info(conn: sqlite3.Connection, table: str) -> list:
+    return conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+
+
+def _begin(conn: sqlite3.Connection):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+
+
+def rebuild_table(conn: sqlite3.Connection, spec: TableSpec, exprs: Dict[str, str],
+                  extra: Optional[Dict[str, str]] = None, batch: Optional[int] = None) -> int:
+    """
+    Copy-and-swap към spec (+ extra колони -> тип, които се пазят). exprs: колона на новата таблица ->
+    SQL израз върху старата. Порциите вървят по rowid във възходящ ред, така че при дублиран ключ печели
+    по-късно записаният ред, както при скрейперите: INSERT OR REPLACE хваща дубликатите без NULL в ключа,
+    а dedupe_rows преди размяната — тези с NULL (subcategory на приложенията). Връща броя копирани редове.
+    """
+    table, new = spec.name, f"{spec.name}__new"
+    batch = batch or MIGRATE_BATCH_ROWS
+    conn.execute(PROGRESS_DDL)
+    row = conn.execute("SELECT last_rowid, rows FROM schema_migration_progress WHERE tbl=?", (table,)).fetchone()
+    if row is None:  # начало (или остатък от миграция без запис за напредък)
+        conn.execute(f"DROP TABLE IF EXISTS {new}")
+        conn.execute(spec.template.format(table=new))
+        for c, t in (extra or {}).items():
+            conn.execute(f'ALTER TABLE {new} ADD COLUMN "{c}" {t}')
+        last, copied = conn.execute(f"SELECT MIN(rowid) - 1 FROM {table}").fetchone()[0] or 0, 0
+    else:
+        last, copied = row
+        print(f"[MIGRATE] {table}: resuming after rowid {last} ({copied} rows already copied)")
+    top = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+
+    cols, select = ", ".join(exprs), ", ".join(exprs.values())
+    cache = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.execute(f"PRAGMA cache_size=-{MIGRATE_CACHE_KB}")
+    t0 = time.perf_counter()
+    try:
+        while last < top:
+            hi = last + batch
+            _begin(conn)
+            copied += conn.execute(f"INSERT OR REPLACE INTO {new} ({cols}) SELECT {select} FROM {table} "
+                                   f"WHERE rowid > ? AND rowid <= ? ORDER BY rowid", (last, hi)).rowcount
+            conn.execute("INSERT OR REPLACE INTO schema_migration_progress (tbl, last_rowid, rows) VALUES (?,?,?)",
+                         (table, hi, copied))
+            conn.execute("COMMIT")
+            last = hi
+            if top > batch:
+                print(f"[MIGRATE] {table}: {copied} rows, {min(last, top) * 100 // top}% "
+                      f"({time.perf_counter() - t0:.1f}s)")
+
+        # размяната: изгледите се пресъздават, защото RENAME отказва, докато изглед сочи към липсваща таблица
+        _begin(conn)
+        copied -= dedupe_rows(conn, new, spec.key)
+        views = conn.execute("SELECT name, sql FROM main.sqlite_master WHERE type='view'").fetchall()
+        for name, _ in views:
+            conn.execute(f'DROP VIEW main."{name}"')
+        conn.execute(f"DROP TABLE {table}")  # индексите и тригерите ѝ изчезват с нея
+        conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        for _, sql in views:
+            conn.execute(sql)
+        conn.execute("DELETE FROM schema_migration_progress WHERE tbl=?", (table,))
+        if not conn.execute("SELECT 1 FROM schema_migration_progress").fetchone():
+            conn.execute("DROP TABLE schema_migration_progress")
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute(f"PRAGMA cache_size={cache}")
+    return copied
+
+
+def dedupe_rows(conn: sqlite3.Connection, table: str, key: Tuple[str, ...]) -> int:
+    """
+    Маха повторенията на ключ с NULL в някоя колона (UNIQUE/PK в SQLite ги смята за различни); остава
+    последно записаният ред (най-голям rowid). GROUP BY слага NULL-ите в една група. Без commit.
+    """
+    if len(key) < 2:
+        return 0
+    has_null = " OR ".join(f"{c} IS NULL" for c in key)
+    return conn.execute(f"""
+        DELETE FROM {table} WHERE ({has_null}) AND rowid NOT IN (
+            SELECT MAX(rowid) FROM {table} WHERE {has_null} GROUP BY {', '.join(key)})
+    """).rowcount
+
+
+def conform_table(conn: sqlite3.Connection, spec: TableSpec) -> str:
+    """Създава таблицата, добавя липсващите колони или я преписва (copy-and-swap) към spec."""
+    info = _table_info(conn, spec.name)
+    if not info:
+        conn.execute(spec.template.format(table=spec.name))
+        return "created"
+    have = {r[1]: r[2] for r in info}
+    key = tuple(r[1] for r in sorted(info, key=lambda r: r[5]) if r[5] > 0)
+    stale = [c for c in have if c in spec.renames or c in spec.dropped]
+    # непознатите колони (напр. добавени от merge_db) се пазят и при двата пътя
+    extra = {c: t for c, t in have.items() if c not in spec.columns and c not in stale}
+
+    if key == spec.key and not stale:
+        missing = [c for c in spec.columns if c not in have]
+        for c in missing:
+            print(f"[MIGRATE] {spec.name}: adding column {c}")
+            conn.execute(f"ALTER TABLE {spec.name} ADD COLUMN {c} {spec.columns[c]}")
+        # ключът е каноничен, но скрейперите са трупали повторения с NULL subcategory (PK не ги хваща)
+        dupes = dedupe_rows(conn, spec.name, spec.key)
+        conn.commit()
+        done = [f"added {', '.join(missing)}"] if missing else []
+        done += [f"{dupes} duplicate rows with NULL key columns removed"] if dupes else []
+        return "; ".join(done) or "already canonical"
+
+    # колона на новата таблица <- същата колона и/или старото ѝ име (първата ненулева стойност)
+    exprs = {}
+    for col in list(spec.columns) + list(extra):
+        if col == "id" and key != ("id",):
+            continue  # старият ключ не е id -> AUTOINCREMENT номерира наново
+        sources = [c for c in [col, *(old for old, new in spec.renames.items() if new == col)] if c in have]
+        if sources:
+            exprs[col] = sources[0] if len(sources) == 1 else f"COALESCE({', '.join(sources)})"
+    print(f"[MIGRATE] {spec.name}: rewriting (key {key or '-'} -> {spec.key}, "
+          f"old columns {', '.join(stale) or '-'})")
+    n = rebuild_table(conn, spec, exprs, extra)
+    return f"rewritten, {n} rows"
+
+
+def _charts_table(conn: sqlite3.Connection) -> str:
+    return conform_table(conn, CHARTS)
+
+
+def _charts_indexes(conn: sqlite3.Connection) -> str:
+    dropped = []
+    for name in LEGACY_CHARTS_INDEXES:
+        if conn.execute("SELECT 1 FROM main.sqlite_master WHERE type='index' AND name=?", (name,)).fetchone():
+            conn.execute(f"DROP INDEX main.{name}")
+            dropped.append(name)
+    for ddl in CHARTS_VIEWS:
+        conn.execute(ddl)
+    conn.commit()
+    return f"dropped {', '.join(dropped)}" if dropped else "no legacy indexes"
+
+
+def _api_tables(conn: sqlite3.Connection) -> str:
+    return "; ".join(f"{s.name}: {conform_table(conn, s)}" for s in (APPS, SNAPSHOTS, COMPARE_RESULTS))
+
+
+# (версия, описание, функция) — само се добавя в края; приложените версии не се променят
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], str]]] = [
+    (1, "canonical charts table (composite key, developer_name, URL columns)", _charts_table),
+    (2, "charts: drop legacy secondary indexes, add v_current_top50 / v_last7", _charts_indexes),
+    (3, "API side tables (apps, snapshots, compare_results)", _api_tables),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE name='schema_version'").fetchone():
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def _db_file(conn: sqlite3.Connection) -> Optional[str]:
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == "main":
+            return path or None  # '' за :memory:
+    return None
+
+
+def migrate(conn: sqlite3.Connection, target: int = SCHEMA_VERSION) -> List[Dict[str, Any]]:
+    """
+    Прилага неприложените миграции до target и връща какво е направено. Ако има charts за преписване,
+    работи под файлов lock до базата — друг процес (worker, скрейпър) чака и после вижда готовата версия.
+    """
+    if current_version(conn) >= target:
+        return []
+    path = _db_file(conn)
+    has_data = conn.execute("SELECT 1 FROM main.sqlite_master WHERE name='charts'").fetchone()
+    lock = file_lock(path + ".migrate.lock") if path and has_data else nullcontext(0.0)
+    applied = []
+    with lock:
+        conn.execute(SCHEMA_VERSION_DDL)
+        done = {r[0] for r in conn.execute("SELECT version FROM schema_version")}
+        for version, name, fn in MIGRATIONS:
+            if version in done or version > target:
+                continue
+            t0 = time.perf_counter()
+            result = fn(conn)
+            dt = time.perf_counter() - t0
+            conn.execute("INSERT OR IGNORE INTO schema_version (version, name, applied_at, seconds) "
+                         "VALUES (?, ?, datetime('now'), ?)", (version, name, round(dt, 3)))
+            conn.commit()
+            if has_data:
+                print(f"[MIGRATE] v{version} {name}: {result} ({dt:.2f}s)")
+            applied.append({"version": version, "name": name, "result": result, "seconds": round(dt, 3)})
+        # страниците на старата таблица остават свободни във файла; базата се качва в Drive -> VACUUM веднъж
+        if MIGRATE_VACUUM and any("rewritten" in a["result"] for a in applied):
+            t0 = time.perf_counter()
+            conn.commit()
+            conn.execute("VACUUM")
+            print(f"[MIGRATE] VACUUM after table rewrite ({time.perf_counter() - t0:.1f}s)")
+    return applied
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    conn = sqlite3.connect(path)
+    before = current_version(conn)
+    applied = migrate(conn)
+    print(f"✅ {path}: schema version {before} -> {current_version(conn)} ({len(applied)} migrations applied)")
+    conn.close()
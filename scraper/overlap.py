@@ -0,0 +1,180 @@
+# scraper/overlap.py
+# Припокриване на класациите между държавите: топ OVERLAP_DEPTH на всеки (ден, контекст) е bitset
+# (BLOB, little-endian) над речника overlap_apps. Речникът е по жанр (chart_type, category, subcategory),
+# не един общ: сравняват се само класации от един жанр, а общ речник би направил всеки bitset широк
+# колкото всички приложения във всички жанрове. Новите приложения получават следващия бит, старите
+# bitset-и не се пренаписват (по-късите се допълват с нули при четене).
+# Jaccard, „само в X“ и „във всички“ са побитови операции; матрицата държава x държава се смята с
+# numpy (np.bitwise_count — NumPy 2.0+, затова numpy>=2.0 в requirements) на парчета от дни.
+import sqlite3
+from typing import Optional, List, Dict, Tuple
+import numpy as np
+from dimensions import ensure_dimensions, day_number
+
+OVERLAP_DEPTH = 50
+# горна граница на елементите (дни x държави x държави x думи) в едно парче на матрицата
+_CHUNK = 1 << 22
+
+OVERLAP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS overlap_genres (
+        genre_id INTEGER PRIMARY KEY,
+        chart_type TEXT, category TEXT, subcategory TEXT
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_overlap_genres ON overlap_genres "
+    "(chart_type, category, IFNULL(subcategory, ''))",
+    """
+    CREATE TABLE IF NOT EXISTS overlap_apps (
+        genre_id INTEGER, app_id INTEGER, bit INTEGER,
+        PRIMARY KEY (genre_id, app_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chart_bitsets (
+        genre_id INTEGER, day INTEGER, ctx_id INTEGER, bits BLOB,
+        PRIMARY KEY (genre_id, day, ctx_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_chart_bitsets_day ON chart_bitsets (day)",
+]
+
+
+def ensure_overlap(conn: sqlite3.Connection):
+    for ddl in OVERLAP_DDL:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def _genre_of(conn: sqlite3.Connection) -> Dict[int, int]:
+    conn.execute("""
+        INSERT OR IGNORE INTO overlap_genres (chart_type, category, subcategory)
+        SELECT DISTINCT chart_type, category, subcategory FROM dim_context
+    """)
+    return dict(conn.execute("""
+        SELECT x.ctx_id, g.genre_id FROM dim_context x
+        JOIN overlap_genres g
+          ON g.chart_type IS x.chart_type AND g.category IS x.category
+         AND IFNULL(g.subcategory, '') = IFNULL(x.subcategory, '')
+    """).fetchall())
+
+
+def refresh_overlap(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Презаписва bitset-ите на деня от chart_ranks (или на всички дни в chart_ranks при None).
+    Дните, архивирани вече от retention.py, остават. Връща броя записани bitset-и.
+    """
+    ensure_dimensions(conn)
+    ensure_overlap(conn)
+    genre_of = _genre_of(conn)
+    bits: Dict[Tuple[int, int], int] = {}
+    next_bit: Dict[int, int] = {}
+    for genre_id, app_id, bit in conn.execute("SELECT genre_id, app_id, bit FROM overlap_apps"):
+        bits[genre_id, app_id] = bit
+        next_bit[genre_id] = max(next_bit.get(genre_id, 0), bit + 1)
+
+    if snapshot_date:
+        days = [day_number(snapshot_date)]
+    else:
+        days = [r[0] for r in conn.execute("SELECT DISTINCT day FROM chart_ranks ORDER BY day")]
+    n = 0
+    for day in days:
+        conn.execute("DELETE FROM chart_bitsets WHERE day=?", (day,))
+        sets: Dict[int, int] = {}
+        new = []
+        for ctx_id, app_id in conn.execute(
+            "SELECT ctx_id, app_id FROM chart_ranks WHERE day=? AND rank <= ? ORDER BY ctx_id, rank",
+            (day, OVERLAP_DEPTH),
+        ):
+            genre_id = genre_of[ctx_id]
+            bit = bits.get((genre_id, app_id))
+            if bit is None:
+                bit = bits[genre_id, app_id] = next_bit.get(genre_id, 0)
+                next_bit[genre_id] = bit + 1
+                new.append((genre_id, app_id, bit))
+            sets[ctx_id] = sets.get(ctx_id, 0) | (1 << bit)
+        conn.executemany("INSERT INTO overlap_apps VALUES (?, ?, ?)", new)
+        conn.executemany("INSERT INTO chart_bitsets VALUES (?, ?, ?, ?)", [
+            (genre_of[ctx_id], day, ctx_id, s.to_bytes((s.bit_length() + 7) // 8, "little"))
+            for ctx_id, s in sets.items()
+        ])
+        n += len(sets)
+    conn.commit()
+    return n
+
+
+def genres(conn: sqlite3.Connection, chart_type: str = "top_free", category: Optional[str] = None,
+           subcategory: Optional[str] = None) -> List[sqlite3.Row]:
+    """(genre_id, category, subcategory) за филтрите на API-то (None / "all" = без филтър)."""
+    parts, params = ["chart_type=?"], [chart_type]
+    for col, val in (("category", category), ("subcategory", subcategory)):
+        if val and val != "all":
+            parts.append(f"{col}=?")
+            params.append(val)
+    return conn.execute(
+        f"SELECT genre_id, category, subcategory FROM overlap_genres WHERE {' AND '.join(parts)} "
+        "ORDER BY category, subcategory", params).fetchall()
+
+
+def _country_of(conn: sqlite3.Connection, countries: List[str]) -> Dict[int, str]:
+    return dict(conn.execute(
+        f"SELECT ctx_id, country FROM dim_context WHERE country IN ({','.join(['?'] * len(countries))})",
+        countries).fetchall())
+
+
+def day_sets(conn: sqlite3.Connection, genre_id: int, countries: List[str], day: int) -> Dict[str, int]:
+    """Bitset-ите на жанра за деня като int по държава (само държавите с класация в деня)."""
+    country_of = _country_of(conn, countries)
+    rows = conn.execute("SELECT ctx_id, bits FROM chart_bitsets WHERE genre_id=? AND day=?", (genre_id, day))
+    return {country_of[ctx_id]: int.from_bytes(bits, "little") for ctx_id, bits in rows if ctx_id in country_of}
+
+
+def app_ids(conn: sqlite3.Connection, genre_id: int, sets: Dict[str, int]) -> Dict[str, List[int]]:
+    """app_id-тата на битовете във всеки от sets (една заявка за всички)."""
+    bits_of: Dict[str, List[int]] = {}
+    for key, s in sets.items():
+        bits_of[key] = []
+        while s:
+            low = s & -s
+            bits_of[key].append(low.bit_length() - 1)
+            s ^= low
+    want = sorted({b for bits in bits_of.values() for b in bits})
+    app_of = dict(conn.execute(
+        f"SELECT bit, app_id FROM overlap_apps WHERE genre_id=? AND bit IN ({','.join(map(str, want))})",
+        (genre_id,)).fetchall()) if want else {}
+    return {key: [app_of[b] for b in bits] for key, bits in bits_of.items()}
+
+
+def jaccard_matrix(conn: sqlite3.Connection, genre_ids: List[int], countries: List[str],
+                   lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Сума на Jaccard по (ден, жанр) за всяка двойка държави и броят двойки класации, в които и двете
+    държави имат класация. Средното е sums / counts.
+    """
+    col = {c: i for i, c in enumerate(countries)}
+    col_of = {ctx_id: col[country] for ctx_id, country in _country_of(conn, countries).items()}
+    k = len(countries)
+    sums, counts = np.zeros((k, k)), np.zeros((k, k), dtype=np.int64)
+    for genre_id in genre_ids:
+        rows = [r for r in conn.execute(
+            "SELECT day, ctx_id, bits FROM chart_bitsets WHERE genre_id=? AND day BETWEEN ? AND ?",
+            (genre_id, lo, hi)) if r[1] in col_of]
+        if not rows:
+            continue
+        days = {d: i for i, d in enumerate(sorted({r[0] for r in rows}))}
+        width = (max(len(r[2]) for r in rows) + 7) // 8 * 8
+        buf = bytearray(len(days) * k * width)
+        for day, ctx_id, bits in rows:
+            at = (days[day] * k + col_of[ctx_id]) * width
+            buf[at:at + len(bits)] = bits
+        x = np.frombuffer(buf, dtype=np.uint64).reshape(len(days), k, width // 8)
+        size = np.bitwise_count(x).sum(-1, dtype=np.int64)
+        step = max(1, _CHUNK // (k * k * x.shape[-1]))
+        for i in range(0, len(days), step):
+            part, n = x[i:i + step], size[i:i + step]
+            inter = np.bitwise_count(part[:, :, None, :] & part[:, None, :, :]).sum(-1, dtype=np.int64)
+            union = n[:, :, None] + n[:, None, :] - inter
+            both = (n[:, :, None] > 0) & (n[:, None, :] > 0)
+            sums += np.where(both, inter / np.maximum(union, 1), 0.0).sum(0)
+            counts += both.sum(0)
+    return sums, counts
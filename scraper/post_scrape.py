@@ -0,0 +1,46 @@
+# scraper/post_scrape.py
+# Производни таблици/индекси, които се поддържат инкрементално след всеки скрейп.
+# Викa се от scraper_apps.py / scraper_games.py в края на run-а; може и ръчно:
+#   python scraper/post_scrape.py [YYYY-MM-DD]
+import os, sys, sqlite3
+from datetime import datetime
+from typing import Optional
+from search_index import sync_search_index
+from dimensions import refresh_chart_ranks
+from history_events import refresh_history_events
+from rollups import refresh_rollups
+from app_metadata import refresh_app_metadata
+from trends import refresh_trends
+from developers import refresh_developers
+from overlap import refresh_overlap
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "..", "appstore-api", "data", "app_data.db")
+
+
+def refresh_derived(conn: sqlite3.Connection, snapshot_date: Optional[str]):
+    """snapshot_date=None -> пълно преизчисляване (напр. след merge_db.py)."""
+    label = snapshot_date or "all dates"
+    n = refresh_chart_ranks(conn, snapshot_date)
+    print(f"[DERIVED] chart ranks: {n} rows for {label}")
+    n = sync_search_index(conn, snapshot_date)
+    print(f"[DERIVED] search index: {n} apps updated for {label}")
+    n = refresh_history_events(conn, snapshot_date)
+    print(f"[DERIVED] history events: {n} for {label}")
+    n = refresh_app_metadata(conn, snapshot_date)
+    print(f"[DERIVED] app metadata: {n} changed versions for {label}")
+    n = refresh_rollups(conn, snapshot_date)
+    print(f"[DERIVED] rollups: {n} rows for {label}")
+    n = refresh_trends(conn, snapshot_date)
+    print(f"[DERIVED] trends: {n} rows for {label}")
+    n = refresh_developers(conn, snapshot_date)
+    print(f"[DERIVED] developers: {n} rows for {label}")
+    n = refresh_overlap(conn, snapshot_date)
+    print(f"[DERIVED] overlap: {n} bitsets for {label}")
+
+
+if __name__ == "__main__":
+    snap = sys.argv[1] if len(sys.argv) > 1 else datetime.utcnow().date().isoformat()
+    conn = sqlite3.connect(DB_PATH)
+    refresh_derived(conn, snap)
+    conn.close()
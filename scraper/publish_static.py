@@ -0,0 +1,208 @@
+# scraper/publish_static.py
+# Статичен снапшот на API-то след скрейпа: /meta, /compare, /weekly/insights и /history за всяка
+# комбинация държава x категория x подкатегория от каталога, като JSON (всички страници в един файл)
+# и CSV. До всеки файл има .gz (gzip_static / предварително компресирани файлове на статичния хост).
+# manifest.json в корена сочи текущия снапшот и пътищата по комбинация; подменя се атомарно, след като
+# всички файлове са записани. Рендерът е в пул от процеси — всеки импортира API-то веднъж срещу същата
+# база, така че файловете са байт в байт това, което връщат живите маршрути. UI-то чете от
+# VITE_STATIC_URL и пада към API-то само ако снапшотът липсва.
+import os, re, sys, gzip, time, shutil, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(BASE_DIR, "..", "appstore-api")
+DB_PATH = os.environ.get("DB_PATH") or os.path.join(API_DIR, "data", "app_data.db")
+STATIC_DIR = os.environ.get("STATIC_DIR") or os.path.join(API_DIR, "data", "static")
+STATIC_WORKERS = int(os.environ.get("STATIC_WORKERS", 0)) or os.cpu_count() or 1
+STATIC_KEEP = 2  # снапшоти на диска (текущият + предишният, докато кешовете на клиентите изтекат)
+LOOKBACK_DAYS = 7
+
+_api = None
+
+
+def _load_api(db_path: str):
+    """Импортира appstore-api/main.py срещу db_path (веднъж на процес)."""
+    global _api
+    if _api is None:
+        os.environ["DB_PATH"] = os.path.abspath(db_path)
+        # рендерът чете всичко по веднъж: без реплика в паметта и без общ кеш с отговори (и без SQLite
+        # връзки, наследени през fork в пула)
+        os.environ.setdefault("HOT_REPLICA", "0")
+        os.environ.setdefault("RESPONSE_CACHE_SHARED", "0")
+        sys.path.insert(0, os.path.abspath(API_DIR))
+        import main
+        _api = main
+    return _api
+
+
+def slug(value: Optional[str]) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") if value else "all"
+
+
+def _payload(resp) -> Dict[str, Any]:
+    from json_codec import loads
+    return loads(resp.body) if hasattr(resp, "body") else resp
+
+
+def _csv(resp) -> bytes:
+    """Тялото на CSV отговор; маршрутите връщат JSON съобщение вместо CSV, ако няма данни."""
+    return resp.body if hasattr(resp, "body") else b""
+
+
+def _all_pages(route, key: str, **kw) -> Dict[str, Any]:
+    """Следва next_cursor до края с максималната страница; резултатът е един отговор с всички редове."""
+    out = _payload(route(cursor=None, limit=_api.MAX_PAGE_SIZE, **kw))
+    nxt = out.get("next_cursor")
+    while nxt:
+        page = _payload(route(cursor=nxt, limit=_api.MAX_PAGE_SIZE, **kw))
+        out[key].extend(page[key])
+        nxt = page.get("next_cursor")
+    if "next_cursor" in out:
+        out["next_cursor"] = None
+    return out
+
+
+def _write(root: str, rel: str, body: bytes) -> Tuple[str, Dict[str, Any]]:
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(body)
+    gz = gzip.compress(body, compresslevel=9, mtime=0)  # mtime=0 -> еднакви байтове при еднакви данни
+    with open(path + ".gz", "wb") as f:
+        f.write(gz)
+    return rel, {"bytes": len(body), "gz_bytes": len(gz), "sha256": hashlib.sha256(body).hexdigest()}
+
+
+def render_combo(root: str, country: str, category: Optional[str],
+                 subcategory: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Файловете на една комбинация: compare / weekly / history като .json и .csv."""
+    api = _api
+    from json_codec import dumps_bytes
+    base = f"{country}/{slug(category)}/{slug(subcategory)}"
+    f = {"country": country, "category": category, "subcategory": subcategory}
+
+    compare = _all_pages(api.compare_alias, "results", format=None, **f)
+    compare_csv = _csv(api.compare_alias(limit=api.MAX_PAGE_SIZE, format="csv", cursor=None, **f))
+    weekly = _all_pages(api.weekly_insights, "rows", lookback_days=LOOKBACK_DAYS, status=None, format=None, **f)
+    weekly_csv = _csv(api.weekly_insights(lookback_days=LOOKBACK_DAYS, status=None, format="csv",
+                                          limit=api.MAX_PAGE_SIZE, cursor=None, **f))
+    history = _all_pages(api.history_view, "results", lookback_days=LOOKBACK_DAYS, date=None, status=None,
+                         export=None, **f)
+    if "total_events" in history:
+        history["total_events"] = len(history["results"])
+    history_csv = _csv(api.history_view(lookback_days=LOOKBACK_DAYS, date=None, status=None, export="csv",
+                                        limit=api.MAX_PAGE_SIZE, cursor=None, **f))
+
+    files = {}
+    for name, body in (("compare.json", dumps_bytes(compare)), ("compare.csv", compare_csv),
+                       ("weekly.json", dumps_bytes(weekly)), ("weekly.csv", weekly_csv),
+                       ("history.json", dumps_bytes(history)), ("history.csv", history_csv)):
+        rel, info = _write(root, f"{base}/{name}", body)
+        files[rel] = info
+    return files
+
+
+def _render_chunk(args) -> Dict[str, Dict[str, Any]]:
+    root, combos = args
+    files = {}
+    for country, category, subcategory in combos:
+        files.update(render_combo(root, country, category, subcategory))
+    return files
+
+
+def combos(db_path: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """Държава x (всички / категория / категория + подкатегория) по каталога на базата."""
+    api = _load_api(db_path)
+    out = set()
+    for r in api._meta_catalog():
+        if r["country"] is None:
+            continue
+        out.add((r["country"], None, None))
+        if r["category"] is not None:
+            out.add((r["country"], r["category"], None))
+            if r["subcategory"] is not None:
+                out.add((r["country"], r["category"], r["subcategory"]))
+    return sorted(out, key=lambda c: (c[0], c[1] or "", c[2] or ""))
+
+
+def publish(db_path: str = DB_PATH, out_dir: str = STATIC_DIR, workers: int = STATIC_WORKERS) -> Dict[str, Any]:
+    """Рендерира снапшота в out_dir/<snapshot>/ и подменя out_dir/manifest.json. Връща манифеста."""
+    from json_codec import dumps_bytes
+    t0 = time.perf_counter()
+    api = _load_api(db_path)
+    todo = combos(db_path)
+    meta = api._meta_payload()
+    snapshot = meta["last_date"]
+    if not snapshot:
+        raise RuntimeError("No snapshots in DB; nothing to publish.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    final = os.path.join(out_dir, snapshot)
+    root = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(root, ignore_errors=True)
+
+    files: Dict[str, Dict[str, Any]] = {}
+    rel, info = _write(root, "meta.json", dumps_bytes(meta))
+    files[rel] = info
+    meta_files = {"all": rel}
+    for category in meta["categories"]:
+        rel, info = _write(root, f"meta/{slug(category)}.json", dumps_bytes(api._meta_payload(category)))
+        files[rel] = info
+        meta_files[category] = rel
+
+    # парчета по държава-категория: горе-долу еднакви по работа и достатъчно, за да се балансира пулът
+    chunks: Dict[tuple, list] = {}
+    for c in todo:
+        chunks.setdefault(c[:2], []).append(c)
+    jobs = [(root, part) for part in chunks.values()]
+    if workers > 1:
+        # fork: работниците наследяват вече импортираното API (без втори bootstrap)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_api, initargs=(db_path,)) as pool:
+            for out in pool.map(_render_chunk, jobs):
+                files.update(out)
+    else:
+        for job in jobs:
+            files.update(_render_chunk(job))
+
+    views = {}
+    for country, category, subcategory in todo:
+        base = f"{country}/{slug(category)}/{slug(subcategory)}"
+        views[f"{country}|{category or 'all'}|{subcategory or 'all'}"] = base
+
+    if os.path.exists(final):
+        shutil.rmtree(final)
+    os.replace(root, final)
+
+    manifest = {
+        "snapshot": snapshot,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "base": snapshot,
+        "lookback_days": LOOKBACK_DAYS,
+        "meta": meta_files,
+        "views": views,
+        "files": dict(sorted(files.items())),
+    }
+    tmp = os.path.join(out_dir, f"manifest.json.tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(dumps_bytes(manifest))
+    os.replace(tmp, os.path.join(out_dir, "manifest.json"))  # четящите виждат стария или новия снапшот
+
+    snapshots = sorted(d for d in os.listdir(out_dir) if re.fullmatch(r"\d{4}-\d{2}-\d{2}", d))
+    for old in snapshots[:-STATIC_KEEP]:
+        shutil.rmtree(os.path.join(out_dir, old), ignore_errors=True)
+
+    took = time.perf_counter() - t0
+    print(f"[STATIC] {snapshot}: {len(todo)} views, {len(files)} files, "
+          f"{sum(x['bytes'] for x in files.values()) / 1e6:.1f} MB "
+          f"({sum(x['gz_bytes'] for x in files.values()) / 1e6:.1f} MB gz), {workers} worker(s), {took:.1f}s")
+    return manifest
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Render the API responses into static files")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--out", default=STATIC_DIR)
+    p.add_argument("--workers", type=int, default=STATIC_WORKERS)
+    a = p.parse_args()
+    publish(a.db, a.out, a.workers)
@@ -0,0 +1,164 @@
+# scraper/response_cache.py
+# Кеш на готовите отговори на API-то с компресираните им варианти до тях. Данните се менят само при
+# запис в базата (скрейп, /admin/refresh, ново сваляне от Drive), затова ключът е пътят + заявката, а
+# целият кеш се изчиства при смяна на stamp-а на базата (_db_stamp в main.py).
+# Компресията е по Accept-Encoding: brotli (ако пакетът е инсталиран), иначе gzip; отговорите под
+# COMPRESS_MIN_BYTES се пращат както са. Всеки вариант се компресира веднъж и се пази до тялото, така
+# че повторната заявка не плаща компресия. Размерът на кеша е ограничен (LRU по байтове).
+# При няколко worker-а под паметта стои общо ниво на диска (shared_cache.SharedResponseStore): тяло или
+# вариант, направен в един worker, се чете от останалите вместо да се рендерира/компресира отново.
+import os, gzip, time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # динамични отговори: ~gzip -9 по размер при по-малко CPU от по-високите нива
+COMPRESSIBLE = ("application/json", "text/")
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Най-добрият поддържан encoding от Accept-Encoding (q=0 забранява); None = без компресия."""
+    q: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name.strip()] = weight
+    best, best_q = None, 0.0
+    for enc in ENCODINGS:  # по предпочитание при равни тегла
+        weight = q.get(enc, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = enc, weight
+    return best
+
+
+class CachedResponse:
+    __slots__ = ("key", "body", "headers", "variants", "cached")
+
+    def __init__(self, key: str, body: bytes, headers: Dict[str, str]):
+        self.key, self.body, self.headers = key, body, headers
+        self.variants: Dict[str, bytes] = {}
+        self.cached = False
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+
+class ResponseCache:
+    """Отговорите за текущия stamp на базата; брояч на байтове и CPU за компресията."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, min_bytes: int = COMPRESS_MIN_BYTES,
+                 shared=None):
+        self.max_bytes, self.min_bytes, self.shared = max_bytes, min_bytes, shared
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.stamp: Any = None
+        self.bytes = 0
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evicted": 0, "compressions": 0, "compress_ms": 0.0,
+                      "bytes_raw": 0, "bytes_sent": 0}
+
+    def _check(self, stamp: Any):
+        if stamp != self.stamp:
+            for entry in self.entries.values():
+                entry.cached = False
+            self.entries.clear()
+            self.bytes, self.stamp = 0, stamp
+            if self.shared:
+                self.shared.prune(stamp)
+
+    def get(self, key: str, stamp: Any) -> Optional[CachedResponse]:
+        self._check(stamp)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+        found = self.shared.get(key, stamp) if self.shared else None
+        if found is None:
+            self.stats["misses"] += 1
+            return None
+        headers, body, variants = found
+        entry = CachedResponse(key, body, headers)
+        entry.variants.update(variants)
+        self._insert(entry)
+        self.stats["shared_hits"] += 1
+        return entry
+
+    def put(self, key: str, stamp: Any, body: bytes, headers: Dict[str, str]) -> CachedResponse:
+        self._check(stamp)
+        entry = CachedResponse(key, body, headers)
+        self._insert(entry)
+        if self.shared:
+            self.shared.put(key, stamp, "", body, headers)
+        return entry
+
+    def _insert(self, entry: CachedResponse):
+        key, body = entry.key, entry.body
+        if len(body) <= self.max_bytes // 8:  # огромните отговори не изместват целия кеш
+            old = self.entries.pop(key, None)
+            if old:
+                old.cached = False
+                self.bytes -= old.size
+            self.entries[key] = entry
+            entry.cached = True
+            self.bytes += entry.size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, old = self.entries.popitem(last=False)
+            old.cached = False
+            self.bytes -= old.size
+            self.stats["evicted"] += 1
+
+    def encoded(self, entry: CachedResponse, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+        """(encoding, тяло) за клиента; компресира при първата нужда и пази варианта в записа."""
+        enc = negotiate(accept_encoding) if len(entry.body) >= self.min_bytes else None
+        ctype = entry.headers.get("content-type", "")
+        if enc and not ctype.startswith(COMPRESSIBLE):
+            enc = None
+        data = entry.body
+        if enc:
+            data = entry.variants.get(enc)
+            if data is None:
+                t0 = time.perf_counter()
+                data = entry.variants[enc] = compress(entry.body, enc)
+                self.stats["compressions"] += 1
+                self.stats["compress_ms"] += (time.perf_counter() - t0) * 1000
+                if entry.cached:
+                    self.bytes += len(data)
+                    self._evict()
+                if self.shared:
+                    self.shared.put(entry.key, self.stamp, enc, data)
+        self.stats["bytes_raw"] += len(entry.body)
+        self.stats["bytes_sent"] += len(data)
+        return enc, data
+
+    def summary(self) -> Dict[str, Any]:
+        s = self.stats
+        looked = s["hits"] + s["shared_hits"] + s["misses"]
+        return {**s, "shared": self.shared.summary() if self.shared else None, "compress_ms": round(s["compress_ms"], 1), "encodings": list(ENCODINGS),
+                "hit_rate": round((s["hits"] + s["shared_hits"]) / looked, 4) if looked else None,
+                "wire_ratio": round(s["bytes_sent"] / s["bytes_raw"], 4) if s["bytes_raw"] else None,
+                "entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,277 @@
+# scraper/retention.py
+# Политика за съхранение на charts по възраст (спрямо последния snapshot), на три нива:
+#   1) последните --raw-days дни       -> пълни дневни редове + raw JSON
+#   2) до --daily-days дни назад        -> дневни рангове, raw = NULL, lookup полетата само в
+#                                          app_metadata_history (charts_wide ги връща)
+#   3) по-старите (цели месеци)         -> chart_rollups + архивни сегменти archive/charts_<от>_<до>.db
+# Последният ден преди границата остава в charts (без raw): от него зависят entry/exit на първия
+# запазен ден. От chart_ranks на архивираните месеци остава само archived_spans (първи/последен ден по
+# приложение и контекст) — за RE-ENTRY срещу NEW. Сегментите не се променят след запис (качват се в Drive до базата) и са обикновени
+# бази с таблица charts — връщат се обратно с merge_db.py.
+#   python scraper/retention.py                 # само план (какво ще се промени)
+#   python scraper/retention.py --apply         # прилага + incremental_vacuum
+#   python scraper/retention.py --apply --vacuum  # + пълен VACUUM
+import os, time, hashlib, sqlite3, argparse
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Any
+from chart_schema import ensure_charts_table
+from rollups import ensure_rollups, build_periods, range_stats, month_start, period_end
+from app_metadata import ensure_app_metadata, refresh_app_metadata, compact_chart_metadata
+from dimensions import ensure_dimensions, refresh_catalog, archive_ranks, seen_before_sql, day_number
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("DB_PATH") or os.path.join(BASE_DIR, "..", "appstore-api", "data", "app_data.db")
+ARCHIVE_DIR = os.path.join(os.path.dirname(DB_PATH), "archive")
+
+RAW_DAYS = 90
+DAILY_DAYS = 730
+
+
+def _shift(d: str, days: int) -> str:
+    return (date.fromisoformat(d) - timedelta(days=days)).isoformat()
+
+
+def plan_tiers(conn: sqlite3.Connection, raw_days: int = RAW_DAYS, daily_days: int = DAILY_DAYS) -> Optional[Dict[str, Any]]:
+    """Границите на нивата и колко редове/байта засяга всяко. None при празна база."""
+    lo, latest = conn.execute("SELECT MIN(snapshot_date), MAX(snapshot_date) FROM charts").fetchone()
+    if not latest:
+        return None
+    raw_cutoff = _shift(latest, raw_days - 1)              # raw се пази от тази дата нататък
+    archive_cutoff = month_start(_shift(latest, daily_days - 1))  # дневни редове от началото на този месец
+    keep_day = conn.execute("SELECT MAX(snapshot_date) FROM charts WHERE snapshot_date < ?", (archive_cutoff,)).fetchone()[0]
+    strip = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(raw)), 0) FROM charts "
+        "WHERE snapshot_date >= ? AND snapshot_date < ? AND raw IS NOT NULL",
+        (archive_cutoff, raw_cutoff),
+    ).fetchone()
+    months = [r[0] for r in conn.execute(
+        "SELECT DISTINCT substr(snapshot_date, 1, 7) FROM charts WHERE snapshot_date < ? ORDER BY 1",
+        (keep_day or lo,),
+    )]
+    archived = conn.execute("SELECT COUNT(*) FROM charts WHERE snapshot_date < ?", (keep_day or lo,)).fetchone()[0]
+    return {
+        "first": lo, "latest": latest, "raw_cutoff": raw_cutoff, "archive_cutoff": archive_cutoff,
+        "keep_day": keep_day,
+        "strip_rows": strip[0], "strip_bytes": strip[1],
+        "archive_months": months, "archive_rows": archived,
+    }
+
+
+# ----- ниво 2: без raw -----
+def strip_raw(conn: sqlite3.Connection, before: str) -> int:
+    cur = conn.execute("UPDATE charts SET raw = NULL WHERE snapshot_date < ? AND raw IS NOT NULL", (before,))
+    return cur.rowcount
+
+
+# ----- ниво 3: архивни сегменти -----
+def segment_path(first: str, last: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"charts_{first}_{last}.db")
+
+
+def archive_month(conn: sqlite3.Connection, month: str, before: str, archive_dir: str = ARCHIVE_DIR) -> int:
+    """
+    Премества дневните редове на месеца (YYYY-MM) отпреди `before` в нов сегмент.
+    Сегментът се комитва преди триенето; повторно пускане след прекъсване го презаписва.
+    """
+    lo, hi = f"{month}-01", min(period_end("month", f"{month}-01"), _shift(before, 1))
+    dates = [r[0] for r in conn.execute(
+        "SELECT DISTINCT snapshot_date FROM charts WHERE snapshot_date BETWEEN ? AND ? ORDER BY 1", (lo, hi))]
+    if not dates:
+        return 0
+    os.makedirs(archive_dir, exist_ok=True)
+    path = segment_path(dates[0], dates[-1], archive_dir)
+    seg = sqlite3.connect(path)
+    ensure_charts_table(seg)
+    have = {r[1] for r in seg.execute("PRAGMA table_info(charts)")}
+    cols = [r[1] for r in conn.execute("PRAGMA main.table_info(charts)")]
+    for c in cols:
+        if c not in have:
+            seg.execute(f'ALTER TABLE charts ADD COLUMN "{c}" TEXT')
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    with seg:
+        seg.execute("DELETE FROM charts")
+        seg.executemany(
+            f"INSERT INTO charts ({col_list}) VALUES ({','.join(['?'] * len(cols))})",
+            conn.execute(f"SELECT {col_list} FROM main.charts WHERE snapshot_date BETWEEN ? AND ?", (lo, hi)),
+        )
+    n = seg.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+    seg.close()
+
+    expected = conn.execute("SELECT COUNT(*) FROM charts WHERE snapshot_date BETWEEN ? AND ?", (lo, hi)).fetchone()[0]
+    if n != expected:
+        raise RuntimeError(f"segment {path}: {n} rows, expected {expected}")
+    conn.execute("DELETE FROM charts WHERE snapshot_date BETWEEN ? AND ?", (lo, hi))
+    archive_ranks(conn, lo, hi)  # обхватът на приложенията остава в archived_spans (RE-ENTRY срещу NEW)
+    return n
+
+
+# ----- компактиране -----
+def file_size(db_path: str) -> int:
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def compact(conn: sqlite3.Connection, full: bool = False) -> str:
+    """
+    Връща свободните страници на файловата система. Първият път (или с full=True) е пълен VACUUM,
+    който превключва базата на auto_vacuum=INCREMENTAL; после стига PRAGMA incremental_vacuum.
+    """
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if full or mode != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        how = "VACUUM"
+    else:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA incremental_vacuum").fetchall()  # освобождава по страница на стъпка
+        how = f"incremental_vacuum ({free} pages)"
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return how
+
+
+# ----- проверка: заявки в запазените прозорци дават същия резултат -----
+def _probes(tiers: Dict[str, Any]) -> List[tuple]:
+    latest, raw_cutoff, archive_cutoff = tiers["latest"], tiers["raw_cutoff"], tiers["archive_cutoff"]
+    return [
+        ("latest charts (US)", lambda c: c.execute("""
+            SELECT category, subcategory, rank, app_id, app_name FROM charts
+            WHERE snapshot_date=? AND country='US' AND chart_type='top_free'
+            ORDER BY category, subcategory, rank
+        """, (latest,)).fetchall()),
+        ("7-day compare (US)", lambda c: c.execute("""
+            SELECT app_id, category, subcategory, COUNT(*), MIN(rank), MAX(rank) FROM charts
+            WHERE snapshot_date >= date(?, '-6 day') AND country='US' AND chart_type='top_free'
+            GROUP BY app_id, category, subcategory ORDER BY 1, 2, 3
+        """, (latest,)).fetchall()),
+        ("raw window payloads", lambda c: c.execute("""
+            SELECT COUNT(*), SUM(length(raw)) FROM charts WHERE snapshot_date >= ?
+        """, (raw_cutoff,)).fetchall()),
+        ("daily window app history", lambda c: c.execute("""
+            SELECT app_id, snapshot_date, country, category, subcategory, rank FROM charts
+            WHERE app_id IN (SELECT app_id FROM charts WHERE snapshot_date=? AND rank <= 3)
+              AND snapshot_date >= ? AND chart_type='top_free'
+            ORDER BY 1, 2, 3, 4, 5
+        """, (latest, archive_cutoff)).fetchall()),
+        ("charts_wide metadata", lambda c: c.execute("""
+            SELECT snapshot_date, category, subcategory, rank, app_id, bundle_id, price, currency,
+                   rating, ratings_count, app_store_url, app_url, icon_url
+            FROM charts_wide WHERE snapshot_date >= ? AND country='US' AND rank <= 10
+            ORDER BY 1, 2, 3, 4
+        """, (archive_cutoff,)).fetchall()),
+        # приложенията без ранг в предишните 7 дни: RE-ENTRY / NEW на /compare (спрямо последния ден) и на
+        # /weekly/insights (спрямо началото на седмицата) зависят от цялата история, не само от прозореца
+        ("latest compare/weekly statuses (US)", lambda c: c.execute(f"""
+            WITH ctx AS (SELECT ctx_id FROM dim_context WHERE country='US' AND chart_type='top_free'),
+            fresh AS (
+                SELECT DISTINCT app_id FROM chart_ranks WHERE day = ? AND ctx_id IN ctx
+                EXCEPT
+                SELECT app_id FROM chart_ranks WHERE day BETWEEN ? - 7 AND ? - 1 AND ctx_id IN ctx
+            )
+            SELECT f.app_id,
+                   CASE WHEN {seen_before_sql('f.app_id', 'SELECT ctx_id FROM ctx')} THEN 'RE-ENTRY' ELSE 'NEW' END,
+                   CASE WHEN {seen_before_sql('f.app_id', 'SELECT ctx_id FROM ctx')} THEN 'RE-ENTRY' ELSE 'NEW' END
+            FROM fresh f ORDER BY 1
+        """, (*[day_number(latest)] * 3, *[day_number(latest)] * 2, *[day_number(latest) - 6] * 2)).fetchall()),
+        ("full-range stats (rollups)", lambda c: sorted(
+            range_stats(c, month_start(tiers["first"]), latest, "AND country='US' AND chart_type='top_free'")[0].items(),
+            key=lambda kv: tuple(str(x) for x in kv[0]),
+        )),
+    ]
+
+
+def run_probes(conn: sqlite3.Connection, probes: List[tuple]) -> Dict[str, tuple]:
+    """{име: (sha1 на резултата, ms)}"""
+    out = {}
+    for name, fn in probes:
+        t0 = time.perf_counter()
+        rows = fn(conn)
+        ms = (time.perf_counter() - t0) * 1000
+        out[name] = (hashlib.sha1(repr(rows).encode()).hexdigest(), round(ms, 1))
+    return out
+
+
+def apply_retention(db_path: str = DB_PATH, raw_days: int = RAW_DAYS, daily_days: int = DAILY_DAYS,
+                    archive_dir: str = ARCHIVE_DIR, vacuum: bool = False) -> Dict[str, Any]:
+    conn = sqlite3.connect(db_path)
+    conn.isolation_level = None  # транзакциите се управляват ръчно (VACUUM не може в транзакция)
+    ensure_rollups(conn)
+    ensure_app_metadata(conn)
+    ensure_dimensions(conn)
+    tiers = plan_tiers(conn, raw_days, daily_days)
+    if not tiers:
+        conn.close()
+        print("⚠️ Charts table empty — nothing to do.")
+        return {}
+
+    # rollup-ите на архивираните месеци трябва да съществуват, преди дневните им редове да изчезнат
+    if tiers["archive_months"]:
+        n = build_periods(conn, tiers["first"], _shift(tiers["archive_cutoff"], 1))
+        print(f"[RETENTION] rollups built for archived range: {n} rows")
+
+    # историята на метаданните трябва да покрива редовете, които ще се изтънят
+    if not conn.execute("SELECT 1 FROM app_metadata_history LIMIT 1").fetchone():
+        n = refresh_app_metadata(conn)
+        print(f"[RETENTION] app metadata history built: {n} versions")
+
+    probes = _probes(tiers)
+    size_before = file_size(db_path)
+    before = run_probes(conn, probes)
+
+    conn.execute("BEGIN")
+    archived = 0
+    for month in tiers["archive_months"]:
+        archived += archive_month(conn, month, tiers["keep_day"], archive_dir)  # при първо пускане — заедно с raw
+    if archived:
+        refresh_catalog(conn)  # първите дни в каталога за /meta се местят напред
+    stripped = strip_raw(conn, tiers["raw_cutoff"])
+    thinned = compact_chart_metadata(conn, tiers["raw_cutoff"])
+    after_change = run_probes(conn, probes)
+    changed = [name for name in before if before[name][0] != after_change[name][0]]
+    if changed:
+        conn.execute("ROLLBACK")
+        conn.close()
+        raise RuntimeError(f"retention would change retained results: {', '.join(changed)} — rolled back")
+    conn.execute("COMMIT")
+
+    how = compact(conn, vacuum)
+    after = run_probes(conn, probes)
+    conn.close()
+    size_after = file_size(db_path)
+
+    print(f"[RETENTION] archived: {archived} rows ({', '.join(tiers['archive_months']) or 'none'}) -> {archive_dir}")
+    print(f"[RETENTION] raw stripped: {stripped} rows before {tiers['raw_cutoff']}")
+    print(f"[RETENTION] lookup fields moved to app_metadata_history: {thinned} rows")
+    print(f"[RETENTION] {how}: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    for name in before:
+        print(f"  {name:<30} {before[name][1]:>8} ms -> {after[name][1]:>8} ms   (same result)")
+    return {
+        "tiers": tiers, "stripped": stripped, "thinned": thinned, "archived": archived, "compaction": how,
+        "size_before": size_before, "size_after": size_after,
+        "latency_ms": {name: (before[name][1], after[name][1]) for name in before},
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Tiered retention + compaction for charts")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--raw-days", type=int, default=RAW_DAYS, help="keep raw JSON for this many days")
+    p.add_argument("--daily-days", type=int, default=DAILY_DAYS, help="keep daily rows for this many days")
+    p.add_argument("--archive-dir", help="where archived month segments go (default: <db dir>/archive)")
+    p.add_argument("--apply", action="store_true", help="apply the policy (default: only print the plan)")
+    p.add_argument("--vacuum", action="store_true", help="full VACUUM instead of incremental_vacuum")
+    a = p.parse_args()
+    archive_dir = a.archive_dir or os.path.join(os.path.dirname(os.path.abspath(a.db)), "archive")
+
+    if a.apply:
+        apply_retention(a.db, a.raw_days, a.daily_days, archive_dir, a.vacuum)
+    else:
+        conn = sqlite3.connect(a.db)
+        t = plan_tiers(conn, a.raw_days, a.daily_days)
+        conn.close()
+        if not t:
+            print("⚠️ Charts table empty — nothing to do.")
+        else:
+            print(f"📘 {a.db}: {t['first']} .. {t['latest']} ({file_size(a.db) / 1e6:.1f} MB)")
+            print(f"  raw kept from {t['raw_cutoff']}; strip {t['strip_rows']} rows / {t['strip_bytes'] / 1e6:.1f} MB of raw")
+            print(f"  daily rows kept from {t['archive_cutoff']}; archive {t['archive_rows']} rows "
+                  f"in {len(t['archive_months'])} month segment(s)")
+            print("  (dry run — add --apply)")
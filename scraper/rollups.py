@@ -0,0 +1,365 @@
+# scraper/rollups.py
+# Седмични/месечни rollup-и на класациите за дълги периоди: по един ред на
+# (period, period_start, country, chart_type, category, subcategory, app_id).
+# Всички метрики са адитивни (суми / min / max), така че произволен интервал се сглобява точно от
+# месеци + седмици + отделни дни — /stats/apps избира най-едрите налични парчета.
+#
+# Дефиниции (еднакви за rollup-ите и за дневното изчисление):
+#   ден в класацията = snapshot_date, на която app-ът присъства в контекста (при дубликат — най-добрият ранг)
+#   entry = присъства днес, а в предишния наличен ден на контекста го няма
+#   exit  = присъства днес, а в следващия наличен ден на контекста го няма (брои се към последния ден)
+import sqlite3
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Tuple, Any
+
+ROLLUPS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS chart_rollups (
+        period TEXT, period_start TEXT,
+        country TEXT, chart_type TEXT, category TEXT, subcategory TEXT, app_id TEXT,
+        days_in_chart INTEGER, rank_sum INTEGER, best_rank INTEGER, worst_rank INTEGER,
+        first_day TEXT, last_day TEXT, entries INTEGER, exits INTEGER
+    )
+    """,
+    # кои периоди са изчислени (празен период без редове също е „изчислен“)
+    """
+    CREATE TABLE IF NOT EXISTS chart_rollup_periods (
+        period TEXT, period_start TEXT, built_at TEXT,
+        PRIMARY KEY (period, period_start)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_chart_rollups_ctx ON chart_rollups "
+    "(period, period_start, country, chart_type, category, subcategory)",
+    "CREATE INDEX IF NOT EXISTS ix_chart_rollups_app ON chart_rollups (app_id, period, period_start)",
+]
+
+PERIODS = ("month", "week")
+
+_COLS = ("days_in_chart", "rank_sum", "best_rank", "worst_rank", "first_day", "last_day", "entries", "exits")
+
+Key = Tuple[str, str, str, Optional[str], str]  # country, chart_type, category, subcategory, app_id
+
+
+def ensure_rollups(conn: sqlite3.Connection):
+    outer = conn.in_transaction  # чужда транзакция (напр. retention.py) не се комитва оттук
+    for ddl in ROLLUPS_DDL:
+        conn.execute(ddl)
+    if not outer:
+        conn.commit()
+
+
+# ----- периоди -----
+def week_start(d: str) -> str:
+    x = date.fromisoformat(d)
+    return (x - timedelta(days=x.weekday())).isoformat()
+
+
+def month_start(d: str) -> str:
+    return d[:8] + "01"
+
+
+def period_start(period: str, d: str) -> str:
+    return week_start(d) if period == "week" else month_start(d)
+
+
+def period_end(period: str, start: str) -> str:
+    x = date.fromisoformat(start)
+    if period == "week":
+        return (x + timedelta(days=6)).isoformat()
+    nxt = date(x.year + (x.month == 12), x.month % 12 + 1, 1)
+    return (nxt - timedelta(days=1)).isoformat()
+
+
+def periods_inside(period: str, lo: str, hi: str) -> List[str]:
+    """Началата на периодите, които лежат изцяло в [lo, hi]."""
+    out, s = [], period_start(period, lo)
+    while s <= hi:
+        e = period_end(period, s)
+        if s >= lo and e <= hi:
+            out.append(s)
+        s = (date.fromisoformat(e) + timedelta(days=1)).isoformat()
+    return out
+
+
+# ----- акумулатор: [days, rank_sum, best, worst, first, last, entries, exits] -----
+def _merge(acc: Optional[list], other) -> list:
+    if acc is None:
+        return list(other)
+    acc[0] += other[0]
+    acc[1] += other[1]
+    acc[2] = min(acc[2], other[2])
+    acc[3] = max(acc[3], other[3])
+    acc[4] = min(acc[4], other[4])
+    acc[5] = max(acc[5], other[5])
+    acc[6] += other[6]
+    acc[7] += other[7]
+    return acc
+
+
+def _day_sets(conn, d: Optional[str], where: str, params) -> Dict[tuple, set]:
+    out: Dict[tuple, set] = {}
+    if not d:
+        return out
+    cur = conn.execute(f"""
+        SELECT country, chart_type, category, subcategory, app_id FROM charts
+        WHERE snapshot_date = ? AND app_id IS NOT NULL {where}
+    """, (d, *params))
+    for country, chart_type, category, subcategory, app_id in cur:
+        out.setdefault((country, chart_type, category, subcategory), set()).add(app_id)
+    return out
+
+
+def _ctx_neighbor(conn, ctx: tuple, d: str, before: bool) -> Optional[set]:
+    """Съседният наличен ден на контекста (за контексти, които липсват в глобалния съседен ден)."""
+    op, order = ("<", "DESC") if before else (">", "ASC")
+    row = conn.execute(f"""
+        SELECT snapshot_date FROM charts
+        WHERE snapshot_date {op} ? AND country=? AND chart_type=? AND category=? AND subcategory IS ?
+        ORDER BY snapshot_date {order} LIMIT 1
+    """, (d, *ctx)).fetchone()
+    if not row:
+        return None
+    cur = conn.execute("""
+        SELECT app_id FROM charts
+        WHERE snapshot_date=? AND country=? AND chart_type=? AND category=? AND subcategory IS ? AND app_id IS NOT NULL
+    """, (row[0], *ctx))
+    return {r[0] for r in cur}
+
+
+# bucket -> (Python функция върху дата, същото като SQL израз върху колоната d)
+BUCKETS = {
+    "week": (week_start, "date(d, 'weekday 0', '-6 days')"),
+    "month": (month_start, "substr(d, 1, 8) || '01'"),
+    "all": (lambda d: "", "''"),
+}
+
+
+def scan_days(conn: sqlite3.Connection, lo: str, hi: str, buckets: List[str],
+              where: str = "", params: tuple = ()) -> Dict[tuple, list]:
+    """
+    Дневното изчисление за [lo, hi]: {(bucket, bucket_key, *Key): акумулатор}.
+    Сумите/min/max се смятат в SQL; entry/exit — с разлики на множества по (контекст, ден).
+    `where` е допълнителен филтър върху charts (напр. "AND country=?").
+    """
+    out: Dict[tuple, list] = {}
+    for name in buckets:
+        cur = conn.execute(f"""
+            SELECT {BUCKETS[name][1]} AS b, country, chart_type, category, subcategory, app_id,
+                   COUNT(*), SUM(r), MIN(r), MAX(r), MIN(d), MAX(d)
+            FROM (
+                SELECT snapshot_date AS d, country, chart_type, category, subcategory, app_id, MIN(rank) AS r
+                FROM charts
+                WHERE snapshot_date BETWEEN ? AND ? AND app_id IS NOT NULL {where}
+                GROUP BY country, chart_type, category, subcategory, snapshot_date, app_id
+            )
+            GROUP BY b, country, chart_type, category, subcategory, app_id
+        """, (lo, hi, *params))
+        for b, country, chart_type, category, subcategory, app_id, *agg in cur:
+            out[(name, b, country, chart_type, category, subcategory, app_id)] = agg + [0, 0]
+
+    prev_d = conn.execute("SELECT MAX(snapshot_date) FROM charts WHERE snapshot_date < ?", (lo,)).fetchone()[0]
+    next_d = conn.execute("SELECT MIN(snapshot_date) FROM charts WHERE snapshot_date > ?", (hi,)).fetchone()[0]
+    prev_sets = _day_sets(conn, prev_d, where, params)
+    next_sets = _day_sets(conn, next_d, where, params)
+    fns = [(name, BUCKETS[name][0]) for name in buckets]
+
+    def flush(ctx, days):
+        if not days:
+            return
+        prev = prev_sets.get(ctx)
+        if prev is None and prev_d:
+            prev = _ctx_neighbor(conn, ctx, lo, before=True)
+        nxt_boundary = next_sets.get(ctx)
+        if nxt_boundary is None and next_d:
+            nxt_boundary = _ctx_neighbor(conn, ctx, hi, before=False)
+        for i, (d, apps) in enumerate(days):
+            nxt = days[i + 1][1] if i + 1 < len(days) else nxt_boundary
+            entered = apps - prev if prev is not None else ()
+            exited = apps - nxt if nxt is not None else ()
+            for name, fn in fns:
+                b = fn(d)
+                for app_id in entered:
+                    out[(name, b, *ctx, app_id)][6] += 1
+                for app_id in exited:
+                    out[(name, b, *ctx, app_id)][7] += 1
+            prev = apps
+
+    cur = conn.execute(f"""
+        SELECT country, chart_type, category, subcategory, snapshot_date, GROUP_CONCAT(app_id, char(31))
+        FROM charts
+        WHERE snapshot_date BETWEEN ? AND ? AND app_id IS NOT NULL {where}
+        GROUP BY country, chart_type, category, subcategory, snapshot_date
+        ORDER BY country, chart_type, category, subcategory, snapshot_date
+    """, (lo, hi, *params))
+    ctx, days = None, []
+    for country, chart_type, category, subcategory, d, ids in cur:
+        key = (country, chart_type, category, subcategory)
+        if key != ctx:
+            flush(ctx, days)
+            ctx, days = key, []
+        days.append((d, set(ids.split("\x1f"))))
+    flush(ctx, days)
+    return out
+
+
+# ----- поддръжка -----
+def _write(conn, period: str, starts: List[str], accs: Dict[tuple, list]):
+    for s in starts:
+        conn.execute("DELETE FROM chart_rollups WHERE period=? AND period_start=?", (period, s))
+        conn.execute("INSERT OR REPLACE INTO chart_rollup_periods VALUES (?, ?, datetime('now'))", (period, s))
+    conn.executemany(
+        f"INSERT INTO chart_rollups VALUES ({','.join(['?'] * 15)})",
+        [(period, k[0], *k[1:], *acc) for k, acc in accs.items()],
+    )
+
+
+def _load(conn, period: str, starts: List[str], where: str = "", params: tuple = ()) -> List[tuple]:
+    if not starts:
+        return []
+    cur = conn.execute(f"""
+        SELECT country, chart_type, category, subcategory, app_id, {', '.join(_COLS)}
+        FROM chart_rollups
+        WHERE period=? AND period_start IN ({','.join(['?'] * len(starts))}) {where}
+    """, (period, *starts, *params))
+    return cur.fetchall()
+
+
+def _built(conn, period: str, starts: List[str]) -> set:
+    if not starts:
+        return set()
+    cur = conn.execute(
+        f"SELECT period_start FROM chart_rollup_periods WHERE period=? AND period_start IN ({','.join(['?'] * len(starts))})",
+        (period, *starts),
+    )
+    return {r[0] for r in cur}
+
+
+def refresh_rollups(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Преизчислява седмиците/месеците, засегнати от snapshot_date (заедно със съседните налични дни —
+    entry/exit на съседите зависят от него), или всичко при None. Идемпотентно. Връща броя записани редове.
+    """
+    ensure_rollups(conn)
+    lo_all, hi_all = conn.execute("SELECT MIN(snapshot_date), MAX(snapshot_date) FROM charts").fetchone()
+    if not lo_all:
+        return 0
+
+    if snapshot_date is None:
+        accs = scan_days(conn, lo_all, hi_all, ["week", "month"])
+        written = 0
+        for period in PERIODS:
+            starts, s = [], period_start(period, lo_all)
+            while s <= hi_all:
+                starts.append(s)
+                s = (date.fromisoformat(period_end(period, s)) + timedelta(days=1)).isoformat()
+            # периодите преди първия наличен ден (архивирани от retention.py) не се пипат;
+            # вече изчисленият период, който започва преди него, също — дневните му редове са непълни
+            if starts[0] < lo_all and _built(conn, period, starts[:1]):
+                starts = starts[1:]
+            part = {k[1:]: v for k, v in accs.items() if k[0] == period and k[1] in starts}
+            _write(conn, period, starts, part)
+            written += len(part)
+        conn.commit()
+        return written
+
+    prev_d = conn.execute("SELECT MAX(snapshot_date) FROM charts WHERE snapshot_date < ?", (snapshot_date,)).fetchone()[0]
+    next_d = conn.execute("SELECT MIN(snapshot_date) FROM charts WHERE snapshot_date > ?", (snapshot_date,)).fetchone()[0]
+    touched = [d for d in (prev_d, snapshot_date, next_d) if d]
+
+    # седмици: директно от дневните редове (най-много 2-3 седмици)
+    weeks = sorted({week_start(d) for d in touched})
+    accs = scan_days(conn, weeks[0], period_end("week", weeks[-1]), ["week"])
+    part = {k[1:]: v for k, v in accs.items() if k[1] in weeks}
+    _write(conn, "week", weeks, part)
+    written = len(part)
+
+    # месеци: пълните седмици вътре в месеца от rollup-а + оголените дни в краищата
+    for m in sorted({month_start(d) for d in touched}):
+        accs = month_from_weeks(conn, m)
+        _write(conn, "month", [m], {(m, *k): v for k, v in accs.items()})
+        written += len(accs)
+    conn.commit()
+    return written
+
+
+def build_periods(conn: sqlite3.Connection, lo: str, hi: str) -> int:
+    """Изчислява липсващите седмици/месеци, които се припокриват с [lo, hi] (напр. преди архивиране)."""
+    ensure_rollups(conn)
+    written = 0
+    for period in PERIODS:
+        starts, s = [], period_start(period, lo)
+        while s <= hi:
+            starts.append(s)
+            s = (date.fromisoformat(period_end(period, s)) + timedelta(days=1)).isoformat()
+        missing = sorted(set(starts) - _built(conn, period, starts))
+        if not missing:
+            continue
+        accs = scan_days(conn, missing[0], period_end(period, missing[-1]), [period])
+        part = {k[1:]: v for k, v in accs.items() if k[1] in missing}
+        _write(conn, period, missing, part)
+        written += len(part)
+    conn.commit()
+    return written
+
+
+def month_from_weeks(conn: sqlite3.Connection, m: str) -> Dict[Key, list]:
+    m_end = period_end("month", m)
+    weeks = periods_inside("week", m, m_end)
+    built = _built(conn, "week", weeks)
+    return combine(conn, m, m_end, plan_range(m, m_end, {"week": built} if weeks else {}))[0]
+
+
+# ----- заявки -----
+def plan_range(lo: str, hi: str, available: Dict[str, set]) -> List[tuple]:
+    """
+    Разбива [lo, hi] на непресичащи се парчета: ("month"|"week", start) за изчислените периоди,
+    изцяло вътре в интервала, и ("days", from, to) за остатъка. Най-едрите парчета са с приоритет.
+    """
+    pieces = [("days", lo, hi)]
+    for period in ("month", "week"):
+        avail = available.get(period) or set()
+        nxt = []
+        for p in pieces:
+            if p[0] != "days":
+                nxt.append(p)
+                continue
+            a, b = p[1], p[2]
+            cursor = a
+            for s in periods_inside(period, a, b):
+                if s not in avail:
+                    continue
+                if cursor < s:
+                    nxt.append(("days", cursor, (date.fromisoformat(s) - timedelta(days=1)).isoformat()))
+                nxt.append((period, s))
+                cursor = (date.fromisoformat(period_end(period, s)) + timedelta(days=1)).isoformat()
+            if cursor <= b:
+                nxt.append(("days", cursor, b))
+        pieces = nxt
+    return pieces
+
+
+def combine(conn: sqlite3.Connection, lo: str, hi: str, pieces: List[tuple],
+            where: str = "", params: tuple = ()) -> Tuple[Dict[Key, list], Dict[str, Any]]:
+    """Сглобява акумулаторите за [lo, hi] по план от plan_range(). Връща ({Key: acc}, резюме на плана)."""
+    out: Dict[Key, list] = {}
+    summary = {"month": [], "week": [], "days": 0}
+    for period in ("month", "week"):
+        starts = [p[1] for p in pieces if p[0] == period]
+        summary[period] = starts
+        for r in _load(conn, period, starts, where, params):
+            k = tuple(r[:5])
+            out[k] = _merge(out.get(k), r[5:])
+    for p in pieces:
+        if p[0] != "days":
+            continue
+        summary["days"] += (date.fromisoformat(p[2]) - date.fromisoformat(p[1])).days + 1
+        for k, acc in scan_days(conn, p[1], p[2], ["all"], where, params).items():
+            out[k[2:]] = _merge(out.get(k[2:]), acc)
+    return out, summary
+
+
+def range_stats(conn: sqlite3.Connection, lo: str, hi: str, where: str = "", params: tuple = ()):
+    """Статистики за [lo, hi] от най-едрите изчислени rollup-и + дневни редове за остатъка."""
+    ensure_rollups(conn)
+    available = {p: _built(conn, p, periods_inside(p, lo, hi)) for p in PERIODS}
+    return combine(conn, lo, hi, plan_range(lo, hi, available), where, params)
@@ -7,6 +7,7 @@ import json
 import csv
 from datetime import datetime
 from pathlib import Path
+from chart_schema import ensure_charts_table
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "..", "appstore-api", "data", "app_data.db")
@@ -85,28 +86,8 @@ def http_get_json(url: str):
 
 
 def ensure_schema(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS charts (
-            snapshot_date TEXT,
-            country TEXT,
-            category TEXT,
-            subcategory TEXT,
-            chart_type TEXT,
-            rank INTEGER,
-            app_id TEXT,
-            bundle_id TEXT,
-            app_name TEXT,
-            developer_name TEXT,
-            price REAL,
-            currency TEXT,
-            rating REAL,
-            ratings_count INTEGER,
-            raw TEXT,
-            PRIMARY KEY (snapshot_date, country, category, subcategory, chart_type, rank)
-        )
-    """)
-    conn.commit()
+    # общата схема (chart_schema.py) с миграциите — същата като на scraper_apps.py и API-то
+    ensure_charts_table(conn)
 
 
 def insert_rows(conn, rows):
@@ -1,6 +1,13 @@
-import os, time, json, sqlite3, requests
+import os, time, sqlite3, argparse, requests
 from datetime import datetime
-from bs4 import BeautifulSoup
+from chart_html import parse_chart_html, dump_html, prefetch
+from chart_schema import ensure_charts_table
+from dimensions import ensure_dimensions
+from post_scrape import refresh_derived
+from json_codec import dumps, loads
+from lookup_cache import LookupCache, LOOKUP_REFRESH_BUDGET
+from icon_cache import prefetch_icons, ICON_PREFETCH
+from job_ledger import plan_jobs, pending_jobs, resume_date, mark_done, mark_failed, clear_unit_rows, summary
 
 BASE_DIR=os.path.dirname(os.path.abspath(__file__))
 DB_PATH=os.path.join(BASE_DIR,"..","appstore-api","data","app_data.db")
@@ -29,28 +36,11 @@ def http_get(url):
 
 def http_get_json(url):
     r=http_get(url)
-    return r.json() if r else None
+    return loads(r.content) if r else None
 
 def ensure_schema(conn):
-    cur=conn.cursor()
-    cur.execute("""
-      CREATE TABLE IF NOT EXISTS charts (
-       snapshot_date TEXT,country TEXT,category TEXT,subcategory TEXT,
-       chart_type TEXT,rank INTEGER,app_id TEXT,bundle_id TEXT,
-       app_name TEXT,developer_name TEXT,price REAL,currency TEXT,
-       rating REAL,ratings_count INTEGER,genre_id TEXT,raw TEXT,
-       PRIMARY KEY (snapshot_date,country,category,subcategory,chart_type,rank))
-    """)
-    cur.execute("PRAGMA table_info(charts)")
-    cols=[r[1] for r in cur.fetchall()]
-    if "genre_id" not in cols: cur.execute("ALTER TABLE charts ADD COLUMN genre_id TEXT;")
-    cur.execute("PRAGMA table_info(charts)")
-    cols = [r[1] for r in cur.fetchall()]
-    for col in ["app_store_url", "app_url", "icon_url"]:
-        if col not in cols:
-            print(f"[DB] Adding missing column: {col}")
-            cur.execute(f"ALTER TABLE charts ADD COLUMN {col} TEXT;")
-    conn.commit()
+    ensure_charts_table(conn)
+    ensure_dimensions(conn)
 
 def insert_rows(conn,rows):
     conn.executemany("""
@@ -61,7 +51,6 @@ def insert_rows(conn,rows):
          app_store_url,app_url,icon_url,raw
      ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
      """,rows)
-    conn.commit()
 
 
 def parse_itunes(data):
@@ -78,15 +67,8 @@ def parse_html_games(country,genre_id,slug):
     url=f"https://apps.apple.com/{country.lower()}/charts/iphone/{slug}-games/{genre_id}?chart=top-free"
     r=http_get(url)
     if not r:return []
-    soup=BeautifulSoup(r.text,"lxml")
-    items=[]
-    for i,li in enumerate(soup.select("li div.we-lockup__content"),1):
-        a=li.find("a",href=True)
-        name=a.get_text(strip=True)
-        artist=li.find("div",class_="we-lockup__subtitle").get_text(strip=True)
-        href=a["href"]
-        app_id=href.split("/id")[-1].split("?")[0] if "/id" in href else ""
-        if app_id:items.append({"rank":i,"id":app_id,"name":name,"artistName":artist})
+    dump_html(r.text,f"{country.lower()}_{slug}-games")
+    items=parse_chart_html(r.text,limit=50)
     if items:print(f"[HTML] Parsed {len(items)} games from {url}")
     return items
 
@@ -96,6 +78,10 @@ def fetch_genre_top50(country,genre_id,slug):
     if items:return items,"itunes"
     return parse_html_games(country,genre_id,slug),"html"
 
+def fetch_unit(country,genre_id,slug):
+    try:return fetch_genre_top50(country,genre_id,slug)
+    except Exception as e:return [],f"error: {e}"
+
 
 
 def enrich_with_lookup(country,ids):
@@ -118,20 +104,30 @@ def enrich_with_lookup(country,ids):
              "app_store_url": r.get("trackViewUrl"),
              "app_url": r.get("sellerUrl"),
              "icon_url": r.get("artworkUrl100"),
-             "raw": json.dumps(r, ensure_ascii=False)}
+             "raw": dumps(r)}
     return out
 
-def scrape_games():
-    snap=datetime.utcnow().date().isoformat()
-    conn=sqlite3.connect(DB_PATH);ensure_schema(conn)
+def scrape_games(resume=False,db_path=DB_PATH,units=None,snapshot_date=None,derived=True,
+                 refresh_budget=LOOKUP_REFRESH_BUDGET):
+    # units / snapshot_date / derived=False — един шард от shard_scrape.py
+    conn=sqlite3.connect(db_path);ensure_schema(conn)
+    snap=snapshot_date or (resume and resume_date(conn,"games")) or datetime.utcnow().date().isoformat()
+    units=units or [(country,slug) for country in COUNTRIES for slug in GAME_CATEGORIES]
+    plan_jobs(conn,snap,"games",units)
+    todo=pending_jobs(conn,snap,"games")
+    if len(todo)<len(units):
+        print(f"[RESUME] {snap}: {len(units)-len(todo)} done, {len(todo)} remaining")
     total=0
-    for country in COUNTRIES:
-        for slug,gid in GAME_CATEGORIES.items():
-            items,src=fetch_genre_top50(country,gid,slug)
-            if not items:
-                print(f"[INFO] Empty {country}/Games/{gid} ({slug})");continue
-            lookup=enrich_with_lookup(country,[i["id"] for i in items])
-            rows=[(snap,country,"Games",slug.replace("-"," ").title(),"top_free",
+    cache=LookupCache(conn,enrich_with_lookup,snap)
+    jobs=[(country,GAME_CATEGORIES[slug],slug) for country,slug in units if (country,slug) in todo]
+    for (country,gid,slug),(items,src) in prefetch(fetch_unit,jobs):
+        if not items:
+            print(f"[INFO] Empty {country}/Games/{gid} ({slug})")
+            mark_failed(conn,snap,"games",country,slug,src if (src or "").startswith("error") else "empty");continue
+        subcat=slug.replace("-"," ").title()
+        try:
+            lookup=cache.lookup(country,items)
+            rows=[(snap,country,"Games",subcat,"top_free",
                     it["rank"],it["id"],lookup.get(it["id"],{}).get("bundle_id"),
                     it["name"],it["artistName"],
                     lookup.get(it["id"], {}).get("price"),
@@ -144,14 +140,33 @@ def scrape_games():
                     lookup.get(it["id"], {}).get("icon_url"),
                     lookup.get(it["id"], {}).get("raw"))
                    for it in items]
-            insert_rows(conn,rows);total+=len(rows)
-            print(f"[INFO] {country} {slug} ({src}): {len(rows)}")
-    print(f"[OK] GAMES inserted {total} rows {snap}")
+            with conn:
+                clear_unit_rows(conn,snap,country,"Games",subcat)
+                insert_rows(conn,rows)
+                mark_done(conn,snap,"games",country,slug,len(rows))
+        except Exception as e:
+            print(f"[ERROR] {country} {slug}: {e}")
+            mark_failed(conn,snap,"games",country,slug,f"error: {e}");continue
+        total+=len(rows)
+        print(f"[INFO] {country} {slug} ({src}): {len(rows)}")
+    print(f"[OK] GAMES inserted {total} rows {snap} | jobs: {summary(conn,snap,'games')}")
+    cache.flush()
+    cache.refresh_stale(refresh_budget)
+    print(f"[LOOKUP] {cache.report()}")
+    if derived:
+        refresh_derived(conn,snap)
+        if ICON_PREFETCH:
+            print(f"[ICONS] {prefetch_icons(conn,snap)}")
 
 
     # ✅ Затваряме базата безопасно
     if conn:
         conn.close()
+    return snap
 
 if __name__=="__main__":
-    scrape_games()
+    p=argparse.ArgumentParser()
+    p.add_argument("--resume",action="store_true",help="continue the last unfinished run (failed/missing units only)")
+    p.add_argument("--date",help="snapshot date to (re)scrape; live charts are stored under it")
+    a=p.parse_args()
+    scrape_games(resume=a.resume,snapshot_date=a.date)
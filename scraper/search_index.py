@@ -0,0 +1,77 @@
+# scraper/search_index.py
+# FTS5 индекс за търсене по име на приложение, разработчик и bundle id.
+# Един ред на приложение (rowid = числовото app_id), обновява се инкрементално след всеки скрейп.
+import sqlite3
+from typing import Optional, List, Dict, Any
+
+SEARCH_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS app_search USING fts5(
+        app_name, developer_name, bundle_id,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+# тегла за bm25 по колони: app_name, developer_name, bundle_id
+BM25_WEIGHTS = "10.0, 4.0, 2.0"
+
+
+def ensure_search_index(conn: sqlite3.Connection):
+    conn.execute(SEARCH_DDL)
+    conn.commit()
+
+
+def sync_search_index(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Вкарва/обновява приложенията от даден снапшот (или всички, ако snapshot_date е None).
+    Пише само редове, които липсват или са се променили. Връща броя записани редове.
+    """
+    ensure_search_index(conn)
+    date_filter, params = ("AND snapshot_date=?", (snapshot_date,)) if snapshot_date else ("", ())
+    before = conn.total_changes
+    conn.execute(f"""
+        INSERT OR REPLACE INTO app_search (rowid, app_name, developer_name, bundle_id)
+        SELECT c.id, c.app_name, c.developer_name, COALESCE(c.bundle_id, s.bundle_id)
+        FROM (
+            -- имената от последния ред на приложението (не MAX — старо име може да е „по-голямо“);
+            -- bundle_id — последният ненулев; ако денят го няма, остава вече индексираният
+            SELECT CAST(app_id AS INTEGER) AS id, app_name, developer_name,
+                   FIRST_VALUE(bundle_id) OVER (PARTITION BY app_id
+                                                ORDER BY bundle_id IS NULL, snapshot_date DESC, rowid DESC) AS bundle_id,
+                   ROW_NUMBER() OVER (PARTITION BY app_id ORDER BY snapshot_date DESC, rowid DESC) AS rn
+            FROM charts
+            WHERE app_id GLOB '[0-9]*' {date_filter}
+        ) c
+        LEFT JOIN app_search s ON s.rowid = c.id
+        WHERE c.rn = 1 AND (s.rowid IS NULL
+           OR s.app_name IS NOT c.app_name
+           OR s.developer_name IS NOT c.developer_name
+           OR s.bundle_id IS NOT COALESCE(c.bundle_id, s.bundle_id))
+    """, params)
+    conn.commit()
+    return conn.total_changes - before
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """'clash roy' -> '"clash"* AND "roy"*' (всяка дума е префикс, кавичките се екранират)."""
+    terms = [t.replace('"', '""') for t in q.replace(".", " ").split() if t.strip()]
+    if not terms:
+        return None
+    return " AND ".join(f'"{t}"*' for t in terms)
+
+
+def search_apps(conn: sqlite3.Connection, q: str, limit: int = 20) -> List[Dict[str, Any]]:
+    match = build_match_query(q)
+    if not match:
+        return []
+    cur = conn.execute(f"""
+        SELECT rowid, app_name, developer_name, bundle_id, bm25(app_search, {BM25_WEIGHTS}) AS score
+        FROM app_search
+        WHERE app_search MATCH ?
+        ORDER BY score
+        LIMIT ?
+    """, (match, limit))
+    return [
+        {"app_id": str(r[0]), "app_name": r[1], "developer_name": r[2], "bundle_id": r[3], "score": r[4]}
+        for r in cur.fetchall()
+    ]
@@ -0,0 +1,315 @@
+# scraper/shard_scrape.py
+# Скрейпът (apps + games), разделен на шардове: работните единици (country, genre) се групират по държава
+# (или по държава + група жанрове) и групите се разпределят детерминирано между N шарда. Всеки шард пише
+# собствена частична база (charts + дневника scrape_jobs + новите lookup-и) без производните таблици;
+# merge ги слива в app_data.db с merge_db (INSERT ... SELECT, в реда на шардовете) и преизчислява
+# производните таблици веднъж за деня.
+# Един и същ код върви като локални процеси (run) или като CI matrix (scrape в отделни job-ове + merge):
+#   python scraper/shard_scrape.py run --shards 4                              # локално: 4 процеса + merge
+#   python scraper/shard_scrape.py seed --out seed.db                          # lookup кешът за шардовете
+#   python scraper/shard_scrape.py scrape --shard 0 --of 4 --date 2025-01-31 --seed-db seed.db
+#   python scraper/shard_scrape.py merge --date 2025-01-31 shards/*.db
+# Прекъснат шард, пуснат отново със същите --shard/--of/--date върху същата папка, продължава от дневника
+# си (готовите единици не се теглят наново).
+# scrape, merge и run връщат ненулев код, ако за деня има единици от плана (на шарда / на всички), които не
+# са done в scrape_jobs — напр. цял шард без artifact; merge --allow-partial приема непълния ден.
+import os, re, sys, math, time, sqlite3, argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple, Optional
+import scraper_apps, scraper_games
+from chart_schema import ensure_charts_table
+from merge_db import merge_databases
+from post_scrape import refresh_derived
+from job_ledger import ensure_job_ledger, summary
+from lookup_cache import ensure_lookup_cache, LOOKUP_REFRESH_BUDGET, LOOKUP_MAX_AGE_DAYS, DAY
+from icon_cache import prefetch_icons, ICON_PREFETCH
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "..", "appstore-api", "data", "app_data.db")
+SHARD_DIR = os.environ.get("SHARD_DIR") or os.path.join(BASE_DIR, "..", "appstore-api", "data", "shards")
+SHARD_BY = os.environ.get("SHARD_BY", "country")  # country | genre
+GENRE_GROUPS = int(os.environ.get("SHARD_GENRE_GROUPS", 2))  # при --by genre: групи жанрове на източник
+
+# източник -> (scrape функция, жанрове, държави)
+SOURCES = {
+    "apps": (scraper_apps.scrape_apps, scraper_apps.APP_CATEGORIES, scraper_apps.COUNTRIES),
+    "games": (scraper_games.scrape_games, scraper_games.GAME_CATEGORIES, scraper_games.COUNTRIES),
+}
+
+Plan = List[Dict[str, List[Tuple[str, str]]]]  # шард -> източник -> [(country, slug)]
+
+
+def plan_shards(of: int, by: str = SHARD_BY, groups: int = GENRE_GROUPS,
+                countries: Optional[List[str]] = None) -> Plan:
+    """
+    Детерминирано разпределение: групите единици (държава или държава + група жанрове на източник) се
+    подреждат по размер и всяка отива в най-слабо натоварения шард (при равенство — с по-малък номер).
+    Една държава в един шард пази lookup-ите ѝ в един кеш.
+    """
+    if by not in ("country", "genre"):
+        raise ValueError("by must be 'country' or 'genre'")
+    buckets = {}  # ключ -> {source: [(country, slug)]}
+    for source, (_, genres, default_countries) in SOURCES.items():
+        slugs = list(genres)
+        size = math.ceil(len(slugs) / max(1, groups)) if by == "genre" else len(slugs)
+        for country in countries or default_countries:
+            for g in range(0, len(slugs), size):
+                key = (country,) if by == "country" else (country, source, g // size)
+                buckets.setdefault(key, {}).setdefault(source, []).extend((country, s) for s in slugs[g:g + size])
+
+    plan: Plan = [{} for _ in range(of)]
+    load = [0] * of
+    for key, units in sorted(buckets.items(), key=lambda kv: (-sum(map(len, kv[1].values())), kv[0])):
+        i = min(range(of), key=lambda j: (load[j], j))
+        for source, lst in units.items():
+            plan[i].setdefault(source, []).extend(lst)
+        load[i] += sum(map(len, units.values()))
+    return plan
+
+
+def shard_path(out_dir: str, snapshot_date: str, index: int, of: int) -> str:
+    return os.path.join(out_dir, f"shard-{snapshot_date}-{index:03d}-of-{of:03d}.db")
+
+
+def _shard_order(path: str) -> tuple:
+    m = re.search(r"-(\d+)-of-(\d+)\.db$", path)
+    return (int(m.group(2)), int(m.group(1)), path) if m else (0, 0, path)
+
+
+def export_seed(db_path: str, out: str) -> int:
+    """lookup_cache записите, които още се ползват (LOOKUP_MAX_AGE_DAYS), в малка база за шардовете."""
+    if os.path.exists(out):
+        os.remove(out)
+    src = sqlite3.connect(db_path)
+    if src.execute("SELECT 1 FROM sqlite_master WHERE name='lookup_cache'").fetchone():
+        ensure_lookup_cache(src)  # кеш в стария формат (raw вътре в data) -> колоните на новия
+    src.close()
+    conn = sqlite3.connect(out)
+    ensure_lookup_cache(conn)
+    conn.execute("ATTACH DATABASE ? AS src", (db_path,))
+    n = 0
+    if conn.execute("SELECT 1 FROM src.sqlite_master WHERE name='lookup_cache'").fetchone():
+        n = conn.execute("INSERT INTO lookup_cache SELECT * FROM src.lookup_cache WHERE fetched_at >= ?",
+                         (time.time() - LOOKUP_MAX_AGE_DAYS * DAY,)).rowcount
+    conn.commit()
+    conn.close()
+    print(f"[SHARD] seed: {n} lookup_cache rows -> {out}")
+    return n
+
+
+def scrape_shard(index: int, of: int, snapshot_date: str, out_dir: str = SHARD_DIR,
+                 seed_db: Optional[str] = None, plan: Optional[Plan] = None) -> str:
+    """Един шард в собствена база; връща пътя ѝ. В базата остават само lookup-ите от този run."""
+    plan = plan or plan_shards(of)
+    units = plan[index]
+    os.makedirs(out_dir, exist_ok=True)
+    path = shard_path(out_dir, snapshot_date, index, of)
+    t0 = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    ensure_charts_table(conn)
+    ensure_job_ledger(conn)
+    ensure_lookup_cache(conn)
+    seeded = bool(seed_db and os.path.exists(seed_db))
+    if seeded:
+        countries = sorted({c for lst in units.values() for c, _ in lst})
+        conn.execute("ATTACH DATABASE ? AS seed", (seed_db,))
+        # при повторен run записите от предишния опит остават (OR IGNORE)
+        conn.execute(f"INSERT OR IGNORE INTO lookup_cache SELECT * FROM seed.lookup_cache "
+                     f"WHERE country IN ({','.join('?' * len(countries))})", countries)
+        conn.commit()
+        conn.execute("DETACH DATABASE seed")
+    conn.close()
+
+    # опресняването на остарели lookup-и е общ бюджет за run-а — делим го между шардовете
+    budget = math.ceil(LOOKUP_REFRESH_BUDGET / of)
+    for source, lst in units.items():
+        SOURCES[source][0](db_path=path, units=lst, snapshot_date=snapshot_date, derived=False,
+                           refresh_budget=budget)
+
+    conn = sqlite3.connect(path)
+    if seeded:
+        # непроменените засети записи вече са в app_data.db — при сливането се пренасят само новите lookup-и
+        conn.execute("ATTACH DATABASE ? AS seed", (seed_db,))
+        conn.execute("""
+            DELETE FROM main.lookup_cache AS c
+            WHERE EXISTS (SELECT 1 FROM seed.lookup_cache s
+                          WHERE s.country = c.country AND s.app_id = c.app_id AND s.fetched_at = c.fetched_at)
+        """)
+        conn.commit()
+        conn.execute("DETACH DATABASE seed")
+    jobs = {source: summary(conn, snapshot_date, source) for source in units}
+    conn.close()
+    print(f"[SHARD] {index + 1}/{of}: {sum(map(len, units.values()))} units {jobs} "
+          f"in {time.perf_counter() - t0:.1f}s -> {path}")
+    return path
+
+
+def merge_shards(db_path: str, paths: List[str], derived: bool = True) -> dict:
+    """
+    Слива частичните бази в db_path. Редовете на всеки изтеглен контекст (ден, държава, категория,
+    подкатегория) в целта се трият предварително — като clear_unit_rows при обикновения скрейп, но с
+    една заявка на шард; после charts се добавя без проверка за конфликти, а дневникът и lookup кешът
+    се заместват (при еднакъв ключ печели по-късният шард, редът е по номер на шард).
+    """
+    paths = sorted(paths, key=_shard_order)
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    ensure_charts_table(conn)
+    dates = set()
+    for path in paths:
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        dates.update(r[0] for r in conn.execute("SELECT DISTINCT snapshot_date FROM src.charts"))
+        with conn:
+            conn.execute("""
+                DELETE FROM main.charts AS t
+                WHERE t.snapshot_date IN (SELECT DISTINCT snapshot_date FROM src.charts)
+                  AND EXISTS (SELECT 1 FROM src.charts s
+                              WHERE s.snapshot_date = t.snapshot_date AND s.country = t.country
+                                AND s.category IS t.category AND s.subcategory IS t.subcategory
+                                AND s.chart_type IS t.chart_type)
+            """)
+        conn.execute("DETACH DATABASE src")
+    conn.close()
+    t_clear = time.perf_counter() - t0
+
+    report = merge_databases(db_path, paths, ["charts"], policy="ignore", derived=False)
+    merge_databases(db_path, paths, ["scrape_jobs", "lookup_cache"], policy="replace", derived=False)
+    report["clear_seconds"] = round(t_clear, 3)
+
+    if derived:
+        conn = sqlite3.connect(db_path)
+        for snap in sorted(dates):
+            refresh_derived(conn, snap)
+            if ICON_PREFETCH:
+                print(f"[ICONS] {prefetch_icons(conn, snap)}")
+        for snap in sorted(dates):
+            print(f"[SHARD] {snap} jobs: " + ", ".join(f"{s} {summary(conn, snap, s)}" for s in SOURCES))
+        conn.close()
+    report["total_seconds"] = round(time.perf_counter() - t0, 3)
+    print(f"✅ Merged {len(paths)} shards into {db_path} in {report['total_seconds']}s")
+    return report
+
+
+def missing_units(db_path: str, snapshot_date: str, plan: Optional[Plan] = None) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Единиците от плана (по подразбиране всички държави × жанрове), които за деня не са done в scrape_jobs —
+    вкл. празните (мрежова грешка изглежда така) и тези на шард, чиято база изобщо не е стигнала до merge.
+    """
+    plan = plan or plan_shards(1)
+    conn = sqlite3.connect(db_path)
+    ensure_job_ledger(conn)
+    out = {}
+    for source in SOURCES:
+        expected = {tuple(u) for shard in plan for u in shard.get(source, [])}
+        done = set(conn.execute("SELECT country, genre FROM scrape_jobs WHERE snapshot_date=? AND source=? "
+                                "AND status='done'", (snapshot_date, source)).fetchall())
+        if expected - done:
+            out[source] = sorted(expected - done)
+    conn.close()
+    for source, units in out.items():
+        countries = sorted({c for c, _ in units})
+        print(f"[SHARD] ❌ {snapshot_date} {source}: {len(units)} units not done "
+              f"(countries {','.join(countries[:20])}{' ...' if len(countries) > 20 else ''})")
+    return out
+
+
+def _run_one(args) -> str:
+    return scrape_shard(*args)
+
+
+def run_local(shards: int, workers: int = 0, snapshot_date: Optional[str] = None, db_path: str = DB_PATH,
+              out_dir: str = SHARD_DIR, by: str = SHARD_BY, groups: int = GENRE_GROUPS,
+              countries: Optional[List[str]] = None, keep: bool = False) -> dict:
+    """Всички шардове като локални процеси (workers на брой), после merge в db_path."""
+    snap = snapshot_date or datetime.utcnow().date().isoformat()
+    plan = plan_shards(shards, by, groups, countries)
+    seed = os.path.join(out_dir, f"seed-{snap}.db")
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.exists(db_path):
+        export_seed(db_path, seed)
+    t0 = time.perf_counter()
+    args = [(i, shards, snap, out_dir, seed, plan) for i in range(shards) if plan[i]]
+    with ProcessPoolExecutor(max_workers=workers or len(args)) as pool:
+        paths = list(pool.map(_run_one, args))
+    t_scrape = time.perf_counter() - t0
+    report = merge_shards(db_path, paths)
+    report["scrape_seconds"] = round(t_scrape, 3)
+    report["missing"] = missing_units(db_path, snap, plan)
+    if not keep and not report["missing"]:  # при недовършени единици шардовете остават за повторен run
+        for p in paths + [seed]:
+            if os.path.exists(p):
+                os.remove(p)
+    return report
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Sharded App Store scrape (apps + games) with a merge step")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="all shards as local worker processes, then merge")
+    r.add_argument("--shards", type=int, default=4)
+    r.add_argument("--workers", type=int, default=0, help="processes (default: one per shard)")
+    r.add_argument("--keep", action="store_true", help="keep the shard databases after merging")
+
+    s = sub.add_parser("scrape", help="one shard (e.g. a CI matrix job)")
+    s.add_argument("--shard", type=int, required=True, help="0-based shard index")
+    s.add_argument("--of", type=int, required=True, help="total number of shards")
+    s.add_argument("--seed-db", help="lookup_cache seed exported with `seed`")
+
+    m = sub.add_parser("merge", help="merge shard databases into the target DB")
+    m.add_argument("shards", nargs="+", help="shard DBs (globs are expanded)")
+    m.add_argument("--no-derived", action="store_true", help="skip refreshing derived tables")
+    m.add_argument("--allow-partial", action="store_true",
+                   help="exit 0 even if some planned units are not done for the date")
+
+    e = sub.add_parser("seed", help="export the lookup cache for shard jobs")
+    e.add_argument("--out", required=True)
+
+    l = sub.add_parser("plan", help="print the shard plan")
+    l.add_argument("--shards", type=int, default=4)
+
+    for sp in (r, s, l):
+        sp.add_argument("--by", choices=("country", "genre"), default=SHARD_BY)
+        sp.add_argument("--groups", type=int, default=GENRE_GROUPS, help="genre groups per source (--by genre)")
+    for sp in (r, s, m):
+        sp.add_argument("--date", help="snapshot date (default: today UTC); all shards of a run must agree")
+    for sp in (r, s):
+        sp.add_argument("--out-dir", default=SHARD_DIR)
+    for sp in (r, m, e):
+        sp.add_argument("--db", default=DB_PATH)
+    a = p.parse_args()
+
+    if a.cmd == "run":
+        if run_local(a.shards, a.workers, a.date, a.db, a.out_dir, a.by, a.groups, keep=a.keep)["missing"]:
+            sys.exit("❌ scrape incomplete — shard databases kept; run again with the same --date to resume")
+    elif a.cmd == "scrape":
+        if not 0 <= a.shard < a.of:
+            sys.exit("❌ --shard must be in [0, --of)")
+        snap, plan = a.date or datetime.utcnow().date().isoformat(), plan_shards(a.of, a.by, a.groups)
+        # ненулев код -> CI job-ът пада и "Re-run failed jobs" пуска шарда отново (от artifact-а му)
+        if missing_units(scrape_shard(a.shard, a.of, snap, a.out_dir, a.seed_db, plan), snap, [plan[a.shard]]):
+            sys.exit(f"❌ shard {a.shard} incomplete — run again with the same --shard/--of/--date to resume")
+    elif a.cmd == "merge":
+        import glob
+        paths = sorted({q for pattern in a.shards for q in (glob.glob(pattern) or [pattern])})
+        if a.date:
+            paths = [q for q in paths if f"-{a.date}-" in os.path.basename(q)]
+        if not paths:
+            sys.exit("❌ no shard databases to merge")
+        merge_shards(a.db, paths, derived=not a.no_derived)
+        if a.date:
+            dates = [a.date]
+        else:
+            dates = sorted({m.group(1) for q in paths for m in [re.search(r"shard-(\d{4}-\d{2}-\d{2})-", q)] if m})
+        # цял липсващ шард (паднал job, без artifact) иначе минава незабелязано — личи само в scrape_jobs
+        incomplete = [d for d in dates if missing_units(a.db, d)]
+        if incomplete and not a.allow_partial:
+            sys.exit(f"❌ incomplete scrape for {', '.join(incomplete)} (merged anyway; --allow-partial to accept)")
+    elif a.cmd == "seed":
+        export_seed(a.db, a.out)
+    elif a.cmd == "plan":
+        for i, units in enumerate(plan_shards(a.shards, a.by, a.groups)):
+            countries = sorted({c for lst in units.values() for c, _ in lst})
+            print(f"shard {i}: {sum(map(len, units.values()))} units, countries {','.join(countries)}")
@@ -0,0 +1,78 @@
+# scraper/shared_cache.py
+# Общото ниво на кеша с отговори при няколко worker-а на API-то: малка SQLite база до app_data.db
+# (WAL + mmap, така че четенията са от споделената page cache), в която всеки worker пише готовите
+# тела и компресираните им варианти, а останалите ги четат вместо да рендерират отново.
+# Записите са по stamp на базата; при нов stamp старите се трият. Загуба на файла е безопасна.
+import os, sqlite3
+from typing import Optional, Dict, Any, Tuple
+from json_codec import dumps, loads
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH") or os.path.join(
+    BASE_DIR, "..", "appstore-api", "data", "response_cache.db")
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+MMAP_BYTES = 256 * 1024 * 1024
+EVICT_EVERY = 32  # проверка на размера на толкова записа
+
+SHARED_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT, encoding TEXT,         -- encoding '' = некомпресираното тяло
+        stamp TEXT, headers TEXT, body BLOB,
+        UNIQUE (key, encoding)
+    )
+"""
+
+
+class SharedResponseStore:
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        self.path, self.max_bytes = path, max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # middleware-ът е в event loop-а, но връзката може да се ползва и от threadpool-а
+        self.con = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=OFF")  # кеш — при срив се губят само последните записи
+        self.con.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        self.con.execute(SHARED_CACHE_DDL)
+        self.writes = 0
+
+    def get(self, key: str, stamp: Any) -> Optional[Tuple[Dict[str, str], bytes, Dict[str, bytes]]]:
+        """(headers, тяло, {encoding: компресирано}) или None."""
+        rows = self.con.execute("SELECT encoding, headers, body FROM responses WHERE key=? AND stamp=?",
+                                (key, repr(stamp))).fetchall()
+        found = {enc: (headers, body) for enc, headers, body in rows}
+        if "" not in found:
+            return None
+        headers, body = found.pop("")
+        return loads(headers), body, {enc: b for enc, (_, b) in found.items()}
+
+    def put(self, key: str, stamp: Any, encoding: str, body: bytes, headers: Optional[Dict[str, str]] = None):
+        try:
+            self.con.execute("INSERT OR REPLACE INTO responses (key, encoding, stamp, headers, body) "
+                             "VALUES (?,?,?,?,?)", (key, encoding, repr(stamp), dumps(headers or {}), body))
+        except sqlite3.OperationalError as e:  # зает за > timeout — отговорът остава само в паметта
+            print(f"[CACHE] shared write skipped: {e}")
+            return
+        self.writes += 1
+        if self.writes % EVICT_EVERY == 0:
+            self._evict()
+
+    def prune(self, stamp: Any):
+        """Трие записите от предишни версии на базата."""
+        self.con.execute("DELETE FROM responses WHERE stamp != ?", (repr(stamp),))
+
+    def _evict(self):
+        total = self.con.execute("SELECT COALESCE(SUM(length(body)), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # най-старите записи първи (rowid расте с всеки INSERT OR REPLACE), до 90% от лимита
+        cutoff = None
+        for rowid, size in self.con.execute("SELECT rowid, length(body) FROM responses ORDER BY rowid"):
+            if total <= self.max_bytes * 0.9:
+                break
+            cutoff, total = rowid, total - size
+        if cutoff is not None:
+            self.con.execute("DELETE FROM responses WHERE rowid <= ?", (cutoff,))
+
+    def summary(self) -> Dict[str, Any]:
+        n, size = self.con.execute("SELECT COUNT(*), COALESCE(SUM(length(body)), 0) FROM responses").fetchone()
+        return {"path": self.path, "entries": n, "bytes": size, "max_bytes": self.max_bytes}
@@ -0,0 +1,243 @@
+# scraper/trends.py
+# Тренд на ранга за всяко приложение във всеки контекст (държава × chart_type × категория), върху
+# последните снапшоти на контекста: скорост, ускорение, волатилност и breakout score за прозорци
+# от TREND_WINDOWS снапшота. Смята се векторно (numpy) върху матрица серии × снапшоти.
+#   velocity     — наклон на ранга (МНК), рангове на снапшот, + = изкачва се
+#   acceleration — (velocity на по-новата половина на прозореца − тази на по-старата) / половината
+#                  (снапшота между средите им), т.е. рангове на снапшот², + = ускорява изкачването
+#   volatility   — стандартно отклонение на промяната между съседни снапшоти
+#   breakout     — (среден ранг в предишния прозорец − текущ ранг) / (стд. откл. там + 1);
+#                  NULL, ако контекстът няма 2 × window снапшота история
+# Извън класацията = ранг „дълбочина на контекста + 1“.
+# Състоянието е app_rank_series: за всяка серия (контекст, app) последните SERIES_LEN ранга като
+# BLOB (uint8, колона 0 = последният снапшот на контекста, 0 = липсва). След скрейп сериите на
+# контекстите с нов ден се отместват с една колона — историята от chart_ranks не се чете наново.
+# app_trends е текущото състояние на метриките (към последния снапшот на всеки контекст).
+import sqlite3
+import numpy as np
+from typing import Optional, Tuple, Dict, List, Iterable
+from dimensions import ensure_dimensions, day_number
+
+TREND_WINDOWS = (7, 30)
+TREND_METRICS = ("velocity", "acceleration", "volatility", "breakout")
+SERIES_LEN = 2 * max(TREND_WINDOWS)
+
+TRENDS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS app_rank_series (
+        ctx_id INTEGER, app_id INTEGER, ranks BLOB,
+        PRIMARY KEY (ctx_id, app_id)
+    ) WITHOUT ROWID
+    """,
+    # денят на колона 0 за всеки контекст
+    "CREATE TABLE IF NOT EXISTS app_rank_series_days (ctx_id INTEGER PRIMARY KEY, day INTEGER)",
+    """
+    CREATE TABLE IF NOT EXISTS app_trends (
+        win INTEGER, ctx_id INTEGER, app_id INTEGER,
+        day INTEGER,                 -- последният снапшот на контекста
+        rank INTEGER, days_in_chart INTEGER,
+        velocity REAL, acceleration REAL, volatility REAL, breakout REAL,
+        PRIMARY KEY (win, ctx_id, app_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+
+def ensure_trends(conn: sqlite3.Connection):
+    for ddl in TRENDS_DDL:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def _in(ids: Iterable[int]) -> str:
+    return ",".join(str(int(i)) for i in ids)
+
+
+# ----- състояние: серии от рангове -----
+def _ctx_days(conn: sqlite3.Connection, ctx_ids: Optional[List[int]] = None) -> Dict[int, List[int]]:
+    """Последните SERIES_LEN дни на всеки контекст (низходящо), от dim_context_days."""
+    where = f"WHERE ctx_id IN ({_in(ctx_ids)})" if ctx_ids is not None else ""
+    out: Dict[int, List[int]] = {}
+    for c, d in conn.execute(f"SELECT ctx_id, day FROM dim_context_days {where} ORDER BY ctx_id, day DESC"):
+        days = out.setdefault(c, [])
+        if len(days) < SERIES_LEN:
+            days.append(d)
+    return out
+
+
+def _write_series(conn: sqlite3.Connection, ctx_ids: List[int], ctx: np.ndarray, app: np.ndarray,
+                  mat: np.ndarray, days: Dict[int, int]):
+    keep = mat.any(axis=1)  # серия без нито един ранг в прозореца отпада
+    conn.execute(f"DELETE FROM app_rank_series WHERE ctx_id IN ({_in(ctx_ids)})")
+    conn.executemany(
+        "INSERT INTO app_rank_series (ctx_id, app_id, ranks) VALUES (?, ?, ?)",
+        zip(ctx[keep].tolist(), app[keep].tolist(), (r.tobytes() for r in mat[keep])),
+    )
+    conn.execute(f"DELETE FROM app_rank_series_days WHERE ctx_id IN ({_in(ctx_ids)})")
+    conn.executemany("INSERT INTO app_rank_series_days VALUES (?, ?)", days.items())
+
+
+def build_series(conn: sqlite3.Connection, ctx_ids: Optional[List[int]] = None) -> int:
+    """Строи сериите на контекстите (None -> всички) наново от chart_ranks. Връща броя серии."""
+    ctx_days = _ctx_days(conn, ctx_ids)
+    targets = sorted(ctx_days) if ctx_ids is None else list(ctx_ids)
+    if not ctx_days:
+        _write_series(conn, targets, np.zeros(0, np.int64), np.zeros(0, np.int64),
+                      np.zeros((0, SERIES_LEN), np.uint8), {})
+        return 0
+    lo = min(d[-1] for d in ctx_days.values())
+    rows = np.array(conn.execute(
+        f"SELECT ctx_id, app_id, day, rank FROM chart_ranks WHERE day >= ? AND ctx_id IN ({_in(ctx_days)})", (lo,)
+    ).fetchall(), dtype=np.int64).reshape(-1, 4)
+    ctx, app, day, rank = rows.T
+
+    # позиция на деня в контекста (0 = последният); дни извън прозореца -> -1
+    pairs = np.array([(c * (1 << 20) + d, i) for c, days in ctx_days.items() for i, d in enumerate(days)],
+                     dtype=np.int64).reshape(-1, 2)
+    order = np.argsort(pairs[:, 0])
+    known, at = pairs[order, 0], pairs[order, 1]
+    key = ctx * (1 << 20) + day
+    idx = np.minimum(np.searchsorted(known, key), len(known) - 1)
+    pos = np.where(known[idx] == key, at[idx], -1)
+    keep = pos >= 0
+    ctx, app, pos, rank = ctx[keep], app[keep], pos[keep], rank[keep]
+
+    series, sid = np.unique(ctx * (1 << 40) + app, return_inverse=True)
+    best = np.full((len(series), SERIES_LEN), 256, dtype=np.int64)
+    np.minimum.at(best, (sid, pos), rank)  # няколко реда в един снапшот -> най-добрият ранг
+    mat = np.where(best == 256, 0, np.minimum(best, 255)).astype(np.uint8)
+    _write_series(conn, targets, series >> 40, series & ((1 << 40) - 1), mat,
+                  {c: d[0] for c, d in ctx_days.items()})
+    return len(series)
+
+
+def update_series(conn: sqlite3.Connection, snapshot_date: str) -> Tuple[int, int]:
+    """
+    Добавя деня към сериите: контекстите, за които той е следващият снапшот, се отместват с една колона;
+    повторен ден — само колона 0 се презаписва; по-стар ден или пропуск — контекстът се строи наново.
+    Връща (обновени контексти, построени наново контексти).
+    """
+    day = day_number(snapshot_date)
+    touched = [r[0] for r in conn.execute("SELECT ctx_id FROM dim_context_days WHERE day=?", (day,))]
+    if not touched:
+        return 0, 0
+    state = dict(conn.execute(f"SELECT ctx_id, day FROM app_rank_series_days WHERE ctx_id IN ({_in(touched)})"))
+    # дни между състоянието и новия ден (късно слят скрейп) -> строим наново
+    gaps = {c for c, n in conn.execute(f"""
+        SELECT d.ctx_id, COUNT(*) FROM dim_context_days d JOIN app_rank_series_days s ON s.ctx_id = d.ctx_id
+        WHERE d.ctx_id IN ({_in(touched)}) AND d.day > s.day AND d.day < ? GROUP BY d.ctx_id
+    """, (day,)) if n}
+    rebuild = [c for c in touched if c not in state or state[c] > day or c in gaps]
+    shift = [c for c in touched if c not in rebuild]
+    if rebuild:
+        build_series(conn, rebuild)
+    if not shift:
+        return 0, len(rebuild)
+
+    rows = conn.execute(f"SELECT ctx_id, app_id, ranks FROM app_rank_series WHERE ctx_id IN ({_in(shift)})").fetchall()
+    ctx = np.array([r[0] for r in rows], dtype=np.int64)
+    app = np.array([r[1] for r in rows], dtype=np.int64)
+    mat = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.uint8).reshape(-1, SERIES_LEN).copy()
+    moved = np.isin(ctx, [c for c in shift if state[c] < day])
+    mat[moved, 1:] = mat[moved, :-1]
+    mat[:, 0] = 0
+
+    today = np.array(conn.execute(f"""
+        SELECT ctx_id, app_id, MIN(rank) FROM chart_ranks WHERE day=? AND ctx_id IN ({_in(shift)})
+        GROUP BY ctx_id, app_id
+    """, (day,)).fetchall(), dtype=np.int64).reshape(-1, 3)
+    keys = ctx * (1 << 40) + app
+    order = np.argsort(keys)
+    t_keys = today[:, 0] * (1 << 40) + today[:, 1]
+    idx = np.minimum(np.searchsorted(keys[order], t_keys), max(len(keys) - 1, 0))
+    found = (keys[order][idx] == t_keys) if len(keys) else np.zeros(len(t_keys), bool)
+    mat[order[idx[found]], 0] = np.minimum(today[found, 2], 255)
+    new = np.zeros((int((~found).sum()), SERIES_LEN), dtype=np.uint8)
+    new[:, 0] = np.minimum(today[~found, 2], 255)
+    _write_series(conn, shift, np.r_[ctx, today[~found, 0]], np.r_[app, today[~found, 1]],
+                  np.vstack([mat, new]), {c: day for c in shift})
+    return len(shift), len(rebuild)
+
+
+def load_series(conn: sqlite3.Connection) -> Optional[Tuple[np.ndarray, ...]]:
+    """
+    Сериите с ранг в последния снапшот на контекста: (ctx, app, last_day, ranks, present, history);
+    ranks е матрица серии × SERIES_LEN с „дълбочина + 1“ за липсващите снапшоти.
+    """
+    rows = conn.execute("SELECT ctx_id, app_id, ranks FROM app_rank_series").fetchall()
+    if not rows:
+        return None
+    ctx = np.array([r[0] for r in rows], dtype=np.int64)
+    app = np.array([r[1] for r in rows], dtype=np.int64)
+    mat = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.uint8).reshape(-1, SERIES_LEN)
+    size = int(ctx.max()) + 1
+    depth = np.zeros(size, dtype=np.float32)
+    np.maximum.at(depth, ctx, mat.max(axis=1))
+    last_day = np.zeros(size, dtype=np.int64)
+    history = np.zeros(size, dtype=np.int64)
+    for c, d in conn.execute("SELECT ctx_id, day FROM app_rank_series_days"):
+        if c < size:
+            last_day[c] = d
+    for c, n in conn.execute("SELECT ctx_id, COUNT(*) FROM dim_context_days GROUP BY ctx_id"):
+        if c < size:
+            history[c] = n
+
+    current = mat[:, 0] > 0
+    ctx, app, mat = ctx[current], app[current], mat[current]
+    present = mat > 0
+    ranks = np.where(present, mat, (depth[ctx] + 1)[:, None]).astype(np.float32)
+    return ctx, app, last_day[ctx], ranks, present, history[ctx]
+
+
+# ----- метрики -----
+def _slope(x: np.ndarray) -> np.ndarray:
+    """Наклон по МНК за всеки ред; колона 0 е най-новият снапшот."""
+    t = -np.arange(x.shape[1], dtype=float)
+    t -= t.mean()
+    return ((x - x.mean(axis=1, keepdims=True)) * t).sum(axis=1) / (t * t).sum()
+
+
+def compute_trends(ranks: np.ndarray, present: np.ndarray, history: np.ndarray, win: int) -> Dict[str, np.ndarray]:
+    """Метриките за прозорец от `win` снапшота за всички серии наведнъж."""
+    x = ranks[:, :win]
+    half = max(win // 2, 2)
+    base = ranks[:, win:2 * win]
+    breakout = (base.mean(axis=1) - x[:, 0]) / (base.std(axis=1) + 1)
+    return {
+        "velocity": -_slope(x),
+        # промяната на скоростта за `half` снапшота -> рангове на снапшот²
+        "acceleration": (-_slope(x[:, :half]) + _slope(x[:, win - half:win])) / half,
+        "volatility": np.diff(x, axis=1).std(axis=1),
+        "breakout": np.where(history >= 2 * win, breakout, np.nan),
+        "days_in_chart": present[:, :win].sum(axis=1),
+    }
+
+
+def refresh_trends(conn: sqlite3.Connection, snapshot_date: Optional[str] = None) -> int:
+    """
+    Обновява сериите с деня (None -> строи всички наново от chart_ranks) и преизчислява app_trends
+    за всички контексти. Очаква dim_context_days да е обновен (refresh_chart_ranks). Връща броя редове.
+    """
+    ensure_dimensions(conn)
+    ensure_trends(conn)
+    if snapshot_date:
+        update_series(conn, snapshot_date)
+    else:
+        build_series(conn)
+
+    conn.execute("DELETE FROM app_trends")
+    loaded = load_series(conn)
+    n = 0
+    if loaded is not None:
+        ctx, app, last_day, ranks, present, history = loaded
+        for win in TREND_WINDOWS:
+            m = compute_trends(ranks, present, history, win)
+            cols = [np.full(len(ctx), win), ctx, app, last_day, ranks[:, 0].astype(np.int64), m["days_in_chart"]]
+            metrics = [np.round(m[k].astype(float), 4) for k in TREND_METRICS]
+            rows = zip(*(c.tolist() for c in cols), *([None if v != v else v for v in k.tolist()] for k in metrics))
+            n += conn.executemany(
+                "INSERT INTO app_trends (win, ctx_id, app_id, day, rank, days_in_chart, "
+                f"{', '.join(TREND_METRICS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            ).rowcount
+    conn.commit()
+    return n
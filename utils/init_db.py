@@ -1,54 +1,15 @@
 # utils/init_db.py
-import os, sqlite3
+import os, sys, sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from migrations import migrate, current_version
 
 DB_PATH = os.environ.get("DB_PATH", "appstore-api/data/app_data.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
+# charts / apps / snapshots / compare_results — каноничната схема през версионираните миграции
 conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS apps(
-    app_id TEXT PRIMARY KEY,
-    bundle_id TEXT,
-    name TEXT,
-    developer TEXT
-);
-""")
-cur.execute("""
-CREATE TABLE IF NOT EXISTS charts(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    snapshot_date TEXT,
-    country TEXT,
-    chart_type TEXT,
-    category TEXT,
-    subcategory TEXT,
-    rank INTEGER,
-    app_id TEXT
-);
-""")
-cur.execute("""
-CREATE TABLE IF NOT EXISTS snapshots(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    snapshot_date TEXT,
-    country TEXT,
-    created_at TEXT
-);
-""")
-cur.execute("""
-CREATE TABLE IF NOT EXISTS compare_results(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    snapshot_date TEXT,
-    country TEXT,
-    chart_type TEXT,
-    category TEXT,
-    app_id TEXT,
-    current_rank INTEGER,
-    previous_rank INTEGER,
-    delta INTEGER,
-    status TEXT
-);
-""")
-conn.commit()
+migrate(conn)
+version = current_version(conn)
 conn.close()
-print(f"DB schema ensured at {DB_PATH}")
+print(f"DB schema ensured at {DB_PATH} (version {version})")
@@ -65,3 +65,13 @@ else:
     print(f"✅ Качих нов '{drive_name}' в Drive (file ID: {created['id']}).")
 
 print(f"ℹ️ Локален файл: {db_file}")
+
+# --- 5) Архивни сегменти от retention.py (не се променят след запис -> качват се само новите) ---
+for seg in sorted(glob.glob(os.path.join(os.path.dirname(db_file), "archive", "charts_*.db"))):
+    name = os.path.basename(seg)
+    query = f"'{folder_id}' in parents and name = '{name}' and trashed = false"
+    if drive.files().list(q=query, fields="files(id)").execute().get("files"):
+        continue
+    media = MediaFileUpload(seg, mimetype="application/octet-stream", resumable=True)
+    created = drive.files().create(body={"name": name, "parents": [folder_id]}, media_body=media, fields="id").execute()
+    print(f"✅ Качих архивен сегмент '{name}' ({created['id']}).")